@@ -0,0 +1,97 @@
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# Excel-лист вмещает 1 048 576 строк (с заголовком): большие выгрузки пишутся только в CSV
+EXCEL_MAX_ROWS = 1_048_575
+
+# Распределения по мотивам data/operations.xlsx
+CARDS = ["*7197", "*4556", None, "*5091", "*5441", "*1112"]
+CARD_WEIGHTS = [0.72, 0.17, 0.097, 0.008, 0.003, 0.002]
+CATEGORIES = {
+    # категория: (MCC, описания)
+    "Супермаркеты": (5411.0, ["Колхоз", "Магнит", "Пятерочка", "Перекресток", "SPAR"]),
+    "Фастфуд": (5814.0, ["Mouse Tail", "KFC", "Бургер Кинг", "Теремок"]),
+    "Транспорт": (4111.0, ["Метро Санкт-Петербург", "Яндекс Такси", "Ситидрайв"]),
+    "Переводы": (None, ["Константин Л.", "Дмитрий Ш.", "Светлана Т.", "Иван С.", 'На р/с ООО "ФОРТУНА"']),
+    "Ж/д билеты": (4112.0, ["РЖД"]),
+    "Различные товары": (5399.0, ["Ozon.ru", "Wildberries"]),
+    "Связь": (4814.0, ["МТС", "Билайн"]),
+    "Пополнения": (None, ["Пополнение через Газпромбанк", "Внесение наличных"]),
+    "Аптеки": (5912.0, ["Аптека Вита", "Ригла"]),
+    "Дом и ремонт": (5200.0, ["Леруа Мерлен", "OBI", "Строймаркет"]),
+    "Рестораны": (5812.0, ["IL Патио", "Шоколадница"]),
+}
+CATEGORY_WEIGHTS = [0.36, 0.2, 0.06, 0.06, 0.04, 0.04, 0.03, 0.03, 0.03, 0.1, 0.05]
+CURRENCIES = ["RUB", "TRY", "EUR", "CNY", "USD"]
+CURRENCY_WEIGHTS = [0.98, 0.01, 0.005, 0.003, 0.002]
+START = pd.Timestamp("2018-01-01")
+END = pd.Timestamp("2021-12-31 23:59:59")
+
+
+def generate_transactions(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Синтетические транзакции со схемой data/operations.xlsx (те же колонки, форматы дат и типы).
+    Одинаковые rows и seed дают одинаковую таблицу. Строки идут по убыванию даты, как в выгрузке банка.
+    """
+    rng = np.random.default_rng(seed)
+    seconds = rng.integers(0, int((END - START).total_seconds()), size=rows)
+    dates = (START + pd.to_timedelta(np.sort(seconds)[::-1], unit="s"))
+    payment_dates = dates + pd.to_timedelta(rng.integers(0, 3, size=rows), unit="D")
+
+    names = list(CATEGORIES)
+    category_codes = rng.choice(len(names), size=rows, p=CATEGORY_WEIGHTS)
+    categories = np.array(names, dtype=object)[category_codes]
+    mcc = np.array([CATEGORIES[name][0] for name in names], dtype="float64")[category_codes]
+    description_index = rng.integers(0, 1_000, size=rows)
+    descriptions = np.empty(rows, dtype=object)
+    for code, name in enumerate(names):
+        mask = category_codes == code
+        options = np.array(CATEGORIES[name][1], dtype=object)
+        descriptions[mask] = options[description_index[mask] % len(options)]
+
+    amounts = -np.round(rng.lognormal(mean=5.5, sigma=1.2, size=rows), 2)
+    amounts[categories == "Пополнения"] *= -1
+    currencies = np.array(CURRENCIES, dtype=object)[rng.choice(len(CURRENCIES), size=rows, p=CURRENCY_WEIGHTS)]
+    cashback = np.where(rng.random(rows) < 0.1, np.floor(np.abs(amounts) / 100), np.nan)
+
+    return pd.DataFrame({
+        "Дата операции": dates.strftime("%d.%m.%Y %H:%M:%S"),
+        "Дата платежа": payment_dates.strftime("%d.%m.%Y"),
+        "Номер карты": np.array(CARDS, dtype=object)[rng.choice(len(CARDS), size=rows, p=CARD_WEIGHTS)],
+        "Статус": np.where(rng.random(rows) < 0.006, "FAILED", "OK").astype(object),
+        "Сумма операции": amounts,
+        "Валюта операции": currencies,
+        "Сумма платежа": amounts,
+        "Валюта платежа": np.full(rows, "RUB", dtype=object),
+        "Кэшбэк": cashback,
+        "Категория": categories,
+        "MCC": mcc,
+        "Описание": descriptions,
+        "Бонусы (включая кэшбэк)": (np.abs(amounts) // 100).astype("int64"),
+        "Округление на инвесткопилку": np.zeros(rows, dtype="int64"),
+        "Сумма операции с округлением": np.abs(amounts),
+    })
+
+
+def write_dataset(rows: int, directory: str, seed: int = 0, excel: Optional[bool] = None) -> str:
+    """
+    Записывает синтетическую выгрузку на rows строк в directory и возвращает путь к файлу.
+    Excel - если строки помещаются на лист (или excel=True), иначе CSV.
+    Уже сгенерированный файл с теми же параметрами используется повторно.
+    """
+    excel = rows <= EXCEL_MAX_ROWS if excel is None else excel
+    path = os.path.join(directory, f"operations_{rows}_{seed}.{'xlsx' if excel else 'csv'}")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        transactions = generate_transactions(rows, seed)
+        root, extension = os.path.splitext(path)
+        tmp_path = f"{root}.tmp{extension}"    # pandas выбирает формат записи по расширению
+        if excel:
+            transactions.to_excel(tmp_path, index=False, engine="openpyxl")
+        else:
+            transactions.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,177 @@
+"""
+Замеры точек входа на синтетических выгрузках (benchmarks.generate).
+
+    python -m benchmarks.run --rows 10000 1000000 --repeat 3
+    python -m benchmarks.run --rows 10000 --save benchmarks/baseline.json
+    python -m benchmarks.run --rows 10000 --baseline benchmarks/baseline.json    # код 1 при регрессии
+
+Каждая точка входа замеряется в отдельном процессе: пиковая память (RSS) не смешивается
+между замерами. Котировки отдаются заглушками, сеть не используется.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from unittest.mock import patch
+
+from benchmarks.generate import write_dataset
+from config import ROOT_DIR
+
+DATA_DIR = os.path.join(ROOT_DIR, "benchmarks", "data")    # сгенерированные выгрузки (не в git)
+DEFAULT_ROWS = [10_000, 1_000_000, 10_000_000]
+ENTRY_POINTS = ["get_cards", "main_page", "transfers", "category_report"]
+MAIN_PAGE_DATE = "2021-12-20 12:00:00"
+REPORT_DATE = "2021-12-20"
+STUB_RATES = {"USD": 73.21, "EUR": 82.87}
+STUB_PRICES = {"AAPL": {"price": "150.25"}, "AMZN": {"price": "130.1"}, "GOOGL": {"price": "2800.5"},
+               "MSFT": {"price": "310.4"}, "TSLA": {"price": "250.0"}}
+
+
+def _stubbed_environment(work_dir: str) -> ExitStack:
+    """ Заглушки котировок, отдельные каталоги для кеша и отчетов, кеш ответов главной страницы отключен."""
+    from src.quote_cache import QuoteCache
+    from src.response_cache import ResponseCache
+
+    stack = ExitStack()
+    stack.enter_context(patch("src.utils._fetch_api_currencies", side_effect=lambda currencies: {
+        currency: STUB_RATES[currency] for currency in currencies if currency in STUB_RATES}))
+    stack.enter_context(patch("src.utils._fetch_api_stocks", side_effect=lambda stocks: {
+        stock: STUB_PRICES[stock] for stock in stocks if stock in STUB_PRICES}))
+    stack.enter_context(patch("src.utils.quote_cache", QuoteCache()))
+    stack.enter_context(patch("src.views.main_page_cache", ResponseCache(max_size=0)))
+    stack.enter_context(patch("src.utils.CACHE_DIR", os.path.join(work_dir, "cache")))
+    stack.enter_context(patch("src.reports.PATH_DATA", work_dir))
+    return stack
+
+
+def _prepare(entry_point: str, path: str) -> Callable[[], Any]:
+    """ Функция для замера точки входа; загрузка данных для нее в замер не входит."""
+    from src.reports import spending_by_category
+    from src.services import get_search_for_transfers_to_individuals
+    from src.utils import get_cards
+    from src.views import get_main_page_info
+
+    if entry_point == "get_cards":
+        return lambda: get_cards(path, use_cache=False)
+    transactions = get_cards(path)
+    if entry_point == "main_page":
+        return lambda: get_main_page_info(MAIN_PAGE_DATE, transactions)
+    if entry_point == "transfers":
+        return lambda: get_search_for_transfers_to_individuals(transactions, "Переводы")
+    if entry_point == "category_report":
+        return lambda: spending_by_category(transactions, "Супермаркеты", REPORT_DATE)
+    raise ValueError(f"Неизвестная точка входа: {entry_point}")
+
+
+def _measure_in_child(entry_point: str, path: str, repeat: int, connection: Connection) -> None:
+    """ Выполняется в дочернем процессе: repeat замеров времени и пиковая память процесса."""
+    from src.reports import flush_reports
+
+    with tempfile.TemporaryDirectory() as work_dir, _stubbed_environment(work_dir):
+        run = _prepare(entry_point, path)
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            seconds.append(time.perf_counter() - start)
+        # Отчеты пишутся в фоне: дожидаемся записи, пока каталог отчетов существует
+        flush_reports()
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss    # в Linux - килобайты
+    connection.send({"seconds": seconds, "peak_rss_mb": round(peak_rss_kb / 1024, 1)})
+    connection.close()
+
+
+def measure(entry_point: str, path: str, rows: int, repeat: int = 3) -> Dict[str, Any]:
+    """ Замер одной точки входа на выгрузке path (rows строк) в отдельном процессе."""
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_in_child, args=(entry_point, path, repeat, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        process.join()
+        raise RuntimeError(f"Замер {entry_point} на {rows} строках завершился с кодом {process.exitcode}")
+    process.join()
+
+    best = min(result["seconds"])
+    return {
+        "entry_point": entry_point,
+        "rows": rows,
+        "seconds": round(best, 4),
+        "median_seconds": round(statistics.median(result["seconds"]), 4),
+        "peak_rss_mb": result["peak_rss_mb"],
+        "rows_per_second": round(rows / best) if best > 0 else None,
+    }
+
+
+def compare_with_baseline(results: List[Dict[str, Any]],
+                          baseline: List[Dict[str, Any]],
+                          tolerance: float = 0.2) -> List[str]:
+    """ Регрессии относительно сохраненных результатов: время (лучшее из повторов)
+    или пиковая память больше базовых более чем на tolerance (доля)."""
+    base = {(item["entry_point"], item["rows"]): item for item in baseline}
+    regressions = []
+    for item in results:
+        previous = base.get((item["entry_point"], item["rows"]))
+        if previous is None:
+            continue
+        for metric in ("seconds", "peak_rss_mb"):
+            if item[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{item['entry_point']} на {item['rows']} строках: {metric} "
+                                   f"{previous[metric]} -> {item[metric]}")
+    return regressions
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    """ Таблица результатов для вывода в консоль."""
+    lines = [f"{'точка входа':<16} {'строк':>10} {'сек':>9} {'медиана':>9} {'RSS, МБ':>9} {'строк/с':>12}"]
+    for item in results:
+        lines.append(f"{item['entry_point']:<16} {item['rows']:>10} {item['seconds']:>9} {item['median_seconds']:>9} "
+                     f"{item['peak_rss_mb']:>9} {item['rows_per_second'] or '-':>12}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Замеры точек входа на синтетических выгрузках")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="Размеры выгрузок")
+    parser.add_argument("--entry-points", nargs="+", default=ENTRY_POINTS, choices=ENTRY_POINTS)
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого замера")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Каталог сгенерированных выгрузок")
+    parser.add_argument("--save", help="Сохранить результаты в JSON (например, как базовые)")
+    parser.add_argument("--baseline", help="JSON с базовыми результатами для поиска регрессий")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое ухудшение (доля)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for rows in args.rows:
+        path = write_dataset(rows, args.data_dir, args.seed)
+        for entry_point in args.entry_points:
+            results.append(measure(entry_point, path, rows, args.repeat))
+            print(format_results(results[-1:]).splitlines()[1], flush=True)
+    print(format_results(results))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressions = compare_with_baseline(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"РЕГРЕССИЯ: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,5 +4,40 @@ ROOT_DIR = os.path.dirname(__file__)    # корневой каталог
 PATH_DATA = os.path.join(ROOT_DIR, "data")
 PATH_XLSX = os.path.join(PATH_DATA, "operations.xlsx")
 USER_SETTINGS = os.path.join(ROOT_DIR, "user_settings.json")
+CACHE_DIR = os.path.join(PATH_DATA, "cache")    # бинарный кеш распарсенных Excel-файлов
+STORE_MAX_BYTES = 512 * 1024 * 1024    # лимит памяти хранилища транзакций в процессе
+TRANSACTIONS_DB = os.path.join(PATH_DATA, "transactions.db")    # база транзакций, пополняемая выписками
+LOAD_MAX_WORKERS = os.cpu_count() or 1    # процессов для параллельного разбора нескольких выгрузок
+STREAM_CHUNK_SIZE = 50_000    # строк в одной порции при потоковой загрузке больших выгрузок
+
+# Файлы отчетов (src.reports.report_to_file)
+REPORT_FILENAME = "report_file"    # имя по умолчанию; шаблон, например "{name}_{timestamp}_{unique}"
+REPORT_FORMAT = "json"    # json, jsonl (JSON Lines) или parquet (нужен pyarrow или fastparquet)
+REPORT_BACKGROUND = True    # запись в фоновом потоке: отчет возвращается, не дожидаясь записи на диск
+
+# Внешние API котировок
+CURRENCY_API_URL = "https://api.apilayer.com/exchangerates_data/latest"
+STOCKS_API_URL = "https://api.twelvedata.com/price"
+API_TIMEOUT = 10    # таймаут одного запроса к API, секунды
+API_MAX_WORKERS = 8    # количество параллельных запросов к API
+STOCKS_BATCH_SIZE = 120    # максимум тикеров в одном запросе к API котировок акций
+
+# Кеш котировок
+QUOTE_TTL = 60    # сколько секунд котировка считается свежей
+QUOTE_STALE_TTL = 600    # сколько секунд после устаревания отдается старое значение с обновлением в фоне
+QUOTE_TTLS: dict[str, float] = {}    # индивидуальный TTL по тикеру/валюте, например {"TSLA": 15}
+QUOTES_SNAPSHOT = os.path.join(CACHE_DIR, "quotes.json")    # снимок кеша на диске (None - только в памяти)
+
+# Кеш готовых ответов главной страницы
+RESPONSE_CACHE_SIZE = 128    # сколько ответов хранится (0 - кеш отключен)
+RESPONSE_CACHE_TTL = QUOTE_TTL    # не дольше, чем котировки в ответе считаются свежими
+VIEWS_MAX_WORKERS = 4    # потоков для расчетов по таблицам в асинхронной главной странице
+
+# Локальный HTTP-сервер (python main.py serve)
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8000
+SERVER_LATENCY_WINDOW = 1000    # по скольким последним запросам считаются перцентили времени ответа
 
 LOGS_DIR = os.path.join(ROOT_DIR, "logs")
+LOG_LEVEL = "DEBUG"    # общий уровень логирования
+LOG_LEVELS: dict[str, str] = {}    # уровень по модулю, например {"src.utils": "INFO", "src.quote_cache": "WARNING"}
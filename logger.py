@@ -1,19 +1,69 @@
+import atexit
+import io
 import logging
+import logging.handlers
 import os
+import queue
+
+from config import LOG_LEVEL, LOG_LEVELS, LOGS_DIR
+
+
+class LazyFileHandler(logging.FileHandler):
+    """ FileHandler, который создает каталог и открывает (перезаписывает) файл лога
+    только при первой записи, а не при импорте модуля."""
+
+    def _open(self) -> io.TextIOWrapper:
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """ QueueHandler, который не форматирует сообщение в вызывающем потоке:
+    подстановка аргументов (logger.debug("...%s", value)) выполняется в фоновом потоке записи."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # Трассировку нужно сохранить текстом, пока исключение еще доступно
+            prepared: logging.LogRecord = super().prepare(record)
+            return prepared
+        return record
 
-from config import LOGS_DIR
 
 """ Настраиваем логгер """
 logger = logging.getLogger(__name__)    # my_logger
-logger.setLevel(logging.DEBUG)
+logger.setLevel(LOG_LEVEL)
 
 log_file_path = os.path.join(LOGS_DIR, "app.log")
 
-# Создаем директорию, если ее нет
-os.makedirs(LOGS_DIR, exist_ok=True)
-
 """ Создаем хендлер для вывода в файл """
-file_handler = logging.FileHandler(log_file_path, mode="w", encoding="utf-8")
+file_handler = LazyFileHandler(log_file_path, mode="w", encoding="utf-8", delay=True)
 file_formatter = logging.Formatter("%(asctime)s %(filename)s %(levelname)s: %(message)s")
 file_handler.setFormatter(file_formatter)
-logger.addHandler(file_handler)
+
+""" Записи попадают в очередь, в файл их пишет фоновый поток: запись лога не задерживает вызывающий код """
+log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+queue_handler = DeferredQueueHandler(log_queue)
+logger.addHandler(queue_handler)
+log_listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)    # при выходе оставшиеся в очереди записи дописываются в файл
+
+
+def get_logger(name: str) -> logging.Logger:
+    """ Логгер модуля: дочерний для logger (пишет в тот же файл через очередь).
+    Уровень модуля задается в config.LOG_LEVELS, например {"src.utils": "INFO"}."""
+    module_logger = logger.getChild(name)
+    if name in LOG_LEVELS:
+        module_logger.setLevel(LOG_LEVELS[name])
+    return module_logger
+
+
+def _log_directly_after_fork() -> None:
+    """ В дочернем процессе (пул процессов при загрузке нескольких файлов) фонового потока нет:
+    записи пишутся в файл напрямую и дописываются к логу родительского процесса."""
+    logger.removeHandler(queue_handler)
+    file_handler.mode = "a"
+    logger.addHandler(file_handler)
+
+
+os.register_at_fork(after_in_child=_log_directly_after_fork)
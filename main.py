@@ -1,28 +1,143 @@
-import pandas as pd
+import argparse
+import os
+from typing import Optional, Sequence
 
-from config import PATH_XLSX
-from src.reports import spending_by_category
-from src.services import get_search_for_transfers_to_individuals
-from src.utils import get_cards
-from src.views import get_main_page_info
+from config import PATH_XLSX, SERVER_HOST, SERVER_PORT, TRANSACTIONS_DB
+
+# Модули с pandas и запросами к API импортируются внутри команд:
+# каждая команда загружает только то, что ей нужно, а "--help" отвечает сразу
+
+MAIN_PAGE_DATE = "2021-12-24 15:44:07"
+TRANSFERS_KEYWORD = "Перевод"
+REPORT_CATEGORY = "Дом и ремонт"
+REPORT_DATE = "2021-11-25"
+
+
+def get_source() -> str:
+    """ Источник транзакций: база, пополняемая выписками (команда ingest), если она есть, иначе выгрузка."""
+    return TRANSACTIONS_DB if os.path.exists(TRANSACTIONS_DB) else PATH_XLSX
 
 
 def main() -> None:
+    from src.reports import spending_by_category
+    from src.services import get_search_for_transfers_to_individuals
+    from src.store import transaction_store
+    from src.views import get_main_page_info
+
+    # Транзакции загружаются один раз и используются всеми разделами
+    source = get_source()
+    all_transactions = transaction_store.get(source)
+
     # Веб-страницы: Страница «Главная»
-    main_page_result = get_main_page_info("2021-12-24 15:44:07")
+    main_page_result = get_main_page_info(MAIN_PAGE_DATE, all_transactions, transaction_store.rollups(source))
     print(main_page_result)
 
     # Сервисы: Поиск переводов физическим лицам
-    all_transactions = get_cards(PATH_XLSX)
-    transactions_for_service = all_transactions.to_dict("records")
-
-    service_result = get_search_for_transfers_to_individuals(transactions_for_service, "Перевод")
+    service_result = get_search_for_transfers_to_individuals(all_transactions, TRANSFERS_KEYWORD)
     print(service_result)
 
     # Отчеты: Траты по категории
-    report_result: pd.DataFrame = spending_by_category(all_transactions, "Дом и ремонт", "2021-11-25")
+    report_result = spending_by_category(all_transactions, REPORT_CATEGORY, REPORT_DATE)
     print(report_result)
 
 
+def run_main_page(args: argparse.Namespace) -> None:
+    """ Команда main: страница «Главная» на дату args.date."""
+    from src.database import is_database
+    from src.utils import get_cards
+    from src.views import get_main_page_info
+
+    if is_database(args.source):
+        print(get_main_page_info(args.date, db_path=args.source))
+    else:
+        print(get_main_page_info(args.date, get_cards(args.source)))
+
+
+def run_transfers(args: argparse.Namespace) -> None:
+    """ Команда transfers: поиск переводов физическим лицам."""
+    from src.database import is_database
+    from src.services import get_search_for_transfers_to_individuals, search_transfers_in_database
+    from src.utils import get_cards
+
+    if is_database(args.source):
+        print(search_transfers_in_database(args.source, args.keyword))
+    else:
+        print(get_search_for_transfers_to_individuals(get_cards(args.source), args.keyword))
+
+
+def run_report(args: argparse.Namespace) -> None:
+    """ Команда report: траты по категории за три месяца до args.date."""
+    from src.database import is_database
+    from src.reports import spending_by_category, spending_by_category_in_database
+    from src.utils import get_cards
+
+    if is_database(args.source):
+        print(spending_by_category_in_database(args.source, args.category, args.date))
+    else:
+        print(spending_by_category(get_cards(args.source), args.category, args.date))
+
+
+def run_ingest(args: argparse.Namespace) -> None:
+    """ Команда ingest: дозагрузка выписки в базу транзакций."""
+    from src.database import ingest_statement
+
+    print(f"Добавлено транзакций: {len(ingest_statement(args.statement, args.db))}")
+
+
+def run_serve(args: argparse.Namespace) -> None:
+    """ Команда serve: HTTP-сервер с загруженными данными (см. src.server)."""
+    from src.server import serve
+
+    serve(args.source, args.host, args.port)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """ Разбор аргументов командной строки."""
+    parser = argparse.ArgumentParser(description="Анализ банковских транзакций. "
+                                                 "Без команды формируются все разделы.")
+    commands = parser.add_subparsers(dest="command")
+
+    def add_command(name: str, help_text: str) -> argparse.ArgumentParser:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--source", default=None,
+                             help="Выгрузка Excel/CSV или база .db (по умолчанию база, если она есть)")
+        return command
+
+    main_page = add_command("main", "Страница «Главная»")
+    main_page.add_argument("--date", default=MAIN_PAGE_DATE, help="Дата и время YYYY-MM-DD HH:MM:SS")
+    main_page.set_defaults(handler=run_main_page)
+
+    transfers = add_command("transfers", "Поиск переводов физическим лицам")
+    transfers.add_argument("--keyword", default=TRANSFERS_KEYWORD, help="Категория переводов")
+    transfers.set_defaults(handler=run_transfers)
+
+    report = add_command("report", "Траты по категории за три месяца")
+    report.add_argument("--category", default=REPORT_CATEGORY, help="Категория трат")
+    report.add_argument("--date", default=REPORT_DATE, help="Конец периода YYYY-MM-DD")
+    report.set_defaults(handler=run_report)
+
+    server = add_command("serve", "HTTP-сервер: главная страница, переводы и отчеты")
+    server.add_argument("--host", default=SERVER_HOST)
+    server.add_argument("--port", type=int, default=SERVER_PORT)
+    server.set_defaults(handler=run_serve)
+
+    ingest = commands.add_parser("ingest", help="Дозагрузка выписки в базу транзакций")
+    ingest.add_argument("statement", help="Выписка Excel или CSV")
+    ingest.add_argument("--db", default=TRANSACTIONS_DB, help="База транзакций SQLite")
+    ingest.set_defaults(handler=run_ingest)
+    return parser
+
+
+def cli(argv: Optional[Sequence[str]] = None) -> None:
+    """ Точка входа командной строки: python main.py [main|transfers|report|serve|ingest] [параметры]."""
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        main()
+        return
+    if getattr(args, "source", "") is None:
+        args.source = get_source()
+    args.handler(args)
+
+
 if __name__ == '__main__':
-    main()
+    cli()
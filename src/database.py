@@ -0,0 +1,229 @@
+import hashlib
+import os
+import sqlite3
+import sys
+from collections import Counter
+from datetime import datetime
+from typing import Optional, Sequence
+
+import pandas as pd
+
+from config import STREAM_CHUNK_SIZE, TRANSACTIONS_DB
+from logger import get_logger
+from src.schema import apply_schema
+from src.utils import DATE_FORMAT, index_by_operation_date, iter_transaction_chunks
+
+logger = get_logger(__name__)
+
+TABLE = "transactions"
+KEY_COLUMN = "transaction_key"    # ключ для дедупликации при повторной загрузке выписок
+DATE_COLUMN = "operation_date"    # "Дата операции" в ISO-формате: сортируется и сравнивается как строка
+ISO_FORMAT = "%Y-%m-%d %H:%M:%S"
+SERVICE_COLUMNS = (KEY_COLUMN, DATE_COLUMN)
+
+# Поля, по которым транзакция считается той же самой в разных выписках
+KEY_FIELDS = ("Дата операции", "Номер карты", "Статус", "Сумма операции", "Валюта операции",
+              "Сумма платежа", "Категория", "MCC", "Описание")
+DATABASE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+# Индексы для отбора по периоду, категории и карте без полного просмотра таблицы
+INDEXES = {
+    "idx_transactions_date": (DATE_COLUMN,),
+    "idx_transactions_category": ("Категория", DATE_COLUMN),
+    "idx_transactions_card": ("Номер карты", DATE_COLUMN),
+}
+
+
+def is_database(path: str) -> bool:
+    """ Путь указывает на базу транзакций SQLite (а не на выгрузку Excel/CSV)."""
+    return path.lower().endswith(DATABASE_SUFFIXES)
+
+
+def connect(db_path: str = TRANSACTIONS_DB) -> sqlite3.Connection:
+    """ Открывает базу транзакций, при необходимости создавая каталог."""
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    return sqlite3.connect(db_path)
+
+
+def _quote(column: str) -> str:
+    """ Имя колонки для SQL (колонки выгрузки - на русском и с пробелами)."""
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _key_value(value: object) -> str:
+    """ Значение поля в ключе транзакции: пустые значения и числа записываются одинаково
+    независимо от того, как прочитан файл (Excel, read-only Excel или CSV)."""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    if isinstance(value, (int, float)):
+        return f"{float(value):.2f}"
+    return str(value).strip()
+
+
+def transaction_keys(transactions: pd.DataFrame, seen: Optional[Counter] = None) -> pd.Series:
+    """
+    Ключи транзакций: хеш полей KEY_FIELDS и порядковый номер среди одинаковых строк выписки.
+    Две одинаковые покупки в одну секунду получают разные ключи, а та же выписка,
+    загруженная повторно, - те же ключи. seen - счетчик хешей предыдущих порций той же выписки.
+    """
+    seen = Counter() if seen is None else seen
+    fields = [field for field in KEY_FIELDS if field in transactions.columns]
+    keys = []
+    for row in transactions[fields].itertuples(index=False, name=None):
+        row_hash = hashlib.sha1("\x1f".join(_key_value(value) for value in row).encode("utf-8")).hexdigest()
+        keys.append(f"{row_hash}:{seen[row_hash]}")
+        seen[row_hash] += 1
+    return pd.Series(keys, index=transactions.index, name=KEY_COLUMN)
+
+
+def _table_columns(connection: sqlite3.Connection) -> dict[str, str]:
+    """ Колонки таблицы транзакций и их типы (пустой словарь, если таблицы еще нет)."""
+    rows = connection.execute(f"PRAGMA table_info({TABLE})").fetchall()
+    return {row[1]: row[2] for row in rows}
+
+
+def _ensure_table(connection: sqlite3.Connection, staging: str) -> list[str]:
+    """ Создает таблицу транзакций по колонкам первой загруженной выписки,
+    новые колонки следующих выписок добавляет. Возвращает колонки выписки."""
+    staging_columns = [row[1] for row in connection.execute(f"PRAGMA table_info({staging})")]
+    staging_types = {row[1]: row[2] for row in connection.execute(f"PRAGMA table_info({staging})")}
+    columns = _table_columns(connection)
+    if not columns:
+        data_columns = [f"{_quote(column)} {staging_types[column]}"
+                        for column in staging_columns if column not in SERVICE_COLUMNS]
+        connection.execute(f"CREATE TABLE {TABLE} ({KEY_COLUMN} TEXT PRIMARY KEY, {DATE_COLUMN} TEXT, "
+                           f"{', '.join(data_columns)})")
+    else:
+        for column in staging_columns:
+            if column not in columns:
+                logger.info("В базу транзакций добавлена колонка %s", column)
+                connection.execute(f"ALTER TABLE {TABLE} ADD COLUMN {_quote(column)} {staging_types[column]}")
+    _ensure_indexes(connection)
+    return staging_columns
+
+
+def _ensure_indexes(connection: sqlite3.Connection) -> None:
+    """ Создает недостающие индексы INDEXES (для колонок, которые есть в таблице)."""
+    columns = _table_columns(connection)
+    for name, index_columns in INDEXES.items():
+        if all(column in columns for column in index_columns):
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {TABLE} "
+                               f"({', '.join(_quote(column) for column in index_columns)})")
+
+
+def _insert_chunk(connection: sqlite3.Connection, chunk: pd.DataFrame, seen: Counter) -> pd.DataFrame:
+    """ Добавляет в базу строки порции, которых в ней еще нет. Возвращает добавленные строки."""
+    keys = transaction_keys(chunk, seen)
+    dates = pd.to_datetime(chunk["Дата операции"], format=DATE_FORMAT, errors="coerce")
+    staged = chunk.assign(**{KEY_COLUMN: keys, DATE_COLUMN: dates.dt.strftime(ISO_FORMAT)})
+    # Повторы внутри одной выписки уже различаются порядковым номером в ключе
+    staged.to_sql("staging", connection, if_exists="replace", index=False)
+    columns = ", ".join(_quote(column) for column in _ensure_table(connection, "staging"))
+
+    existing = {row[0] for row in connection.execute(
+        f"SELECT s.{KEY_COLUMN} FROM staging s JOIN {TABLE} t ON t.{KEY_COLUMN} = s.{KEY_COLUMN}")}
+    connection.execute(f"INSERT OR IGNORE INTO {TABLE} ({columns}) SELECT {columns} FROM staging")
+    connection.execute("DROP TABLE staging")
+    return chunk[~keys.isin(existing)]
+
+
+def ingest_statement(path: str,
+                     db_path: str = TRANSACTIONS_DB,
+                     chunk_size: int = STREAM_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Дозагружает выписку (Excel или CSV) в базу транзакций SQLite.
+    Выписка читается порциями, в базу попадают только транзакции, которых в ней еще нет
+    (по ключу transaction_keys), поэтому стоимость загрузки зависит от размера выписки,
+    а не от всей накопленной истории.
+    Returns:
+        DataFrame с добавленными транзакциями (в исходном виде выписки)
+    """
+    logger.info("Загрузка выписки %s в базу %s", path, db_path)
+    seen: Counter = Counter()
+    added = []
+    rows = 0
+    with connect(db_path) as connection:
+        for chunk in iter_transaction_chunks(path, chunk_size):
+            rows += len(chunk)
+            added.append(_insert_chunk(connection, chunk, seen))
+    connection.close()
+
+    new_transactions = pd.concat(added, ignore_index=True) if added else pd.DataFrame()
+    logger.info("Из %s транзакций выписки добавлено %s новых", rows, len(new_transactions))
+    return new_transactions
+
+
+def read_transactions(db_path: str = TRANSACTIONS_DB,
+                      where: str = "",
+                      params: tuple = ()) -> pd.DataFrame:
+    """
+    Читает транзакции из базы в том же виде, что и pd.read_excel для выгрузки банка
+    (служебные колонки не возвращаются). where - необязательное условие SQL для отбора строк.
+    """
+    with connect(db_path) as connection:
+        columns = {column: column_type for column, column_type in _table_columns(connection).items()
+                   if column not in SERVICE_COLUMNS}
+        if not columns:
+            connection.close()
+            logger.warning("База транзакций %s пуста", db_path)
+            return pd.DataFrame()
+        query = f"SELECT {', '.join(_quote(column) for column in columns)} FROM {TABLE}"
+        if where:
+            query += f" WHERE {where}"
+        query += f" ORDER BY {DATE_COLUMN}, rowid"
+        # Пустые значения в числовых колонках читаются как NaN, как в Excel
+        dtypes = {column: "float64" for column, column_type in columns.items() if column_type == "REAL"}
+        df = pd.read_sql_query(query, connection, params=params, dtype=dtypes)
+    connection.close()
+    logger.debug("Из базы %s прочитано %s транзакций", db_path, len(df))
+    return df
+
+
+def get_categories(db_path: str = TRANSACTIONS_DB) -> list[str]:
+    """ Все категории транзакций в базе (читаются из индекса по категории)."""
+    with connect(db_path) as connection:
+        if "Категория" not in _table_columns(connection):
+            categories = []
+        else:
+            categories = [row[0] for row in connection.execute(
+                f"SELECT DISTINCT {_quote('Категория')} FROM {TABLE} WHERE {_quote('Категория')} IS NOT NULL")]
+    connection.close()
+    return categories
+
+
+def load_transactions(db_path: str = TRANSACTIONS_DB,
+                      start: Optional[datetime] = None,
+                      end: Optional[datetime] = None,
+                      categories: Optional[Sequence[str]] = None,
+                      cards: Optional[Sequence[str]] = None,
+                      expenses_only: bool = False) -> pd.DataFrame:
+    """
+    Транзакции из базы в том же виде, что и get_cards, но только нужные строки:
+    отбор по периоду (start - end включительно), категориям, картам и расходам
+    выполняется запросом SQL по индексам, вся история в память не загружается.
+    """
+    conditions = []
+    params: list = []
+    if start is not None:
+        conditions.append(f"{DATE_COLUMN} >= ?")
+        params.append(start.strftime(ISO_FORMAT))
+    if end is not None:
+        conditions.append(f"{DATE_COLUMN} <= ?")
+        params.append(end.strftime(ISO_FORMAT))
+    for column, values in (("Категория", categories), ("Номер карты", cards)):
+        if values is not None:
+            conditions.append(f"{_quote(column)} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    if expenses_only:
+        conditions.append(f"{_quote('Сумма операции')} < 0")
+
+    df = read_transactions(db_path, " AND ".join(conditions), tuple(params))
+    logger.info("Из базы %s отобрано %s транзакций", db_path, len(df))
+    return apply_schema(index_by_operation_date(df))
+
+
+if __name__ == '__main__':
+    # python -m src.database <выписка.xlsx> [база.db]
+    statement = sys.argv[1]
+    database = sys.argv[2] if len(sys.argv) > 2 else TRANSACTIONS_DB
+    print(f"Добавлено транзакций: {len(ingest_statement(statement, database))}")
@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar, cast
+
+import pandas as pd
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class StageMetrics:
+    """ Замер одного этапа: длительность, обработанные строки и память (tracemalloc)."""
+
+    def __init__(self, name: str, depth: int) -> None:
+        self.name = name
+        self.depth = depth    # вложенность этапа (0 - верхний уровень)
+        self.rows: Optional[int] = None
+        self.seconds = 0.0
+        self.allocated_bytes = 0    # прирост занятой памяти за этап
+        self.peak_bytes = 0    # пик памяти во время этапа относительно его начала
+        self.child_peak = 0    # абсолютный пик памяти, сброшенный вложенными этапами
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"stage": self.name, "depth": self.depth, "seconds": round(self.seconds, 6), "rows": self.rows,
+                "allocated_bytes": self.allocated_bytes, "peak_bytes": self.peak_bytes}
+
+
+class Metrics:
+    """ Замеры этапов одного вызова (см. collect_metrics) в порядке их завершения."""
+
+    def __init__(self) -> None:
+        self.stages: List[StageMetrics] = []
+        self._lock = threading.Lock()
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [stage.to_dict() for stage in self.stages]
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.to_list(), indent=indent, ensure_ascii=False)
+
+
+_current_metrics: ContextVar[Optional[Metrics]] = ContextVar("current_metrics", default=None)
+# этап, внутри которого выполняется код; потоки пула получают его вместе с копией контекста
+_current_stage: ContextVar[Optional[StageMetrics]] = ContextVar("current_stage", default=None)
+
+# tracemalloc общий для процесса: его останавливает последний завершившийся collect_metrics
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+
+@contextmanager
+def collect_metrics() -> Iterator[Metrics]:
+    """
+    Включает замеры этапов (stage, profile_stage) для кода внутри блока:
+        with collect_metrics() as metrics:
+            get_main_page_info(date)
+        print(metrics.to_json())
+    Вне блока этапы ничего не замеряют. Память считается через tracemalloc,
+    который запускается на время блока, если не был запущен раньше.
+    tracemalloc один на процесс: если блоки выполняются одновременно в разных потоках,
+    трассировка остается включенной до конца последнего из них, но память, занятая
+    одновременными запросами, попадает в замеры каждого - для точных замеров памяти
+    профилируйте запросы по одному.
+    """
+    global _tracing_users, _started_tracing
+    metrics = Metrics()
+    with _tracing_lock:
+        if _tracing_users == 0:
+            _started_tracing = not tracemalloc.is_tracing()
+            if _started_tracing:
+                tracemalloc.start()
+        _tracing_users += 1
+    metrics_token = _current_metrics.set(metrics)
+    stage_token = _current_stage.set(None)
+    try:
+        yield metrics
+    finally:
+        _current_stage.reset(stage_token)
+        _current_metrics.reset(metrics_token)
+        with _tracing_lock:
+            _tracing_users -= 1
+            if _tracing_users == 0 and _started_tracing:
+                tracemalloc.stop()
+                _started_tracing = False
+
+
+def profiling_enabled() -> bool:
+    """ True внутри collect_metrics."""
+    return _current_metrics.get() is not None
+
+
+@contextmanager
+def stage(name: str, rows: Optional[int] = None) -> Iterator[Optional[StageMetrics]]:
+    """
+    Замер этапа внутри collect_metrics; строки можно указать сразу или позже через stage.rows:
+        with stage("Загрузка") as current:
+            df = ...
+            if current: current.rows = len(df)
+    Вне collect_metrics возвращает None и ничего не замеряет.
+    Внешний этап берется из контекста, поэтому этапы, запущенные одновременно в потоках пула
+    (через contextvars.copy_context), записываются соседями, а не вложенными друг в друга.
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        yield None
+        return
+
+    parent = _current_stage.get()
+    current = StageMetrics(name, 0 if parent is None else parent.depth + 1)
+    current.rows = rows
+    memory_before = 0
+    with metrics._lock:
+        if tracemalloc.is_tracing():
+            # reset_peak сбрасывает пик и для внешнего этапа - сохраняем его пик до начала вложенного
+            memory_before, peak_before = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent.child_peak = max(parent.child_peak, peak_before)
+            tracemalloc.reset_peak()
+    token = _current_stage.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - start
+        _current_stage.reset(token)
+        with metrics._lock:
+            if tracemalloc.is_tracing():
+                memory_after, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, current.child_peak)
+                current.allocated_bytes = memory_after - memory_before
+                current.peak_bytes = max(peak - memory_before, 0)
+            # и передаем внешнему этапу пик вложенного
+            if parent is not None:
+                parent.child_peak = max(parent.child_peak, current.peak_bytes + memory_before)
+            metrics.stages.append(current)
+
+
+def profile_stage(name: str) -> Callable[[F], F]:
+    """
+    Декоратор: вызов функции замеряется как этап name (см. stage).
+    Строки - длина первого аргумента-DataFrame (или списка), если его нет - длина результата-DataFrame.
+    """
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _current_metrics.get() is None:
+                return func(*args, **kwargs)
+            with stage(name) as current:
+                result = func(*args, **kwargs)
+                if current is not None:
+                    current.rows = _count_rows(args, result)
+                return result
+        return cast(F, wrapper)
+    return decorator
+
+
+def _count_rows(args: tuple, result: Any) -> Optional[int]:
+    """ Количество обработанных строк для profile_stage."""
+    for arg in args:
+        if isinstance(arg, (pd.DataFrame, list)):
+            return len(arg)
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    return None
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import QUOTE_STALE_TTL, QUOTE_TTL, QUOTE_TTLS
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class QuoteCache:
+    """
+    Кеш котировок с временем жизни (TTL).
+    - свежее значение (моложе TTL) отдается сразу;
+    - устаревшее, но моложе TTL + stale_ttl, отдается сразу, а обновление запускается в фоне;
+    - более старое или отсутствующее значение запрашивается синхронно;
+    - если API вернул ошибку, отдается последнее успешно полученное значение.
+    Ключ - строка вида "currency:USD" или "stock:AAPL", TTL можно задать для символа отдельно.
+    При указании snapshot_path кеш сохраняется на диск и переживает перезапуск процесса.
+    """
+
+    def __init__(self,
+                 ttl: float = QUOTE_TTL,
+                 stale_ttl: float = QUOTE_STALE_TTL,
+                 ttls: Optional[Dict[str, float]] = None,
+                 snapshot_path: Optional[str] = None,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.ttls = dict(QUOTE_TTLS if ttls is None else ttls)
+        self.snapshot_path = snapshot_path
+        self._clock = clock
+        self._entries: Dict[str, Tuple[Any, float]] = {}
+        self._refreshing: set[str] = set()
+        self._snapshot_loaded = False
+        self.epoch = 0    # растет при каждом изменении котировок в кеше
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="quote-refresh")
+
+    def ttl_for(self, key: str) -> float:
+        """ TTL для ключа: индивидуальный для ключа или символа, иначе общий."""
+        symbol = key.split(":", 1)[-1]
+        return self.ttls.get(key, self.ttls.get(symbol, self.ttl))
+
+    def get(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """ Возвращает котировку по ключу, при необходимости запрашивая ее функцией fetch."""
+        return self.get_many([key], lambda keys: {key: fetch()})[key]
+
+    def get_many(self, keys: List[str], fetch_many: Callable[[List[str]], Dict[str, Any]]) -> Dict[str, Any]:
+        """ Возвращает котировки по списку ключей. Все недостающие и просроченные ключи
+        запрашиваются одним вызовом fetch_many(ключи) -> {ключ: значение}.
+        Ключи, которых нет в ответе API и нет в кеше, в результат не попадают."""
+        result: Dict[str, Any] = {}
+        missing: List[str] = []
+        stale: List[str] = []
+        with self._lock:
+            self._load_snapshot()
+            now = self._clock()
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or now - entry[1] >= self.ttl_for(key) + self.stale_ttl:
+                    missing.append(key)
+                    continue
+                result[key] = entry[0]
+                if now - entry[1] >= self.ttl_for(key):
+                    stale.append(key)
+            if result:
+                logger.debug("Котировки из кеша: %s", ', '.join(result))
+            if stale:
+                logger.debug("Котировки устарели, обновляем в фоне: %s", ', '.join(stale))
+                self._refresh_in_background(stale, fetch_many)
+
+        if missing:
+            try:
+                fetched = fetch_many(missing)
+            except Exception as exc:
+                with self._lock:
+                    known = {key: self._entries[key][0] for key in missing if key in self._entries}
+                if len(known) < len(missing):
+                    raise
+                logger.warning("Ошибка обновления котировок %s: %s. Используем последние значения",
+                               ', '.join(missing), exc)
+                fetched = known
+            else:
+                self.set_many(fetched)
+            for key in missing:
+                if key in fetched:
+                    result[key] = fetched[key]
+                elif key in self._entries:
+                    result[key] = self._entries[key][0]
+        return result
+
+    def set(self, key: str, value: Any) -> None:
+        """ Сохраняет котировку в кеш (и в снимок на диске, если он включен)."""
+        self.set_many({key: value})
+
+    def set_many(self, values: Dict[str, Any]) -> None:
+        """ Сохраняет несколько котировок в кеш одним обновлением снимка."""
+        with self._lock:
+            self._load_snapshot()
+            now = self._clock()
+            for key, value in values.items():
+                self._entries[key] = (value, now)
+            self.epoch += 1
+            self._save_snapshot()
+
+    def clear(self) -> None:
+        """ Очищает кеш в памяти."""
+        with self._lock:
+            self._entries.clear()
+            self.epoch += 1
+
+    def _refresh_in_background(self, keys: List[str], fetch_many: Callable[[List[str]], Dict[str, Any]]) -> None:
+        """ Запускает обновление котировок в фоне (не более одного обновления на ключ)."""
+        keys = [key for key in keys if key not in self._refreshing]
+        if not keys:
+            return
+        self._refreshing.update(keys)
+
+        def refresh() -> None:
+            try:
+                self.set_many(fetch_many(keys))
+                logger.debug("Котировки обновлены в фоне: %s", ', '.join(keys))
+            except Exception as exc:
+                logger.warning("Ошибка фонового обновления котировок %s: %s", ', '.join(keys), exc)
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update(keys)
+
+        self._executor.submit(refresh)
+
+    def _load_snapshot(self) -> None:
+        """ Один раз загружает снимок кеша с диска."""
+        if self._snapshot_loaded or self.snapshot_path is None:
+            return
+        self._snapshot_loaded = True
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as file:
+                snapshot = json.load(file)
+            for key, item in snapshot.items():
+                self._entries.setdefault(key, (item["value"], item["fetched_at"]))
+            logger.debug("Загружен снимок котировок: %s шт.", len(snapshot))
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning("Не удалось прочитать снимок котировок %s: %s", self.snapshot_path, exc)
+
+    def _save_snapshot(self) -> None:
+        """ Записывает снимок кеша на диск через временный файл."""
+        if self.snapshot_path is None:
+            return
+        snapshot = {key: {"value": value, "fetched_at": fetched_at}
+                    for key, (value, fetched_at) in self._entries.items()}
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            with open(f"{self.snapshot_path}.tmp", "w", encoding="utf-8") as file:
+                json.dump(snapshot, file)
+            os.replace(f"{self.snapshot_path}.tmp", self.snapshot_path)
+        except OSError as exc:
+            logger.warning("Не удалось сохранить снимок котировок %s: %s", self.snapshot_path, exc)
@@ -1,87 +1,291 @@
+import copy
+import importlib.util
 import json
 import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
 from functools import wraps
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Dict, List, Optional, Set
 
 import pandas as pd
 from pandas import DataFrame
 
-from config import PATH_DATA
-from logger import logger
+from config import PATH_DATA, REPORT_BACKGROUND, REPORT_FILENAME, REPORT_FORMAT
+from logger import get_logger
+from src.database import load_transactions
+from src.profiling import profile_stage, stage
+from src.rollups import DailyRollups
+from src.schema import restore_amounts, to_rubles
+from src.utils import get_operation_dates, in_export_order, select_period
 
+logger = get_logger(__name__)
 
-def report_to_file(filename: Optional[str] = None) -> Callable:
+REPORT_EXTENSIONS = {"json": ".json", "jsonl": ".jsonl", "parquet": ".parquet"}
+
+# Фоновая запись отчетов: один поток, поэтому отчеты с одним именем записываются в порядке вызова.
+# При завершении программы незаписанные отчеты дописываются (пул дожидается своих задач)
+_report_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reports")
+_pending_reports: Set[Future] = set()
+_pending_lock = threading.Lock()
+
+
+def report_to_file(filename: Optional[str] = None,
+                   file_format: str = REPORT_FORMAT,
+                   background: bool = REPORT_BACKGROUND) -> Callable:
     """
        Декоратор для сохранения результатов отчета в файл.
-       Если имя файла не указано, генерирует имя автоматически.
+       Если имя файла не указано, генерирует имя автоматически (REPORT_FILENAME).
+       Имя может быть шаблоном: {name} - имя функции отчета, {timestamp} - время запуска,
+       {unique} - случайная строка, например "{name}_{timestamp}_{unique}".
+       Если в имени нет расширения, добавляется расширение формата.
+       file_format: "json", "jsonl" (JSON Lines - одна запись в строке) или "parquet".
+       background: файл пишется в фоновом потоке, отчет возвращается сразу (дождаться записи - flush_reports).
+       Файл записывается во временный и переименовывается, поэтому читатели и одновременные
+       отчеты с тем же именем никогда не видят недописанный файл.
        """
+    if file_format not in REPORT_EXTENSIONS:
+        raise ValueError(f"Неизвестный формат отчета: {file_format}")
+    if file_format == "parquet" and not _parquet_available():
+        raise ImportError("Для отчетов в формате parquet нужен pyarrow или fastparquet")
+
     def inner(report_func: Callable[..., Any]) -> Callable[..., Any]:
         @wraps(report_func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
             result = report_func(*args, **kwargs)
 
             # Генерируем имя файла, если не указано
-            if filename is None:
-                file_name = "report_file.json"
-            else:
-                file_name = filename
-
-            # Сохраняем результат в файл
+            file_name = _report_file_name(REPORT_FILENAME if filename is None else filename,
+                                          report_func.__name__, file_format)
             file_path = str(os.path.join(PATH_DATA, file_name))
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
             if isinstance(result, pd.DataFrame):
-                result.to_json(file_path, orient='records', indent=4, force_ascii=False)
-            else:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, indent=4, ensure_ascii=False)
-
-            logger.info(f"Отчет сохранен в файл: {file_path}")
+                result.attrs["report_path"] = file_path
 
+            with stage("report_write", len(result) if isinstance(result, pd.DataFrame) else None):
+                if background:
+                    # В фоновый поток передается копия: вызывающий код может изменять результат
+                    _submit_report(file_path, _snapshot(result), file_format)
+                else:
+                    _write_report(file_path, result, file_format)
             return result
         return wrapper
     return inner
 
 
+def flush_reports(timeout: Optional[float] = None) -> List[str]:
+    """ Ждет записи всех отчетов, переданных в фоновый поток. Возвращает пути записанных файлов.
+    Если запись отчета завершилась ошибкой, исключение передается вызывающему коду."""
+    with _pending_lock:
+        pending = list(_pending_reports)
+    done, not_done = wait(pending, timeout=timeout)
+    if not_done:
+        raise TimeoutError(f"Не записано отчетов: {len(not_done)}")
+    return [str(future.result()) for future in pending]
+
+
+def _report_file_name(template: str, report_name: str, file_format: str) -> str:
+    """ Имя файла отчета по шаблону; без расширения добавляется расширение формата."""
+    file_name = template.format(name=report_name, timestamp=datetime.now().strftime("%Y%m%d_%H%M%S_%f"),
+                                unique=uuid.uuid4().hex[:8])
+    if not os.path.splitext(file_name)[1]:
+        file_name += REPORT_EXTENSIONS[file_format]
+    return file_name
+
+
+def _parquet_available() -> bool:
+    """ Установлена библиотека для записи parquet (pandas использует pyarrow или fastparquet)."""
+    return any(importlib.util.find_spec(engine) is not None for engine in ("pyarrow", "fastparquet"))
+
+
+def _snapshot(result: Any) -> Any:
+    """ Копия результата отчета для записи в фоновом потоке."""
+    if isinstance(result, pd.DataFrame):
+        return result.copy()
+    return copy.deepcopy(result)
+
+
+def _submit_report(file_path: str, result: Any, file_format: str) -> Future:
+    """ Передает запись отчета в фоновый поток."""
+    future = _report_writer.submit(_write_report, file_path, result, file_format)
+    with _pending_lock:
+        _pending_reports.add(future)
+    future.add_done_callback(_report_written)
+    return future
+
+
+def _report_written(future: Future) -> None:
+    with _pending_lock:
+        _pending_reports.discard(future)
+    error = future.exception()
+    if error is not None:
+        logger.error("Ошибка записи отчета: %s", error)
+
+
+def _write_report(file_path: str, result: Any, file_format: str) -> str:
+    """ Записывает отчет во временный файл рядом с file_path и переименовывает его (os.replace)."""
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    # Уникальное имя временного файла: одновременные записи одного отчета не мешают друг другу
+    temp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        if file_format == "parquet":
+            frame = result if isinstance(result, pd.DataFrame) else pd.DataFrame(result)
+            frame.to_parquet(temp_path)
+        elif isinstance(result, pd.DataFrame):
+            if file_format == "jsonl":
+                result.to_json(temp_path, orient='records', lines=True, force_ascii=False)
+            else:
+                result.to_json(temp_path, orient='records', indent=4, force_ascii=False)
+        else:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                if file_format == "jsonl":
+                    for record in (result if isinstance(result, list) else [result]):
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                else:
+                    json.dump(result, f, indent=4, ensure_ascii=False)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    logger.info("Отчет сохранен в файл: %s", file_path)
+    return file_path
+
+
+def _get_report_period(date: Optional[str] = None) -> tuple[datetime, datetime]:
+    """ Период отчета: три месяца до указанной даты (формат YYYY-MM-DD) или до текущей даты."""
+    if date is None:
+        date_dt = datetime.now()
+    else:
+        date_dt = datetime.strptime(date, "%Y-%m-%d")      # конец периода
+
+    start_dt = date_dt - pd.DateOffset(months=3)                      # начало периода
+    return start_dt, date_dt
+
+
+def _select_expenses(transactions: pd.DataFrame, date: Optional[str] = None) -> pd.DataFrame:
+    """ Расходы (отрицательные суммы операций) за период отчета."""
+    start_dt, date_dt = _get_report_period(date)
+
+    # Фильтрация данных: сначала период (для индексированной таблицы - срез без копирования),
+    # затем сумма только по строкам периода
+    period_transactions = select_period(transactions, start_dt, date_dt)
+    return period_transactions[period_transactions["Сумма операции"] < 0]
+
+
+def _with_report_dates(transactions: pd.DataFrame) -> pd.DataFrame:
+    """ Даты в отчете - datetime, суммы - в рублях: новые колонки создаются только для отобранных строк,
+    исходная таблица остается без изменений."""
+    return restore_amounts(transactions).assign(**{"Дата операции": get_operation_dates(transactions).to_numpy()})
+
+
 @report_to_file()       # "fast_food_report.json"
 def spending_by_category(transactions: pd.DataFrame,
                          category: str,
                          date: Optional[str] = None) -> pd.DataFrame:
     """
        Возвращает траты по заданной категории за последние три месяца.
+       Переданный DataFrame не изменяется, поэтому одну загруженную таблицу можно
+       использовать для любого количества отчетов подряд.
            transactions: DataFrame с транзакциями
            category: Название категории для фильтрации
            date: Опциональная дата (формат YYYY-MM-DD). Если не указана - используется текущая дата.
        Returns:
            Отфильтрованный DataFrame с транзакциями
     """
-    if date is None:
-        date_dt = datetime.now()
-    else:
-        date_dt = datetime.strptime(date, "%Y-%m-%d")      # конец периода
-
-    start_dt = date_dt - pd.DateOffset(months=3)                      # начало периода
+    return select_category_spending(transactions, category, date)
 
-    # Преобразуем даты в DataFrame к datetime
-    transactions["Дата операции"] = pd.to_datetime(
-        transactions["Дата операции"],
-        format="%d.%m.%Y %H:%M:%S",
-        dayfirst=True)
 
-    # Фильтрация данных
-    start_filter = (transactions["Дата операции"] >= start_dt)
-    end_filter = (transactions["Дата операции"] <= date_dt)
+def spending_by_category_in_database(db_path: str,
+                                     category: str,
+                                     date: Optional[str] = None) -> pd.DataFrame:
+    """
+       spending_by_category по базе транзакций SQLite (src.database): из базы запросом
+       по индексу (категория, дата) читаются только расходы категории за период отчета.
+       Отчет сохраняется в файл так же, как в spending_by_category.
+    """
+    expenses = load_transactions(db_path, *_get_report_period(date), categories=[category], expenses_only=True)
+    report: DataFrame = spending_by_category(expenses, category, date)
+    return report
 
-    filter_amount = transactions["Сумма операции"] < 0
-    filter_category = transactions["Категория"] == category
 
-    selected_transactions: DataFrame = transactions[start_filter & end_filter & filter_amount & filter_category]
-    logger.debug(f"Найдено {len(selected_transactions)} операций")
+@profile_stage("category_spending")
+def select_category_spending(transactions: pd.DataFrame,
+                             category: str,
+                             date: Optional[str] = None) -> pd.DataFrame:
+    """ Траты по категории за последние три месяца (spending_by_category без записи отчета в файл)."""
+    expenses = _select_expenses(transactions, date)
+    selected_transactions: DataFrame = _with_report_dates(in_export_order(expenses[expenses["Категория"] == category]))
+    logger.debug("Найдено %s операций", len(selected_transactions))
 
     return selected_transactions
 
 
+@profile_stage("split_by_category")
+def split_by_category(transactions: pd.DataFrame,
+                      categories: Optional[List[str]] = None,
+                      date: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+    """
+       Возвращает траты за последние три месяца сразу по нескольким категориям:
+       одна фильтрация по периоду и одна группировка вместо отдельного прохода на каждую категорию.
+           transactions: DataFrame с транзакциями
+           categories: Список категорий. Если не указан - все категории с тратами за период.
+           date: Опциональная дата (формат YYYY-MM-DD). Если не указана - используется текущая дата.
+       Returns:
+           Словарь {категория: DataFrame с транзакциями категории}
+    """
+    expenses = _select_expenses(transactions, date)
+    if categories is not None:
+        expenses = expenses[expenses["Категория"].isin(categories)]
+    expenses = _with_report_dates(in_export_order(expenses))
+
+    result = {str(category): group for category, group in expenses.groupby("Категория", observed=True)}
+    for category in categories or []:
+        result.setdefault(category, expenses.iloc[0:0])
+    logger.debug("Найдено %s операций по %s категориям", len(expenses), len(result))
+    return result
+
+
+@report_to_file("categories_report.json")
+@profile_stage("categories_report")
+def spending_by_categories(transactions: pd.DataFrame,
+                           categories: Optional[List[str]] = None,
+                           date: Optional[str] = None,
+                           rollups: Optional[DailyRollups] = None) -> pd.DataFrame:
+    """
+       Сводный отчет по тратам за последние три месяца по нескольким категориям
+       (один проход по данным и один файл отчета).
+           transactions: DataFrame с транзакциями
+           categories: Список категорий. Если не указан - все категории с тратами за период.
+           date: Опциональная дата (формат YYYY-MM-DD). Если не указана - используется текущая дата.
+           rollups: Дневные корзины расходов по transactions (TransactionStore.rollups).
+           Если переданы - суммы складываются из корзин, а не из строк.
+       Returns:
+           DataFrame с колонками "Категория", "Сумма операции" (сумма трат) и "Количество операций"
+    """
+    if rollups is None:
+        expenses = _select_expenses(transactions, date)
+        if categories is not None:
+            expenses = expenses[expenses["Категория"].isin(categories)]
+        totals = expenses.groupby("Категория", observed=True)["Сумма операции"].agg(["sum", "count"])
+        totals.columns = ["Сумма операции", "Количество операций"]
+        totals.index = totals.index.astype(object)
+    else:
+        totals = rollups.category_totals(transactions, *_get_report_period(date))
+        if categories is not None:
+            totals = totals[totals.index.isin(categories)]
+
+    totals["Сумма операции"] = to_rubles(totals["Сумма операции"], transactions)
+    if categories is not None:
+        totals = totals.reindex(categories, fill_value=0)
+    totals = totals.rename_axis("Категория").reset_index()
+    logger.debug("Сформирован отчет по %s категориям", len(totals))
+
+    return totals
+
+
 # if __name__ == '__main__':
 #     all_transactions = get_cards(PATH_XLSX)
 #     report_data = spending_by_category(all_transactions, "Дом и ремонт", "2021-11-25")
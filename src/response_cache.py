@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ResponseCache:
+    """
+    Кеш готовых ответов (например, JSON главной страницы) с вытеснением давно не использованных (LRU).
+    Ключ должен включать все, от чего зависит ответ: входные параметры и версии данных,
+    поэтому при изменении данных старые ответы просто перестают запрашиваться и вытесняются.
+    ttl ограничивает возраст ответа, max_size - количество ответов (0 - кеш отключен).
+    """
+
+    def __init__(self,
+                 max_size: int = RESPONSE_CACHE_SIZE,
+                 ttl: float = RESPONSE_CACHE_TTL,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, Tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """ Возвращает ответ по ключу из кеша или строит его функцией build и сохраняет."""
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """ Ответ по ключу, если он есть в кеше и не старше ttl, иначе None. Устаревший ответ удаляется."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._clock() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """ Сохраняет ответ, удаляя устаревшие и вытесняя давно не использованные сверх max_size."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            now = self._clock()
+            for expired in [item for item, (_, created) in self._entries.items() if now - created >= self.ttl]:
+                del self._entries[expired]
+            self._entries[key] = (value, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        """ Удаляет ответ по ключу, если он есть."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """ Очищает кеш."""
+        with self._lock:
+            self._entries.clear()
+        logger.debug("Кеш ответов очищен")
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,115 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pandas as pd
+
+from logger import get_logger
+from src.utils import get_operation_dates, select_period
+
+logger = get_logger(__name__)
+
+ROLLUP_COLUMNS = ["Сумма операции", "Количество операций"]
+
+
+class DailyRollups:
+    """
+    Предрасчитанные расходы (отрицательные "Сумма операции") по дням:
+    в разрезе (день, карта) и (день, категория).
+    Запросы за период складывают готовые дневные корзины, а по неполным дням на границах
+    периода досчитывают только строки этих дней из исходной таблицы.
+    Новые транзакции добавляются через append без пересчета уже накопленных корзин.
+    """
+
+    def __init__(self, transactions: Optional[pd.DataFrame] = None) -> None:
+        self.by_card = self._empty()
+        self.by_category = self._empty()
+        self._lock = threading.RLock()
+        if transactions is not None:
+            self.append(transactions)
+
+    @staticmethod
+    def _empty() -> pd.DataFrame:
+        index = pd.MultiIndex.from_arrays([pd.DatetimeIndex([]), pd.Index([], dtype=object)], names=["day", "key"])
+        return pd.DataFrame({column: pd.Series(dtype="int64") for column in ROLLUP_COLUMNS}, index=index)
+
+    def append(self, transactions: pd.DataFrame) -> None:
+        """ Добавляет в корзины новые транзакции."""
+        if transactions.empty:
+            return
+        expenses = transactions[transactions["Сумма операции"] < 0]
+        days = get_operation_dates(expenses).dt.normalize().to_numpy()
+        with self._lock:
+            self.by_card = self._merge(self.by_card, self._group(expenses, days, "Номер карты"))
+            self.by_category = self._merge(self.by_category, self._group(expenses, days, "Категория"))
+        logger.debug("В дневные корзины добавлено %s расходов", len(expenses))
+
+    @staticmethod
+    def _group(expenses: pd.DataFrame, days: object, column: str) -> pd.DataFrame:
+        """ Суммы и количество расходов по (день, значение колонки)."""
+        keys = expenses[column].astype(object).to_numpy()
+        grouped = expenses.groupby([days, keys])["Сумма операции"].agg(["sum", "count"])
+        grouped.columns = ROLLUP_COLUMNS
+        grouped.index = grouped.index.set_names(["day", "key"])
+        return grouped
+
+    @staticmethod
+    def _merge(buckets: pd.DataFrame, new_buckets: pd.DataFrame) -> pd.DataFrame:
+        if buckets.empty:
+            return new_buckets.sort_index()
+        return pd.concat([buckets, new_buckets]).groupby(level=["day", "key"]).sum().sort_index()
+
+    @property
+    def memory_usage(self) -> int:
+        """ Объем памяти (в байтах), занятый корзинами."""
+        with self._lock:
+            return int(self.by_card.memory_usage(deep=True).sum() + self.by_category.memory_usage(deep=True).sum())
+
+    def card_totals(self, transactions: pd.DataFrame, start: datetime, end: datetime) -> pd.Series:
+        """ Сумма расходов по картам за период [start, end] (в единицах исходной таблицы)."""
+        return self._totals(self.by_card, "Номер карты", transactions, start, end)["Сумма операции"]
+
+    def category_totals(self, transactions: pd.DataFrame, start: datetime, end: datetime) -> pd.DataFrame:
+        """ Сумма и количество расходов по категориям за период [start, end]."""
+        return self._totals(self.by_category, "Категория", transactions, start, end)
+
+    def _totals(self,
+                buckets: pd.DataFrame,
+                column: str,
+                transactions: pd.DataFrame,
+                start: datetime,
+                end: datetime) -> pd.DataFrame:
+        """ Складывает полные дни периода из корзин и досчитывает неполные дни на границах
+        по строкам transactions."""
+        start_ts, end_ts = pd.Timestamp(start), pd.Timestamp(end)
+        first_full_day = start_ts.normalize()
+        if first_full_day != start_ts:
+            first_full_day += timedelta(days=1)
+        end_day = end_ts.normalize()    # день end неполный: считается по строкам
+
+        parts = []
+        if first_full_day < end_day:
+            with self._lock:
+                full_days = buckets.loc[first_full_day:end_day - timedelta(microseconds=1)]
+            parts.append(full_days.groupby(level="key").sum())
+            raw_periods = [(start_ts, first_full_day - timedelta(microseconds=1)), (end_day, end_ts)]
+        else:
+            raw_periods = [(start_ts, end_ts)]
+
+        for raw_start, raw_end in raw_periods:
+            if raw_start > raw_end:
+                continue
+            period = select_period(transactions, raw_start, raw_end)
+            expenses = period[period["Сумма операции"] < 0]
+            keys = expenses[column].astype(object).to_numpy()
+            grouped = expenses.groupby(keys)["Сумма операции"].agg(["sum", "count"])
+            grouped.columns = ROLLUP_COLUMNS
+            parts.append(grouped)
+
+        parts = [part for part in parts if not part.empty]
+        if not parts:
+            return pd.DataFrame({column: pd.Series(dtype="int64") for column in ROLLUP_COLUMNS})
+        totals = pd.concat(parts).groupby(level=0).sum().sort_index()
+        totals.index.name = column
+        totals.attrs = dict(transactions.attrs)
+        return totals
@@ -0,0 +1,85 @@
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+# Денежные колонки: хранятся в копейках (целые числа)
+AMOUNT_COLUMNS = ["Сумма операции", "Сумма платежа", "Кэшбэк", "Сумма операции с округлением"]
+# Колонки с небольшим количеством различных значений: хранятся как category (коды + словарь)
+CATEGORY_COLUMNS = ["Дата платежа", "Номер карты", "Статус", "Валюта операции", "Валюта платежа", "Категория",
+                    "Описание"]
+# Признак в DataFrame.attrs: список денежных колонок таблицы, которые хранятся в копейках
+KOPECKS_ATTR = "amounts_in_kopecks"
+
+
+def apply_schema(transactions_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Приводит загруженные транзакции к компактной схеме:
+    - текстовые колонки с повторяющимися значениями (категория, описание, статус, валюты,
+      номер карты) - category;
+    - денежные колонки - целые копейки (int32, при больших суммах int64; Int32/Int64 при пропусках);
+    - остальные числовые колонки - минимальный подходящий тип.
+    В копейки переводятся все числовые денежные колонки, кроме уже переведенных (см. kopeck_columns):
+    целые суммы - это целые рубли, pd.read_excel читает их как int64.
+    Переведенные колонки перечисляются в attrs, признак переносится на срезы и выборки из таблицы.
+    """
+    converted = kopeck_columns(transactions_df)
+    columns = {}
+    for column in transactions_df.columns:
+        series = transactions_df[column]
+        if column in CATEGORY_COLUMNS and series.dtype == object:
+            columns[column] = series.astype("category")
+        elif column in AMOUNT_COLUMNS and column not in converted and pd.api.types.is_numeric_dtype(series):
+            columns[column] = _to_kopecks(series)
+            converted.append(column)
+        elif column in converted:
+            columns[column] = series
+        elif pd.api.types.is_integer_dtype(series):
+            columns[column] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            columns[column] = pd.to_numeric(series, downcast="float")
+        else:
+            columns[column] = series
+    compact_df = pd.DataFrame(columns, index=transactions_df.index)
+    compact_df.attrs = dict(transactions_df.attrs)
+    if converted:
+        compact_df.attrs[KOPECKS_ATTR] = converted
+    return compact_df
+
+
+def _to_kopecks(series: pd.Series) -> pd.Series:
+    """ Переводит суммы в рублях в целые копейки минимального подходящего размера."""
+    kopecks = (series * 100).round()
+    fits_int32 = kopecks.abs().max() < np.iinfo(np.int32).max if kopecks.notna().any() else True
+    if kopecks.isna().any():
+        return kopecks.astype("Int32" if fits_int32 else "Int64")
+    return kopecks.astype(np.int32 if fits_int32 else np.int64)
+
+
+def kopeck_columns(transactions_df: Union[pd.DataFrame, pd.Series]) -> List[str]:
+    """ Денежные колонки таблицы, которые хранятся в копейках (см. apply_schema)."""
+    return list(transactions_df.attrs.get(KOPECKS_ATTR, []))
+
+
+def amounts_in_kopecks(transactions_df: Union[pd.DataFrame, pd.Series]) -> bool:
+    """ True, если суммы в таблице хранятся в копейках (см. apply_schema)."""
+    return bool(kopeck_columns(transactions_df))
+
+
+def to_rubles(amounts: pd.Series, transactions_df: Union[pd.DataFrame, pd.Series]) -> pd.Series:
+    """ Суммы в рублях: делит на 100, если таблица transactions_df хранит суммы в копейках."""
+    if amounts_in_kopecks(transactions_df):
+        return amounts.astype("float64") / 100
+    return amounts
+
+
+def restore_amounts(transactions_df: pd.DataFrame) -> pd.DataFrame:
+    """ Возвращает таблицу с суммами в рублях (float) для вывода пользователю.
+    Исходная таблица не изменяется; таблица без копеек возвращается как есть."""
+    if not amounts_in_kopecks(transactions_df):
+        return transactions_df
+    rubles = {column: transactions_df[column].astype("float64") / 100
+              for column in kopeck_columns(transactions_df) if column in transactions_df.columns}
+    restored = transactions_df.assign(**rubles)
+    restored.attrs = {key: value for key, value in transactions_df.attrs.items() if key != KOPECKS_ATTR}
+    return restored
@@ -0,0 +1,222 @@
+"""
+Локальный HTTP-сервер: главная страница, поиск переводов и отчет по категории.
+
+    python main.py serve --port 8000
+
+    GET /main?date=2021-12-24 15:44:07      страница «Главная» (без date - на текущий момент)
+    GET /transfers?keyword=Переводы          переводы физическим лицам
+    GET /report?category=Супермаркеты&date=2021-11-25    траты по категории за три месяца
+    GET /stats                               время загрузки данных и время ответа по запросам
+
+Транзакции, дневные корзины, настройки пользователя и котировки загружаются один раз при запуске
+и остаются в памяти процесса, поэтому во время ответа не входит загрузка данных.
+Запросы обрабатываются одновременно, каждый в своем потоке.
+"""
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from config import SERVER_HOST, SERVER_LATENCY_WINDOW, SERVER_PORT, USER_SETTINGS
+from logger import get_logger
+from src.reports import select_category_spending
+from src.services import get_search_for_transfers_to_individuals
+from src.store import TransactionStore, transaction_store
+from src.utils import get_currency_rates, get_stock_prices, get_user_settings
+from src.views import get_main_page_info, main_page_cache
+
+logger = get_logger(__name__)
+
+MAIN_PAGE_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+REPORT_DATE_FORMAT = "%Y-%m-%d"
+
+
+class RequestError(Exception):
+    """ Ошибка в параметрах запроса: клиенту возвращается код 400 с текстом ошибки."""
+
+
+class ServerStats:
+    """ Статистика сервера: время загрузки данных и время ответа по каждому адресу."""
+
+    def __init__(self, window: int = SERVER_LATENCY_WINDOW) -> None:
+        self.started = time.monotonic()
+        self.load_seconds: Optional[float] = None
+        self._window = window
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, status: int) -> None:
+        """ Учитывает обработанный запрос."""
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {"requests": 0, "errors": 0, "total_seconds": 0.0,
+                                                          "max_seconds": 0.0,
+                                                          "latencies": deque(maxlen=self._window)})
+            stats["requests"] += 1
+            stats["errors"] += status >= 400
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["latencies"].append(seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ Статистика для ответа /stats."""
+        with self._lock:
+            endpoints = {}
+            for endpoint, stats in self._endpoints.items():
+                latencies = sorted(stats["latencies"])
+                endpoints[endpoint] = {
+                    "requests": stats["requests"],
+                    "errors": stats["errors"],
+                    "mean_ms": round(stats["total_seconds"] / stats["requests"] * 1000, 3),
+                    "p50_ms": _percentile_ms(latencies, 0.5),
+                    "p95_ms": _percentile_ms(latencies, 0.95),
+                    "max_ms": round(stats["max_seconds"] * 1000, 3),
+                }
+        return {
+            "uptime_seconds": round(time.monotonic() - self.started, 3),
+            "load_seconds": None if self.load_seconds is None else round(self.load_seconds, 3),
+            "endpoints": endpoints,
+        }
+
+
+def _percentile_ms(latencies: List[float], share: float) -> Optional[float]:
+    """ Перцентиль отсортированных времен ответа в миллисекундах."""
+    if not latencies:
+        return None
+    return round(latencies[min(int(len(latencies) * share), len(latencies) - 1)] * 1000, 3)
+
+
+class TransactionServer(ThreadingHTTPServer):
+    """ HTTP-сервер с данными, загруженными на все время работы (см. warm_up)."""
+
+    daemon_threads = True
+
+    def __init__(self,
+                 address: Tuple[str, int],
+                 source: str,
+                 store: TransactionStore = transaction_store) -> None:
+        super().__init__(address, RequestHandler)
+        self.source = source
+        self.store = store
+        self.stats = ServerStats()
+        self.routes: Dict[str, Callable[[Dict[str, str]], str]] = {
+            "/main": self.main_page,
+            "/transfers": self.transfers,
+            "/report": self.report,
+            "/stats": self.get_stats,
+        }
+
+    def warm_up(self) -> float:
+        """ Загружает транзакции, дневные корзины, настройки пользователя и котировки.
+        Возвращает время загрузки в секундах."""
+        start = time.perf_counter()
+        self.store.rollups(self.source)
+        settings = get_user_settings(USER_SETTINGS)
+        get_currency_rates(settings["user_currencies"])
+        get_stock_prices(settings["user_stocks"])
+        self.stats.load_seconds = time.perf_counter() - start
+        logger.info("Данные загружены за %.3f с: %s", self.stats.load_seconds, self.source)
+        return self.stats.load_seconds
+
+    def main_page(self, query: Dict[str, str]) -> str:
+        date = _checked_date(query.get("date") or datetime.now().strftime(MAIN_PAGE_DATE_FORMAT),
+                             MAIN_PAGE_DATE_FORMAT)
+        return get_main_page_info(date, self.store.get(self.source), self.store.rollups(self.source))
+
+    def transfers(self, query: Dict[str, str]) -> str:
+        keyword = _required(query, "keyword")
+        result: str = get_search_for_transfers_to_individuals(self.store.get(self.source), keyword)
+        return result
+
+    def report(self, query: Dict[str, str]) -> str:
+        category = _required(query, "category")
+        date = query.get("date")
+        # без записи в файл: каждый запрос перезаписывал бы один и тот же файл отчета
+        report = select_category_spending(self.store.get(self.source), category,
+                                          _checked_date(date, REPORT_DATE_FORMAT) if date else None)
+        result: str = report.to_json(orient="records", indent=2, force_ascii=False, date_format="iso")
+        return result
+
+    def get_stats(self, query: Dict[str, str]) -> str:
+        stats = self.stats.to_dict()
+        stats["transactions_memory_bytes"] = self.store.memory_usage
+        stats["main_page_cache"] = {"size": len(main_page_cache), "hits": main_page_cache.hits,
+                                    "misses": main_page_cache.misses}
+        return json.dumps(stats, indent=2, ensure_ascii=False)
+
+
+def _checked_date(date: str, date_format: str) -> str:
+    """ Дата из параметров запроса, проверенная по формату."""
+    try:
+        datetime.strptime(date, date_format)
+    except ValueError:
+        raise RequestError(f"Дата должна быть в формате {date_format}: {date}")
+    return date
+
+
+def _required(query: Dict[str, str], name: str) -> str:
+    """ Обязательный параметр запроса."""
+    value = query.get(name)
+    if not value:
+        raise RequestError(f"Не указан параметр {name}")
+    return value
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """ Обработка GET-запросов: адрес сопоставляется с методом TransactionServer.routes."""
+
+    server: TransactionServer
+
+    def do_GET(self) -> None:
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        route = self.server.routes.get(url.path)
+        status = 200
+        try:
+            if route is None:
+                status, body = 404, _error(f"Неизвестный адрес: {url.path}")
+            else:
+                body = route(query)
+        except RequestError as error:
+            status, body = 400, _error(str(error))
+        except Exception as error:
+            logger.error("Ошибка обработки запроса %s: %s", self.path, error)
+            status, body = 500, _error("Внутренняя ошибка сервера")
+
+        seconds = time.perf_counter() - start
+        self.server.stats.record(url.path if route is not None else "other", seconds, status)
+        self._send(status, body, seconds)
+
+    def _send(self, status: int, body: str, seconds: float) -> None:
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Server-Timing", f"app;dur={seconds * 1000:.3f}")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("%s " + format, self.address_string(), *args)
+
+
+def _error(message: str) -> str:
+    return json.dumps({"error": message}, ensure_ascii=False)
+
+
+def serve(source: str, host: str = SERVER_HOST, port: int = SERVER_PORT) -> None:
+    """ Загружает данные и обрабатывает запросы до остановки (Ctrl+C)."""
+    server = TransactionServer((host, port), source)
+    load_seconds = server.warm_up()
+    print(f"Данные загружены за {load_seconds:.3f} с. Сервер запущен: http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info("Сервер остановлен")
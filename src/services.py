@@ -1,42 +1,112 @@
 import json
 import re
-from typing import Any, Dict, Hashable, List
+from typing import IO, Any, Callable, Dict, Hashable, List, Union
 
-from logger import logger
+import numpy as np
+import pandas as pd
 
+from logger import get_logger
+from src.database import get_categories, load_transactions
+from src.profiling import profile_stage
+from src.schema import restore_amounts
+from src.utils import in_export_order, iter_records, write_json_records
 
-def get_search_for_transfers_to_individuals(transactions: List[Dict[Hashable, Any]], keyword: str) -> str:
+logger = get_logger(__name__)
+
+# Имя и инициал фамилии, например "Иван С."
+NAME_PATTERN = re.compile(r"\b[А-ЯЁ][а-яё]+\s[А-ЯЁ]\.", flags=re.IGNORECASE)
+
+
+@profile_stage("transfers_filter")
+def filter_transfers_to_individuals(transactions: pd.DataFrame, keyword: str) -> pd.DataFrame:
+    """
+    Векторизованный отбор транзакций, которые относятся к категории keyword
+    и в описании содержат "Имя Ф.". Работает прямо с загруженным DataFrame без преобразования в записи.
+    """
+    if transactions.empty or not {"Категория", "Описание"} <= set(transactions.columns):
+        return transactions.iloc[0:0]
+    filter_category = _match_strings(transactions["Категория"],
+                                     lambda values: values.str.lower().str.contains(keyword.lower(), regex=False))
+    filter_name = _match_strings(transactions["Описание"],
+                                 lambda values: values.str.contains(NAME_PATTERN, regex=True))
+    selected: pd.DataFrame = transactions[filter_category & filter_name]
+    return selected
+
+
+def _match_strings(series: pd.Series, match: Callable[[pd.Series], pd.Series]) -> np.ndarray:
+    """ Применяет строковое условие к колонке. Для category-колонок условие проверяется
+    один раз для каждой категории, а результат разворачивается по кодам строк."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        values = pd.Series(list(series.cat.categories) + [float("nan")]).astype(str)
+        matched = match(values).to_numpy(dtype=bool)
+        return matched[series.cat.codes.to_numpy()]     # код -1 (пропуск) попадает на последний элемент
+    return match(series.astype(str)).to_numpy(dtype=bool)
+
+
+@profile_stage("transfers_search")
+def get_search_for_transfers_to_individuals(transactions: Union[pd.DataFrame, List[Dict[Hashable, Any]]],
+                                            keyword: str) -> str:
     """
     Функция возвращает JSON со всеми транзакциями, которые:
     1. Относятся к указанной категории (keyword)
     2. В описании содержат имя и инициал фамилии (например, "Иван С.")
     Аргументы:
-        transactions: Путь к файлу с транзакциями
+        transactions: DataFrame с транзакциями или список транзакций (словарей) с суммами в рублях.
+        Список из таблицы get_cards получается через get_records (to_dict("records") дал бы копейки)
         keyword: Ключевое слово для фильтрации категории
     """
 
-    logger.info(f"Начало фильтрации транзакций. Категория: '{keyword}'")
-    logger.debug(f"Получено {len(transactions)} транзакций для обработки")
-
-    # Компиляция регулярного выражения для поиска "Имя Ф."
-    logger.debug("Компиляция регулярного выражения для поиска: Имя Ф.")
-    pattern = re.compile(r"\b[А-ЯЁ][а-яё]+\s[А-ЯЁ]\.", flags=re.IGNORECASE)
-    logger.info("Регулярное выражение успешно скомпилировано")
+    logger.info("Начало фильтрации транзакций. Категория: '%s'", keyword)
+    logger.debug("Получено %s транзакций для обработки", len(transactions))
 
     # Фильтрация транзакций
-    filter_by_category = []
     logger.debug("Начало обработки транзакций...")
-    for category in transactions:
-        if (keyword.lower() in str(category.get("Категория", "")).lower()
-                and pattern.search(str(category.get("Описание", "")))):
-            filter_by_category.append(category)
+    if isinstance(transactions, pd.DataFrame):
+        selected = restore_amounts(in_export_order(filter_transfers_to_individuals(transactions, keyword)))
+        filter_by_category = selected.to_dict("records")
+    else:
+        # Для списка словарей маска считается по колонкам, а в результат попадают исходные словари
+        transactions_df = pd.DataFrame({
+            "Категория": [transaction.get("Категория", "") for transaction in transactions],
+            "Описание": [transaction.get("Описание", "") for transaction in transactions],
+        })
+        selected = filter_transfers_to_individuals(transactions_df, keyword)
+        filter_by_category = [transactions[position] for position in selected.index]
 
-    logger.info(f"Найдено {len(filter_by_category)} подходящих транзакций")
-    logger.debug(f"Список отфильтрованных транзакций {json.dumps(filter_by_category, indent=2, ensure_ascii=False)}")
+    logger.info("Найдено %s подходящих транзакций", len(filter_by_category))
+    result = json.dumps(filter_by_category, indent=2, ensure_ascii=False)
+    # Готовая строка результата попадает в лог только при включенном уровне DEBUG
+    logger.debug("Список отфильтрованных транзакций %s", result)
     logger.info("Фильтрация завершена успешно.")
-    return json.dumps(filter_by_category, indent=2, ensure_ascii=False)
+    return result
+
+
+def search_transfers_in_database(db_path: str, keyword: str) -> str:
+    """
+    get_search_for_transfers_to_individuals по базе транзакций SQLite (src.database):
+    категории проверяются по списку категорий базы, из таблицы читаются только
+    транзакции подходящих категорий (запрос по индексу категории).
+    """
+    categories = pd.Series(get_categories(db_path), dtype=object)
+    matched = categories[_match_strings(categories, lambda values: values.str.lower().str.contains(
+        keyword.lower(), regex=False))]
+    logger.debug("Категории, подходящие под '%s': %s", keyword, list(matched))
+    return get_search_for_transfers_to_individuals(load_transactions(db_path, categories=list(matched)), keyword)
+
+
+def write_search_for_transfers_to_individuals(transactions: pd.DataFrame, keyword: str, file: IO[str]) -> int:
+    """
+    Потоковый вариант get_search_for_transfers_to_individuals: найденные транзакции
+    записываются в файл (или сокет, открытый через makefile) по одной, без сборки всего JSON в памяти.
+    Формат совпадает с get_search_for_transfers_to_individuals. Возвращает количество записей.
+    """
+    logger.info("Начало потоковой фильтрации транзакций. Категория: '%s'", keyword)
+    selected = in_export_order(filter_transfers_to_individuals(transactions, keyword))
+    count = write_json_records(iter_records(selected), file)
+    logger.info("Записано %s подходящих транзакций", count)
+    return count
 
 # if __name__ == '__main__':
 #     all_transactions = get_cards(PATH_XLSX)
-#     transactions_for_service = all_transactions.to_dict("records")
+#     transactions_for_service = get_records(all_transactions)    # суммы в рублях, а не в копейках
 #     print(get_search_for_transfers_to_individuals(transactions_for_service, "Переводы"))
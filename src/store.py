@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import pandas as pd
+
+from config import PATH_XLSX, STORE_MAX_BYTES, TRANSACTIONS_DB
+from logger import get_logger
+from src.database import ingest_statement
+from src.rollups import DailyRollups
+from src.schema import amounts_in_kopecks, apply_schema, restore_amounts
+from src.utils import concat_transactions, get_cards, index_by_operation_date
+
+logger = get_logger(__name__)
+
+
+class TransactionStore:
+    """
+    Хранилище загруженных транзакций на весь процесс.
+    Каждый файл парсится один раз, дальше все точки входа (главная страница,
+    сервисы, отчеты) получают один и тот же DataFrame без повторного чтения и копирования.
+    Если суммарный объем загруженных таблиц и их дневных корзин превышает max_bytes, из памяти
+    вытесняются давно не использованные файлы вместе с корзинами.
+    Таблицы с транзакциями, добавленными через append, не вытесняются: этих строк нет
+    в исходном файле, и повторная загрузка их бы потеряла.
+    """
+
+    def __init__(self,
+                 max_bytes: int = STORE_MAX_BYTES,
+                 loader: Callable[[str], pd.DataFrame] = get_cards) -> None:
+        self.max_bytes = max_bytes
+        self._loader = loader
+        self._frames: OrderedDict[str, pd.DataFrame] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._rollups: dict[str, DailyRollups] = {}
+        self._pinned: set[str] = set()    # таблицы со строками, которых нет в файле (см. append)
+        self._lock = threading.RLock()
+
+    def get(self, path: str = PATH_XLSX) -> pd.DataFrame:
+        """ Возвращает DataFrame с транзакциями файла, загружая его при первом обращении."""
+        with self._lock:
+            if path in self._frames:
+                self._frames.move_to_end(path)
+                logger.debug("Транзакции %s взяты из хранилища", path)
+                return self._frames[path]
+
+            logger.info("Загрузка транзакций в хранилище: %s", path)
+            df = self._loader(path)
+            size = int(df.memory_usage(deep=True).sum())
+            if size > self.max_bytes:
+                logger.warning("Таблица %s (%s байт) больше лимита хранилища %s байт и не будет сохранена в памяти",
+                               path, size, self.max_bytes)
+                return df
+
+            self._frames[path] = df
+            self._sizes[path] = size
+            self._evict()
+            return df
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """ Сбрасывает загруженные данные файла (или всего хранилища, если путь не указан)."""
+        with self._lock:
+            paths = list(self._frames) if path is None else [path]
+            for item in paths:
+                self._frames.pop(item, None)
+                self._sizes.pop(item, None)
+                self._rollups.pop(item, None)
+                self._pinned.discard(item)
+            logger.info("Хранилище транзакций сброшено: %s", ', '.join(paths) or 'пусто')
+
+    def rollups(self, path: str = PATH_XLSX) -> DailyRollups:
+        """ Дневные корзины расходов для файла; строятся один раз при первом обращении."""
+        with self._lock:
+            if path not in self._rollups:
+                rollups = self._rollups[path] = DailyRollups(self.get(path))
+                self._evict()
+                return rollups
+            return self._rollups[path]
+
+    def append(self, path: str, new_transactions: pd.DataFrame) -> pd.DataFrame:
+        """ Добавляет новые транзакции к загруженным данным файла и обновляет дневные корзины
+        только на новых строках. Возвращает обновленную таблицу.
+        Добавленных строк нет в файле, поэтому таблица остается в памяти до invalidate
+        и не вытесняется при превышении лимита."""
+        return self._append(path, new_transactions, pin=True)
+
+    def _append(self, path: str, new_transactions: pd.DataFrame, pin: bool) -> pd.DataFrame:
+        """ append; pin=False - строки уже сохранены в источнике (база транзакций), таблицу можно вытеснять."""
+        new_df = index_by_operation_date(new_transactions)
+        with self._lock:
+            current = self.get(path)
+            # Новые строки приводятся к той же схеме, что и загруженные (и их дневные корзины)
+            if amounts_in_kopecks(current) and not amounts_in_kopecks(new_df):
+                new_df = apply_schema(new_df)
+            elif not amounts_in_kopecks(current):
+                new_df = restore_amounts(new_df)
+            combined = concat_transactions([current, new_df])
+            if path in self._rollups:
+                self._rollups[path].append(new_df)
+            if path in self._frames:
+                self._frames[path] = combined
+                self._sizes[path] = int(combined.memory_usage(deep=True).sum())
+                if pin:
+                    self._pinned.add(path)
+                self._evict()
+            logger.info("В хранилище добавлено %s транзакций: %s", len(new_df), path)
+            return combined
+
+    def ingest(self, statement_path: str, db_path: str = TRANSACTIONS_DB) -> pd.DataFrame:
+        """ Дозагружает выписку в базу транзакций (см. src.database.ingest_statement).
+        Если база уже загружена в хранилище, к ней добавляются только новые транзакции
+        без повторного чтения всей истории. Возвращает добавленные транзакции."""
+        with self._lock:
+            new_transactions = ingest_statement(statement_path, db_path)
+            if db_path in self._frames and not new_transactions.empty:
+                self._append(db_path, new_transactions, pin=False)
+            return new_transactions
+
+    @property
+    def memory_usage(self) -> int:
+        """ Объем памяти (в байтах), занятый загруженными таблицами и их дневными корзинами."""
+        with self._lock:
+            return sum(self._sizes.values()) + sum(rollups.memory_usage for rollups in self._rollups.values())
+
+    def _evict(self) -> None:
+        """ Вытесняет давно не использованные таблицы вместе с их корзинами, пока объем превышает лимит.
+        Последняя использованная таблица и таблицы с добавленными строками (append) остаются."""
+        candidates = [path for path in list(self._frames)[:-1] if path not in self._pinned]
+        while self.memory_usage > self.max_bytes and candidates:
+            path = candidates.pop(0)
+            del self._frames[path]
+            size = self._sizes.pop(path)
+            self._rollups.pop(path, None)
+            logger.info("Таблица %s (%s байт) вытеснена из хранилища", path, size)
+
+
+transaction_store = TransactionStore()
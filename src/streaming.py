@@ -0,0 +1,75 @@
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import STREAM_CHUNK_SIZE
+from logger import get_logger
+from src.reports import report_to_file, select_category_spending
+from src.schema import apply_schema
+from src.utils import (cards_info_from_totals, concat_transactions, get_top_five_max_prices, index_by_operation_date,
+                       iter_transaction_chunks, select_period, select_top_k)
+
+logger = get_logger(__name__)
+
+
+def stream_main_page_aggregates(path: str, date: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Dict[str, list]:
+    """
+    Считает данные главной страницы по картам и топ-5 транзакций (как get_cards_info и
+    get_top_five_max_prices) за период с начала месяца по date (YYYY-MM-DD HH:MM:SS),
+    читая файл порциями. В памяти хранятся только суммы по картам и пять лучших кандидатов.
+    Порции приводятся к той же схеме, что и в get_cards: суммы складываются в копейках,
+    а кандидаты в топ хранятся в порядке таблицы get_cards, поэтому результат совпадает
+    с расчетом по таблице в памяти, в том числе при равных суммах.
+    """
+    end_period = datetime.strptime(date, "%Y-%m-%d %H:%M:%S")
+    start_period = end_period.replace(day=1, hour=0, minute=0, second=0)
+
+    card_totals = pd.Series(dtype="int64")    # в копейках
+    top_candidates: Optional[pd.DataFrame] = None
+    rows = 0
+    for chunk in iter_transaction_chunks(path, chunk_size):
+        rows += len(chunk)
+        period = select_period(apply_schema(index_by_operation_date(chunk)), start_period, end_period)
+        expenses = period[period["Сумма операции"] < 0]
+        card_totals = card_totals.add(expenses.groupby("Номер карты", observed=True)["Сумма операции"].sum(),
+                                      fill_value=0)
+
+        chunk_top = _top_rows(period, 5)
+        if top_candidates is None or top_candidates.empty:
+            top_candidates = chunk_top
+        elif not chunk_top.empty:
+            # Порции идут в порядке выгрузки (новые раньше): строки следующей порции в таблице get_cards
+            # стоят раньше, в том числе при одинаковой дате, и concat_transactions сохраняет этот порядок
+            top_candidates = _top_rows(concat_transactions([chunk_top, top_candidates]), 5)
+    logger.info("Потоково обработано %s транзакций", rows)
+
+    return {
+        "cards": cards_info_from_totals(card_totals.sort_index().astype("float64") / 100),
+        "top_transactions": get_top_five_max_prices(top_candidates) if top_candidates is not None else [],
+    }
+
+
+def _top_rows(transactions_df: pd.DataFrame, k: int) -> pd.DataFrame:
+    """ Строки топ-k (см. select_top_k) в том порядке, в котором они идут в таблице:
+    select_top_k выбирает из равных по порядку строк, поэтому кандидаты хранят порядок таблицы get_cards."""
+    top = select_top_k(transactions_df.assign(_position=np.arange(len(transactions_df))), k)
+    return transactions_df.iloc[np.sort(top["_position"].to_numpy())]
+
+
+@report_to_file()
+def stream_spending_by_category(path: str,
+                                category: str,
+                                date: Optional[str] = None,
+                                chunk_size: int = STREAM_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Потоковый вариант spending_by_category: траты по категории за последние три месяца
+    для выгрузки, которая не помещается в память. В памяти хранятся только найденные операции.
+    """
+    selected = [select_category_spending(chunk, category, date) for chunk in iter_transaction_chunks(path, chunk_size)]
+    if not selected:
+        return pd.DataFrame()
+    result = pd.concat(selected, ignore_index=True)
+    logger.info("Потоково найдено %s операций по категории %s", len(result), category)
+    return result
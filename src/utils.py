@@ -1,23 +1,102 @@
+import hashlib
 import json
 import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, List
+from typing import IO, TYPE_CHECKING, Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional
 
+import numpy as np
 import pandas as pd
-import requests
-from dotenv import load_dotenv
 
-from config import PATH_XLSX
-from logger import logger
+from config import (API_MAX_WORKERS, API_TIMEOUT, CACHE_DIR, CURRENCY_API_URL, LOAD_MAX_WORKERS, PATH_XLSX,
+                    QUOTES_SNAPSHOT, STOCKS_API_URL, STOCKS_BATCH_SIZE, STREAM_CHUNK_SIZE)
+from logger import get_logger
+from src.profiling import profile_stage
+from src.quote_cache import QuoteCache
+from src.schema import (AMOUNT_COLUMNS, KOPECKS_ATTR, amounts_in_kopecks, apply_schema, kopeck_columns,
+                        restore_amounts, to_rubles)
 
-# Загружаем переменные из .env
-load_dotenv()
+logger = get_logger(__name__)
+
+# requests, dotenv и openpyxl импортируются при первом использовании: они нужны не каждой команде,
+# а их импорт заметно замедляет запуск
+if TYPE_CHECKING:
+    import requests
+
+DATE_FORMAT = "%d.%m.%Y %H:%M:%S"    # формат "Дата операции" в выгрузке банка
+CACHE_VERSION = 5    # меняется при изменении обработки данных при загрузке
+
+# Общие для всех запросов к API HTTP-сессия (пул соединений) и пул потоков
+_http_session: Optional["requests.Session"] = None
+_http_session_lock = threading.Lock()
+_env_loaded = False
+_api_executor = ThreadPoolExecutor(max_workers=API_MAX_WORKERS, thread_name_prefix="api")
+
+# Прочитанные настройки пользователя: путь -> (версия файла, настройки)
+_settings_cache: Dict[str, tuple[Optional[tuple[int, int]], Any]] = {}
+
+# Кеш котировок валют и акций (TTL, фоновое обновление, последнее успешное значение)
+quote_cache = QuoteCache(snapshot_path=QUOTES_SNAPSHOT)
 
 # api_key = os.getenv("FINNHUB_KEY")
 # finnhub_client = finnhub.Client(api_key=api_key)
 # API_KEY_FOR_STOCKS = os.getenv("FINNHUB_KEY")
 
 
+class LazyJson:
+    """ Откладывает сериализацию данных в JSON до момента, когда сообщение лога действительно
+    форматируется (то есть только если уровень логирования включен)."""
+
+    def __init__(self, data: Any, **kwargs: Any) -> None:
+        self.data = data
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        return json.dumps(self.data, **self.kwargs)
+
+
+def write_json(data: Any, file: IO[str], indent: Optional[int] = 2) -> None:
+    """ Записывает данные в JSON в файл (или сокет, открытый через makefile) по частям,
+    не собирая весь ответ в одну строку."""
+    encoder = json.JSONEncoder(indent=indent, ensure_ascii=False)
+    for chunk in encoder.iterencode(data):
+        file.write(chunk)
+
+
+def iter_records(transactions_df: pd.DataFrame, chunk_size: int = 10_000) -> Iterator[Dict[Hashable, Any]]:
+    """ Строки DataFrame в виде словарей, порциями по chunk_size (без преобразования всей таблицы сразу).
+    Суммы таблицы в компактной схеме (копейки) возвращаются в рублях."""
+    for start in range(0, len(transactions_df), chunk_size):
+        yield from restore_amounts(transactions_df.iloc[start:start + chunk_size]).to_dict("records")
+
+
+def get_records(transactions_df: pd.DataFrame) -> List[Dict[Hashable, Any]]:
+    """ Транзакции в виде списка словарей, как to_dict("records") для исходной выгрузки:
+    в порядке выгрузки банка и с суммами в рублях. Таблица из get_cards хранит суммы в копейках,
+    поэтому ее to_dict("records") для вывода и для get_search_for_transfers_to_individuals не подходит."""
+    return list(iter_records(in_export_order(transactions_df)))
+
+
+def write_json_records(records: Iterable[Any], file: IO[str], indent: Optional[int] = 2) -> int:
+    """ Записывает JSON-массив из записей по одной, не держа весь массив в памяти.
+    Формат совпадает с json.dumps(list(records), indent=indent). Возвращает количество записей."""
+    encoder = json.JSONEncoder(indent=indent, ensure_ascii=False)
+    # Каждая запись сдвигается на один уровень отступа внутрь массива
+    newline = "\n" + " " * indent if indent is not None else ""
+    item_separator = "," if indent is not None else ", "
+    count = 0
+    file.write("[")
+    for record in records:
+        file.write((item_separator if count else "") + newline)
+        for chunk in encoder.iterencode(record):
+            file.write(chunk.replace("\n", newline) if indent is not None else chunk)
+        count += 1
+    file.write("\n]" if count and indent is not None else "]")
+    return count
+
+
 def get_greetings() -> str:
     """ Возвращает приветствие с учётом времени.
      — «Доброе утро» / «Добрый день» / «Добрый вечер» / «Доброй ночи» в
@@ -38,15 +117,256 @@ def get_greetings() -> str:
         return "Доброй ночи"
 
 
-def get_cards(path: str = PATH_XLSX) -> pd.DataFrame:
-    """ Функция загружает данные из Excel-файла и возвращает DataFrame"""
-    logger.info(f"Загрузка данных из файла: {path}")
-    df = pd.read_excel(path)
-    logger.info(f"Файл {path} успешно загружен")
-    # list_df = df.to_dict("records")
+def _get_file_hash(path: str) -> str:
+    """ Считает sha256 содержимого файла (читает файл блоками)."""
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def _get_cache_paths(path: str) -> tuple[str, str]:
+    """ Возвращает пути к файлу кеша и к его метаданным для исходного файла."""
+    abs_path = os.path.abspath(path)
+    name = os.path.splitext(os.path.basename(abs_path))[0]
+    path_digest = hashlib.sha1(abs_path.encode("utf-8")).hexdigest()[:12]
+    base = os.path.join(CACHE_DIR, f"{name}-{path_digest}")
+    return f"{base}.pkl", f"{base}.meta.json"
+
+
+def _load_cached_frame(path: str) -> Optional[pd.DataFrame]:
+    """ Возвращает DataFrame из кеша, если исходный файл не менялся, иначе None.
+    Сначала сверяются путь, mtime и размер; если mtime изменился, а содержимое
+    то же (сверка по хешу) - кеш считается актуальным."""
+    frame_path, meta_path = _get_cache_paths(path)
+    if not (os.path.exists(frame_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        stat = os.stat(path)
+        if meta.get("version") != CACHE_VERSION or meta["path"] != os.path.abspath(path):
+            return None
+        if meta["mtime_ns"] != stat.st_mtime_ns or meta["size"] != stat.st_size:
+            if meta["sha256"] != _get_file_hash(path):
+                return None
+            # Содержимое не изменилось - обновляем только mtime в метаданных
+            meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            with open(meta_path, "w", encoding="utf-8") as file:
+                json.dump(meta, file)
+        with open(frame_path, "rb") as file:
+            cached_frame: pd.DataFrame = pickle.load(file)
+        return cached_frame
+    except (OSError, ValueError, KeyError, pickle.UnpicklingError) as exc:
+        logger.warning("Не удалось прочитать кеш %s: %s", frame_path, exc)
+        return None
+
+
+def _save_cached_frame(path: str, df: pd.DataFrame) -> None:
+    """ Сохраняет DataFrame в бинарный кеш рядом с данными (запись через временный файл)."""
+    frame_path, meta_path = _get_cache_paths(path)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        stat = os.stat(path)
+        meta = {
+            "version": CACHE_VERSION,
+            "path": os.path.abspath(path),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": _get_file_hash(path),
+        }
+        with open(f"{frame_path}.tmp", "wb") as file:
+            pickle.dump(df, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{frame_path}.tmp", frame_path)
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        logger.debug("Кеш сохранен: %s", frame_path)
+    except OSError as exc:
+        logger.warning("Не удалось сохранить кеш %s: %s", frame_path, exc)
+
+
+@profile_stage("date_parsing")
+def index_by_operation_date(df: pd.DataFrame) -> pd.DataFrame:
+    """ Индексирует транзакции по распарсенной "Дата операции" и сортирует по возрастанию даты.
+    Исходная строковая колонка сохраняется без изменений, индекс без имени
+    (иначе "Дата операции" в sort_values и groupby была бы неоднозначной).
+    Порядок выгрузки банка (от новых операций к старым) возвращает in_export_order."""
+    if "Дата операции" not in df.columns or isinstance(df.index, pd.DatetimeIndex):
+        return df
+    dates = pd.to_datetime(df["Дата операции"], format=DATE_FORMAT, errors="coerce").rename(None)
+    # Выгрузка разворачивается до устойчивой сортировки: тогда обратный порядок строк
+    # совпадает с выгрузкой, в том числе для операций с одинаковым временем
+    indexed_df = df.set_index(pd.DatetimeIndex(dates)).iloc[::-1]
+    return indexed_df.sort_index(kind="stable", na_position="last")
+
+
+def in_export_order(transactions_df: pd.DataFrame) -> pd.DataFrame:
+    """ Транзакции в порядке выгрузки банка - от новых операций к старым.
+    Таблица, проиндексированная index_by_operation_date, разворачивается (срез без копирования),
+    остальные таблицы уже идут в исходном порядке и возвращаются как есть."""
+    if isinstance(transactions_df.index, pd.DatetimeIndex):
+        return transactions_df.iloc[::-1]
+    return transactions_df
+
+
+def get_operation_dates(transactions_df: pd.DataFrame) -> pd.Series:
+    """ Возвращает даты операций как datetime, не изменяя переданную таблицу:
+    из индекса, если он построен при загрузке, из колонки, если она уже datetime,
+    иначе парсит строковую колонку "Дата операции"."""
+    if isinstance(transactions_df.index, pd.DatetimeIndex):
+        return pd.Series(transactions_df.index, index=transactions_df.index, name="Дата операции")
+    if pd.api.types.is_datetime64_any_dtype(transactions_df["Дата операции"]):
+        return transactions_df["Дата операции"]
+    return pd.to_datetime(transactions_df["Дата операции"], format=DATE_FORMAT, dayfirst=True)
+
+
+@profile_stage("select_period")
+def select_period(transactions_df: pd.DataFrame, start: datetime, end: datetime) -> pd.DataFrame:
+    """ Транзакции с start по end включительно.
+    Для таблиц с отсортированным индексом по дате - бинарный поиск границ и срез без копирования,
+    для остальных - фильтрация по колонке "Дата операции"."""
+    index = transactions_df.index
+    if isinstance(index, pd.DatetimeIndex) and index.is_monotonic_increasing:
+        start_pos = index.searchsorted(start, side="left")
+        end_pos = index.searchsorted(end, side="right")
+        return transactions_df.iloc[start_pos:end_pos]
+    date_series = get_operation_dates(transactions_df)
+    return transactions_df[(date_series >= start) & (date_series <= end)]
+
+
+@profile_stage("load_transactions")
+def get_cards(path: str = PATH_XLSX, use_cache: bool = True) -> pd.DataFrame:
+    """ Функция загружает данные из Excel-файла (или CSV-выгрузки) и возвращает DataFrame,
+    проиндексированный по дате операции (см. index_by_operation_date),
+    в компактной схеме (см. src.schema.apply_schema: категории, суммы в копейках).
+    Распарсенный файл кешируется в CACHE_DIR и перечитывается только при изменении исходного файла.
+    Если path - база транзакций SQLite (см. src.database.ingest_statement), данные читаются из нее."""
+    logger.info("Загрузка данных из файла: %s", path)
+    from src.database import is_database, read_transactions  # database сам импортирует utils
+
+    if is_database(path):
+        return apply_schema(index_by_operation_date(read_transactions(path)))
+    if use_cache:
+        cached_df = _load_cached_frame(path)
+        if cached_df is not None:
+            logger.info("Файл %s загружен из кеша", path)
+            return cached_df
+    df = apply_schema(index_by_operation_date(read_export(path)))
+    logger.info("Файл %s успешно загружен", path)
+    if use_cache:
+        _save_cached_frame(path, df)
+    # list_df = get_records(df)
     return df
 
 
+def read_export(path: str) -> pd.DataFrame:
+    """ Выгрузка транзакций целиком: CSV (больше листа Excel) или Excel."""
+    if path.lower().endswith(".csv"):
+        return pd.read_csv(path)
+    return pd.read_excel(path)
+
+
+def iter_transaction_chunks(path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Читает выгрузку транзакций порциями по chunk_size строк, не загружая файл целиком.
+    Поддерживаются Excel (openpyxl в режиме read-only) и CSV-выгрузки.
+    """
+    logger.info("Потоковая загрузка данных из файла: %s (порции по %s строк)", path, chunk_size)
+    if path.lower().endswith(".csv"):
+        yield from pd.read_csv(path, chunksize=chunk_size)
+        return
+
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        buffer: list[tuple[Any, ...]] = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) == chunk_size:
+                yield _frame_from_rows(buffer, header)
+                buffer = []
+        if buffer:
+            yield _frame_from_rows(buffer, header)
+    finally:
+        workbook.close()
+
+
+def _frame_from_rows(rows: list[tuple[Any, ...]], header: tuple[Any, ...]) -> pd.DataFrame:
+    """ Порция строк Excel как DataFrame. Целые числа openpyxl в режиме read-only отдает как float;
+    колонки без пропусков и дробных значений приводятся к int64, как это делает pd.read_excel."""
+    df = pd.DataFrame(rows, columns=header)
+    for column in df.select_dtypes("float").columns:
+        values = df[column]
+        if values.notna().all() and (values == values.round()).all():
+            df[column] = values.astype("int64")
+    return df
+
+
+def get_cards_from_files(paths: List[str],
+                         max_workers: int = LOAD_MAX_WORKERS,
+                         use_cache: bool = True) -> pd.DataFrame:
+    """ Загружает несколько выгрузок (например, по картам или по месяцам) и объединяет их в одну таблицу
+    той же схемы, что и get_cards. Файлы разбираются параллельно в пуле процессов:
+    разбор Excel загружает процессор, и потоки здесь не помогают из-за GIL."""
+    logger.info("Загрузка %s файлов в %s процессах", len(paths), min(max_workers, len(paths)))
+    if max_workers <= 1 or len(paths) <= 1:
+        frames = [get_cards(path, use_cache) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(paths))) as executor:
+            frames = list(executor.map(get_cards, paths, [use_cache] * len(paths)))
+    return concat_transactions(frames)
+
+
+def concat_transactions(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """ Объединяет таблицы транзакций, загруженные по отдельности, в одну:
+    колонки выравниваются (отсутствующие заполняются пропусками), строки сортируются по дате операции.
+    Если все таблицы в компактной схеме, результат тоже в ней: словари категорий объединяются,
+    суммы остаются в копейках. Иначе суммы во всех таблицах приводятся к рублям."""
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    compact = all(amounts_in_kopecks(frame) for frame in frames)
+    if not compact:
+        frames = [restore_amounts(frame) for frame in frames]
+
+    columns = list(dict.fromkeys(column for frame in frames for column in frame.columns))
+    dtypes = {column: next(frame[column].dtype for frame in frames if column in frame.columns) for column in columns}
+    aligned = []
+    for frame in frames:
+        missing = {column: pd.Series(pd.NA, index=frame.index, dtype=_missing_dtype(column, dtypes[column], compact))
+                   for column in columns if column not in frame.columns}
+        aligned.append(frame.assign(**missing)[columns] if missing else frame)
+
+    result = index_by_operation_date(pd.concat(aligned))
+    if not result.index.is_monotonic_increasing:
+        result = result.sort_index(kind="stable")
+    if compact:
+        # pd.concat сохраняет attrs, только если они у всех таблиц одинаковые
+        converted = {column for frame in frames for column in kopeck_columns(frame)}
+        result.attrs[KOPECKS_ATTR] = [column for column in columns if column in converted]
+        # После объединения категории с разными словарями становятся object - схема применяется заново
+        result = apply_schema(result)
+    logger.info("Объединено %s таблиц, всего %s транзакций", len(frames), len(result))
+    return result
+
+
+def _missing_dtype(column: str, dtype: Any, compact: bool) -> str:
+    """ Тип колонки, которой нет в одной из объединяемых таблиц."""
+    if compact and column in AMOUNT_COLUMNS:
+        return "Int64"    # пропуск в копейках: целые с NA, а не float (иначе суммы примутся за рубли)
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "float64"
+    return "object"
+
+
+@profile_stage("cards")
 def get_cards_info(transactions_df: pd.DataFrame) -> list:
     """ По каждой карте:
      {
@@ -56,9 +376,15 @@ def get_cards_info(transactions_df: pd.DataFrame) -> list:
       }"""
     logger.info("Начало обработки информации по картам")
     filter_df = transactions_df[transactions_df["Сумма операции"] < 0]
-    logger.debug(f"Найдено {len(filter_df)} операций")
-    sum_group = filter_df.groupby("Номер карты")["Сумма операции"].sum()
-    logger.debug(f"Обработано {len(sum_group)} карт")
+    logger.debug("Найдено %s операций", len(filter_df))
+    sum_group = filter_df.groupby("Номер карты", observed=True)["Сумма операции"].sum()
+    logger.debug("Обработано %s карт", len(sum_group))
+    return cards_info_from_totals(to_rubles(sum_group, filter_df))
+
+
+def cards_info_from_totals(sum_group: pd.Series) -> list:
+    """ Формирует информацию по картам (см. get_cards_info) из уже посчитанных
+    сумм расходов по номеру карты."""
     list_sum_group = sum_group.to_dict()
     result = []
     for k, v in list_sum_group.items():
@@ -68,100 +394,253 @@ def get_cards_info(transactions_df: pd.DataFrame) -> list:
             "last_digits": str(k)[-4:],
             "total_spent": v,
             "cashback": round_v})
-        logger.debug(f"Карта {str(k)[-4:]}: потрачено {v}, кешбэк {round_v}")
-    logger.info(f"Успешно обработано {len(result)} карт")
+        logger.debug("Карта %s: потрачено %s, кешбэк %s", str(k)[-4:], v, round_v)
+    logger.info("Успешно обработано %s карт", len(result))
     return result
 
 
-def get_top_five_max_prices(transactions_df: pd.DataFrame) -> list:
-    """ Топ-5 транзакций по сумме платежа. """
+def select_top_k(transactions_df: pd.DataFrame,
+                 k: int = 5,
+                 column: str = "Сумма платежа",
+                 group_by: Optional[str] = None) -> pd.DataFrame:
+    """ Отбирает k транзакций с наибольшим значением column (по убыванию) без полной сортировки
+    таблицы: O(n log k). При равных значениях выше стоит более новая операция - как в выгрузке банка
+    (см. in_export_order), независимо от того, проиндексирована ли таблица по дате.
+    Если указан group_by - отбирает по k транзакций в каждой группе (группы по возрастанию ключа)."""
+    export_df = in_export_order(transactions_df)
+    if group_by is None:
+        return export_df.nlargest(k, column, keep="first")
+    # Выбор внутри групп по позициям строк: индекс таблицы (даты) может содержать повторы
+    values = pd.Series(export_df[column].to_numpy(), index=np.arange(len(export_df)))
+    keys = export_df[group_by].astype(object).to_numpy()
+    top_values = values.groupby(keys, sort=True).nlargest(k, keep="first")
+    return export_df.iloc[top_values.index.get_level_values(-1)]
+
+
+def format_top_transactions(top_df: pd.DataFrame) -> list:
+    """ Транзакции в формате топа главной страницы: дата, сумма платежа (в рублях), категория, описание."""
+    return [{
+        "date": k.get("Дата операции"),
+        "amount": k.get("Сумма платежа"),
+        "category": k.get("Категория"),
+        "description": k.get("Описание")
+    } for k in restore_amounts(top_df).to_dict("records")]
+
+
+def get_top_transactions(transactions_df: pd.DataFrame, k: int = 5) -> list:
+    """ Топ-k транзакций по сумме платежа."""
+    return format_top_transactions(select_top_k(transactions_df, k))
+
+
+def get_top_transactions_by_group(transactions_df: pd.DataFrame, group_by: str, k: int = 5) -> Dict[str, list]:
+    """ Топ-k транзакций по сумме платежа внутри каждой группы (например, "Номер карты" или "Категория"):
+    словарь {значение группы: топ-k транзакций группы}."""
+    top_df = select_top_k(transactions_df, k, group_by=group_by)
+    return {str(key): format_top_transactions(group)
+            for key, group in top_df.groupby(top_df[group_by].astype(object).to_numpy(), sort=False)}
+
+
+@profile_stage("top_transactions")
+def get_top_five_max_prices(transactions_df: pd.DataFrame, k: int = 5) -> list:
+    """ Топ-5 (топ-k) транзакций по сумме платежа. """
     logger.info("Начало обработки топ-5 транзакций")
-    logger.debug(f"Получено {len(transactions_df)} транзакций для анализа")
-    logger.debug("Сортировка транзакций по сумме платежа")
-    top_five = transactions_df.sort_values("Сумма платежа", ascending=False).head()
+    logger.debug("Получено %s транзакций для анализа", len(transactions_df))
+    logger.debug("Отбор транзакций с наибольшей суммой платежа")
+    top_five = select_top_k(transactions_df, k)
     logger.debug("Отобрано топ-5 транзакций")
-    top_transactions = top_five.to_dict("records")
-
-    top_result = []
-    for k in top_transactions:
-        top_result.append({
-            "date": k.get("Дата операции"),
-            "amount": k.get("Сумма платежа"),
-            "category": k.get("Категория"),
-            "description": k.get("Описание")
-        })
-    logger.info(f"Успешно сформирован топ-5 транзакций (получено {len(top_result)} записей)")
+    top_result = format_top_transactions(top_five)
+    logger.info("Успешно сформирован топ-5 транзакций (получено %s записей)", len(top_result))
     return top_result
     # красиво выведет в консоль если прописать так:
     # json.dumps(top_result, indent=4, ensure_ascii=False)
 
 
+@profile_stage("settings")
 def get_user_settings(path: str) -> Any:
-    """ Функция чтения пользовательских настроек из JSON-файла."""
-    logger.info(f"Начало загрузки пользовательских настроек из файла: {path}")
+    """ Функция чтения пользовательских настроек из JSON-файла.
+    Прочитанные настройки хранятся в памяти, пока файл не изменится."""
+    version = get_file_version(path)
+    cached = _settings_cache.get(path)
+    if version is not None and cached is not None and cached[0] == version:
+        logger.debug("Настройки пользователя %s взяты из кеша", path)
+        return cached[1]
+
+    logger.info("Начало загрузки пользовательских настроек из файла: %s", path)
     with open(path, "r", encoding="utf-8") as file:
         settings = json.load(file)
         logger.info("Настройки успешно загружены.")
-        return settings
+    if version is not None:
+        _settings_cache[path] = (version, settings)
+    return settings
+
+
+def get_file_version(path: str) -> Optional[tuple[int, int]]:
+    """ Версия файла для ключей кешей: время изменения (нс) и размер; None, если файла нет."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_quotes_epoch() -> int:
+    """ Эпоха кеша котировок: меняется при каждом обновлении курсов или цен акций."""
+    return quote_cache.epoch
+
+
+def get_api_key(name: str) -> Optional[str]:
+    """ Ключ API из переменных окружения; файл .env загружается при первом обращении."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        # Загружаем переменные из .env
+        load_dotenv()
+        _env_loaded = True
+    return os.getenv(name)
+
+
+def get_http_session() -> "requests.Session":
+    """ Возвращает общую HTTP-сессию: соединения с API переиспользуются между запросами."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=API_MAX_WORKERS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+
+def _get_cached_quotes(prefix: str,
+                       symbols: List[str],
+                       fetch: Callable[[List[str]], Dict[str, Any]]) -> Dict[str, Any]:
+    """ Котировки по списку символов через quote_cache: все отсутствующие в кеше
+    символы запрашиваются одним вызовом fetch(символы) -> {символ: значение}."""
+    def fetch_many(keys: List[str]) -> Dict[str, Any]:
+        fetched = fetch([key.split(":", 1)[1] for key in keys])
+        return {f"{prefix}:{symbol}": value for symbol, value in fetched.items()}
+
+    keys = [f"{prefix}:{symbol}" for symbol in dict.fromkeys(symbols)]
+    cached = quote_cache.get_many(keys, fetch_many)
+    return {key.split(":", 1)[1]: value for key, value in cached.items()}
+
+
+def get_api_currencies(currencies: List[str]) -> Dict[str, float]:
+    """Функция возвращает текущие курсы нескольких валют к RUB через API одним запросом
+    (с кешированием, см. quote_cache)"""
+    return _get_cached_quotes("currency", currencies, _fetch_api_currencies)
 
 
 def get_api_currency(currency: str) -> Any:
     """Функция возвращает текущий курс валюты к RUB через API"""
-    rate = "RUB"
-    url = f"https://api.apilayer.com/exchangerates_data/latest?symbols={rate}&base={currency}"
-    logger.debug(f"Формирование запроса к API: {url}")
+    return get_api_currencies([currency])[currency]
+
 
-    headers = {"apikey": os.getenv("API_KEY_FOR_CURRENCY")}
-    response = requests.get(url, headers=headers, data={})
+def _fetch_api_currencies(currencies: List[str]) -> Dict[str, float]:
+    """Один запрос курсов валют к RUB у API.
+    Первая валюта - базовая: курс остальных считается через ее курс к RUB."""
+    base = currencies[0]
+    symbols = ["RUB"] + [currency for currency in currencies[1:] if currency not in ("RUB", base)]
+    params = {"symbols": ",".join(symbols), "base": base}
+    logger.debug("Формирование запроса к API: %s %s", CURRENCY_API_URL, params)
+
+    headers = {"apikey": get_api_key("API_KEY_FOR_CURRENCY")}
+    response = get_http_session().get(CURRENCY_API_URL, params=params, headers=headers, timeout=API_TIMEOUT)
+    response.raise_for_status()
     data = response.json()
-    rates = data["rates"]["RUB"]
-    logger.info(f"Успешно получен курс {currency}: {rates} RUB")
-    logger.debug(f"Полный ответ API: {json.dumps(data, indent=2)}")
+    base_rate = data["rates"]["RUB"]    # рублей за единицу базовой валюты
+    rates = {base: base_rate}
+    for currency in currencies[1:]:
+        if currency == "RUB":
+            rates[currency] = 1.0
+        elif currency in data["rates"]:
+            rates[currency] = base_rate / data["rates"][currency]
+    logger.info("Успешно получены курсы %s к RUB", ', '.join(rates))
+    logger.debug("Полный ответ API: %s", LazyJson(data, indent=2))
     return rates
 
 
+def get_api_stocks_prices(stocks: List[str]) -> Dict[str, Any]:
+    """Функция возвращает текущие курсы нескольких акций через API
+    (тикеры объединяются в запросы до STOCKS_BATCH_SIZE штук, с кешированием, см. quote_cache)"""
+    return _get_cached_quotes("stock", stocks, _fetch_api_stocks)
+
+
 def get_api_stocks(stocks: str) -> Any:
     """Функция возвращает текущий курс акции через API"""
-    logger.info(f"Начало запроса для акции: {stocks}")
-    api_key = os.getenv("API_KEY_FOR_STOCKS")
-    url = f"https://api.twelvedata.com/price?symbol={stocks}&apikey={api_key}&source=docs"
+    return get_api_stocks_prices([stocks])[stocks]
+
+
+def _fetch_api_stocks(stocks: List[str]) -> Dict[str, Any]:
+    """Запрос текущих курсов акций у API: по одному запросу на каждые STOCKS_BATCH_SIZE тикеров,
+    запросы выполняются параллельно"""
+    batches = [stocks[i:i + STOCKS_BATCH_SIZE] for i in range(0, len(stocks), STOCKS_BATCH_SIZE)]
+    prices: Dict[str, Any] = {}
+    for batch_prices in _api_executor.map(_fetch_api_stocks_batch, batches):
+        prices.update(batch_prices)
+    return prices
+
+
+def _fetch_api_stocks_batch(stocks: List[str]) -> Dict[str, Any]:
+    """Один запрос курсов акций к API (список тикеров через запятую)"""
+    logger.info("Начало запроса для акций: %s", ', '.join(stocks))
+    params = {"symbol": ",".join(stocks), "apikey": get_api_key("API_KEY_FOR_STOCKS"), "source": "docs"}
 
-    response = requests.get(url)
+    response = get_http_session().get(STOCKS_API_URL, params=params, timeout=API_TIMEOUT)
+    response.raise_for_status()
     data = response.json()
+    # Для одного тикера API возвращает объект без вложенности по тикерам
+    if len(stocks) == 1:
+        data = {stocks[0]: data}
 
-    logger.info(f"Данные по акции {stocks} успешно получены")
-    logger.debug(f"Ответ API: {json.dumps(data, indent=2)}")
-    return data
+    prices = {stock: item for stock, item in data.items() if isinstance(item, dict) and "price" in item}
+    logger.info("Данные по акциям %s успешно получены", ', '.join(prices))
+    logger.debug("Ответ API: %s", LazyJson(data, indent=2))
+    return prices
 
 
+@profile_stage("currency_rates")
 def get_currency_rates(user_currencies: List[str]) -> List:
-    """ Функция возвращает курс валют."""
+    """ Функция возвращает курс валют. Курсы всех валют запрашиваются одним запросом."""
     # user_settings = get_user_settings()
     # user_currencies = user_settings["user_currencies"]
-    logger.info(f"Начало обработки запроса курса валют. Количество валют: {len(user_currencies)}")
+    logger.info("Начало обработки запроса курса валют. Количество валют: %s", len(user_currencies))
     currency_rates = []        # валюта в реальном времени
+    all_rates = get_api_currencies(user_currencies) if user_currencies else {}
     for currency in user_currencies:
-        logger.info(f"Обрабатываю валюту: {currency}")
-        rates = get_api_currency(currency)
+        logger.info("Обрабатываю валюту: %s", currency)
+        if currency not in all_rates:
+            logger.warning("Не удалось получить курс %s", currency)
+            continue
+        rates = all_rates[currency]
         currency_rates.append({"currency": currency, "rate": round(rates, 2)})
-        logger.info(f"Успешно получен курс {currency}: {round(rates, 2)}")
-    logger.info(f"Обработка завершена. Успешно получено курсов: {len(user_currencies)}")
+        logger.info("Успешно получен курс %s: %s", currency, round(rates, 2))
+    logger.info("Обработка завершена. Успешно получено курсов: %s", len(currency_rates))
     return currency_rates
 
 
+@profile_stage("stock_prices")
 def get_stock_prices(user_stocks: List[str]) -> List:
-    """ Функция возвращает курс акций пользователя"""
+    """ Функция возвращает курс акций пользователя. Курсы всех акций запрашиваются одним запросом."""
     # user_settings = get_user_settings()
     # user_stocks = user_settings["user_stocks"]
-    logger.info(f"Начало обработки запроса акций. Количество акций: {len(user_stocks)}")
+    logger.info("Начало обработки запроса акций. Количество акций: %s", len(user_stocks))
     stock_prices = []
+    all_prices = get_api_stocks_prices(user_stocks) if user_stocks else {}
     for stock in user_stocks:
         logger.info("Обработка акции")
-        prices = get_api_stocks(stock)
+        if stock not in all_prices:
+            logger.warning("Не удалось получить курс акции %s", stock)
+            continue
+        prices = all_prices[stock]
         rounded_price = round(float(prices["price"]), 2)    # Преобразуем в float и округляем
         stock_prices.append({"stock": stock, "price": rounded_price})
-        logger.info(f"Успешно обработана акция {stock}: {rounded_price}")
-    logger.info(f"Завершение обработки. Успешно обработано {len(stock_prices)}/{len(user_stocks)} акций")
+        logger.info("Успешно обработана акция %s: %s", stock, rounded_price)
+    logger.info("Завершение обработки. Успешно обработано %s/%s акций", len(stock_prices), len(user_stocks))
     return stock_prices
 
 
@@ -1,79 +1,259 @@
+import asyncio
+import contextvars
 import json
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any
+from typing import IO, Any, Dict, List, Optional
 
 import pandas as pd
 
-from config import PATH_XLSX, USER_SETTINGS
-from logger import logger
-from src.utils import (get_cards, get_cards_info, get_currency_rates, get_greetings, get_stock_prices,
-                       get_top_five_max_prices, get_user_settings)
+from config import PATH_XLSX, USER_SETTINGS, VIEWS_MAX_WORKERS
+from logger import get_logger
+from src.database import load_transactions
+from src.profiling import collect_metrics, profile_stage
+from src.response_cache import ResponseCache
+from src.rollups import DailyRollups
+from src.schema import to_rubles
+from src.utils import (cards_info_from_totals, get_cards, get_cards_info, get_currency_rates, get_file_version,
+                       get_greetings, get_quotes_epoch, get_stock_prices, get_top_five_max_prices, get_user_settings,
+                       select_period, write_json)
 
+logger = get_logger(__name__)
 
-def get_main_page_info(date: Any) -> str:
-    """ Главную функцию, принимающую на вход строку с датой и временем в формате YYYY-MM-DD HH:MM:SS
-     и возвращающую JSON-ответ со следующими данными:
+# Пул для одновременного запроса курсов валют и котировок акций
+_quotes_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="quotes")
+# Пул для загрузки и расчетов по таблицам в асинхронном варианте главной страницы
+_frame_executor = ThreadPoolExecutor(max_workers=VIEWS_MAX_WORKERS, thread_name_prefix="views")
+# Строящиеся асинхронно ответы: (цикл событий, ключ кеша) -> задача
+_pending_pages: Dict[tuple, "asyncio.Task[str]"] = {}
+# Готовые JSON-ответы главной страницы
+main_page_cache = ResponseCache()
+
+
+def get_main_page_info(date: Any,
+                       transactions: Optional[pd.DataFrame] = None,
+                       rollups: Optional[DailyRollups] = None,
+                       db_path: Optional[str] = None,
+                       profile: bool = False) -> str:
+    """ Главная страница в виде JSON-строки (см. build_main_page_info).
+    Повторный запрос с той же датой, пока не изменились транзакции, настройки пользователя
+    и котировки, отдается из main_page_cache без загрузки и расчетов.
+    profile: добавить в ответ "metrics" - время, строки и память по этапам (см. src.profiling).
+    Такой ответ всегда строится заново и в кеш не попадает."""
+    if profile:
+        with collect_metrics() as metrics:
+            info = build_main_page_info(date, transactions, rollups, db_path)
+        info["metrics"] = metrics.to_list()
+        return json.dumps(info, indent=2, ensure_ascii=False)
+
+    cached = _cached_main_page(_main_page_cache_key(date, transactions, db_path), transactions)
+    if cached is not None:
+        return cached
+
+    info = build_main_page_info(date, transactions, rollups, db_path)
+    response = json.dumps(info, indent=2, ensure_ascii=False)
+    _store_main_page(date, transactions, db_path, response)
+    return response
+
+
+def _cached_main_page(key: tuple, transactions: Optional[pd.DataFrame]) -> Optional[str]:
+    """ Ответ из main_page_cache, если он построен по той же таблице транзакций."""
+    cached = main_page_cache.get(key)
+    if cached is None:
+        return None
+    frame_ref, response = cached
+    if frame_ref is not None and frame_ref() is not transactions:
+        main_page_cache.discard(key)    # таблица, по которой построен ответ, уже удалена
+        return None
+    return str(response)
+
+
+def _store_main_page(date: Any, transactions: Optional[pd.DataFrame], db_path: Optional[str], response: str) -> None:
+    """ Сохраняет ответ в main_page_cache. Построение ответа запрашивает котировки и меняет
+    эпоху кеша котировок, поэтому ключ вычисляется после построения: с ключом до построения
+    ответ сразу оказался бы устаревшим, и следующий запрос строил бы его заново.
+    Таблица транзакций хранится по слабой ссылке, чтобы кеш не удерживал в памяти таблицы,
+    уже вытесненные или замененные в TransactionStore."""
+    frame_ref = None if transactions is None else weakref.ref(transactions)
+    main_page_cache.put(_main_page_cache_key(date, transactions, db_path), (frame_ref, response))
+
+
+def _main_page_cache_key(date: Any, transactions: Optional[pd.DataFrame], db_path: Optional[str]) -> tuple:
+    """ Ключ кеша главной страницы: дата запроса, версия транзакций, версия файла настроек,
+    эпоха кеша котировок и приветствие (зависит от текущего часа)."""
+    if transactions is not None:
+        # id может достаться новой таблице после удаления прежней - ответ проверяется по слабой ссылке
+        data_version: Any = ("frame", id(transactions), len(transactions))
+    else:
+        source = PATH_XLSX if db_path is None else db_path
+        data_version = (source, get_file_version(source))
+    return date, data_version, get_file_version(USER_SETTINGS), get_quotes_epoch(), get_greetings()
+
+
+def write_main_page_info(date: Any,
+                         file: IO[str],
+                         transactions: Optional[pd.DataFrame] = None,
+                         rollups: Optional[DailyRollups] = None,
+                         db_path: Optional[str] = None) -> None:
+    """ Потоковый вариант get_main_page_info: JSON-ответ пишется в файл или сокет по частям."""
+    write_json(build_main_page_info(date, transactions, rollups, db_path), file)
+
+
+@profile_stage("main_page")
+def build_main_page_info(date: Any,
+                         transactions: Optional[pd.DataFrame] = None,
+                         rollups: Optional[DailyRollups] = None,
+                         db_path: Optional[str] = None) -> Dict[str, Any]:
+    """ Функция, принимающая на вход строку с датой и временем в формате YYYY-MM-DD HH:MM:SS
+     и возвращающая словарь для JSON-ответа со следующими данными:
      1. Приветствие
      2. По каждой карте
      3. Топ-5 транзакций по сумме платежа
      4. Курс валют
      5. Стоимость акций из S&P500
+     transactions: уже загруженные транзакции (например, из TransactionStore).
+     Если не переданы - загружаются из PATH_XLSX.
+     rollups: дневные корзины расходов по transactions (TransactionStore.rollups).
+     Если переданы - суммы по картам складываются из корзин, а не из строк.
+     db_path: база транзакций SQLite (src.database). Если указана и transactions не переданы -
+     из базы запросом по индексу читаются только транзакции периода.
      """
+    summary = _summarize_transactions(date, transactions, rollups, db_path)
+
+    # 5. Финансовые данные
+    currencies, stocks = _get_quote_settings()
+
+    # Курсы валют и котировки акций запрашиваются одновременно
+    logger.info("Запрашиваем курсы валют: %s", ', '.join(currencies))
+    # Контекст копируется, чтобы замеры этапов (src.profiling) работали и в потоках пула
+    currency_future = _quotes_executor.submit(contextvars.copy_context().run, get_currency_rates, currencies)
+
+    logger.info("Запрашиваем котировки акций: %s", ', '.join(stocks))
+    stock_future = _quotes_executor.submit(contextvars.copy_context().run, get_stock_prices, stocks)
+
+    return _main_page_result(summary, currency_future.result(), stock_future.result())
+
+
+async def get_main_page_info_async(date: Any,
+                                   transactions: Optional[pd.DataFrame] = None,
+                                   rollups: Optional[DailyRollups] = None,
+                                   db_path: Optional[str] = None) -> str:
+    """ Асинхронный вариант get_main_page_info для веб-сервера на asyncio: цикл событий не блокируется.
+    Ответ из main_page_cache отдается сразу. Одновременные запросы с одинаковым ключом
+    ждут одного построения, а не строят ответ каждый сам."""
+    key = _main_page_cache_key(date, transactions, db_path)
+    cached = _cached_main_page(key, transactions)
+    if cached is not None:
+        return cached
+
+    loop = asyncio.get_running_loop()
+    pending_key = (loop, key)
+    task = _pending_pages.get(pending_key)
+    if task is None:
+        task = loop.create_task(_build_main_page_response(date, transactions, rollups, db_path))
+        _pending_pages[pending_key] = task
+        task.add_done_callback(lambda _: _pending_pages.pop(pending_key, None))
+    # Отмена одного запроса не отменяет построение, которого ждут остальные
+    return await asyncio.shield(task)
+
+
+async def _build_main_page_response(date: Any,
+                                    transactions: Optional[pd.DataFrame],
+                                    rollups: Optional[DailyRollups],
+                                    db_path: Optional[str]) -> str:
+    """ Строит JSON-ответ главной страницы и сохраняет его в main_page_cache."""
+    info = await build_main_page_info_async(date, transactions, rollups, db_path)
+    response = json.dumps(info, indent=2, ensure_ascii=False)
+    _store_main_page(date, transactions, db_path, response)
+    return response
+
+
+async def build_main_page_info_async(date: Any,
+                                     transactions: Optional[pd.DataFrame] = None,
+                                     rollups: Optional[DailyRollups] = None,
+                                     db_path: Optional[str] = None) -> Dict[str, Any]:
+    """ Асинхронный вариант build_main_page_info.
+    Загрузка и расчеты по таблицам выполняются в пуле _frame_executor, запросы котировок -
+    в пуле _quotes_executor одновременно с ними. Пулы общие и ограниченные:
+    число потоков не растет с числом одновременных запросов."""
+    loop = asyncio.get_running_loop()
+    summary = loop.run_in_executor(_frame_executor, contextvars.copy_context().run,
+                                   _summarize_transactions, date, transactions, rollups, db_path)
+    currencies, stocks = await loop.run_in_executor(_frame_executor, contextvars.copy_context().run,
+                                                    _get_quote_settings)
+
+    logger.info("Запрашиваем курсы валют: %s", ', '.join(currencies))
+    logger.info("Запрашиваем котировки акций: %s", ', '.join(stocks))
+    currency_rates, stock_prices, summary_info = await asyncio.gather(
+        loop.run_in_executor(_quotes_executor, contextvars.copy_context().run, get_currency_rates, currencies),
+        loop.run_in_executor(_quotes_executor, contextvars.copy_context().run, get_stock_prices, stocks),
+        summary)
+    return _main_page_result(summary_info, currency_rates, stock_prices)
+
+
+def _summarize_transactions(date: Any,
+                            transactions: Optional[pd.DataFrame],
+                            rollups: Optional[DailyRollups],
+                            db_path: Optional[str]) -> Dict[str, Any]:
+    """ Разделы главной страницы по транзакциям: приветствие, карты и топ-5 транзакций."""
     # 1. Получение приветствия
-    logger.info(f"Запуск формирования отчета для даты: {date}")
+    logger.info("Запуск формирования отчета для даты: %s", date)
     logger.info("Получаем персональное приветствие")
     greetings = get_greetings()
-    logger.debug(f"Приветствие: {greetings}")
+    logger.debug("Приветствие: %s", greetings)
 
     # 2. Обработка карт и транзакций
     logger.info("Загрузка данных по картам и транзакциям")
-    all_transactions = get_cards(PATH_XLSX)
-    logger.info(f"Всего транзакций загружено: {len(all_transactions)}")
+    from_database = transactions is None and db_path is not None
+    if not from_database:
+        all_transactions = get_cards(PATH_XLSX) if transactions is None else transactions
+        logger.info("Всего транзакций загружено: %s", len(all_transactions))
     # Преобразуем строку в объект datetime   YYYY-MM-DD HH:MM:SS
     end_period = datetime.strptime(date, "%Y-%m-%d %H:%M:%S")
-    logger.info(f"Преобразуем строку в объект datetime YYYY-MM-DD HH:MM:SS {end_period}")
+    logger.info("Преобразуем строку в объект datetime YYYY-MM-DD HH:MM:SS %s", end_period)
     start_period = end_period.replace(day=1, hour=0, minute=0, second=0)
-    logger.info(f"Анализируем период с {start_period} по {end_period}")
+    logger.info("Анализируем период с %s по %s", start_period, end_period)
 
-    # Фильтрация транзакций
-    date_series = pd.to_datetime(all_transactions["Дата операции"], format="%d.%m.%Y %H:%M:%S", dayfirst=True)
-    selected_transactions = all_transactions[
-        (date_series >= start_period) & (date_series <= end_period)
-    ]
-    logger.info(f"Отфильтровано транзакций за период: {len(selected_transactions)}")
+    # Фильтрация транзакций: из базы читаются только транзакции периода
+    if db_path is not None and from_database:
+        all_transactions = selected_transactions = load_transactions(db_path, start_period, end_period)
+    else:
+        selected_transactions = select_period(all_transactions, start_period, end_period)
+    logger.info("Отфильтровано транзакций за период: %s", len(selected_transactions))
 
     # 3. Анализ карт
-    card_info = get_cards_info(selected_transactions)
-    logger.info(f"Получена информация по {len(card_info)} картам")
+    if rollups is None:
+        card_info = get_cards_info(selected_transactions)
+    else:
+        card_totals = rollups.card_totals(all_transactions, start_period, end_period)
+        card_info = cards_info_from_totals(to_rubles(card_totals, card_totals))
+    logger.info("Получена информация по %s картам", len(card_info))
 
     # 4. Топ-5 транзакций
     top_five = get_top_five_max_prices(selected_transactions)
     logger.info("Сформирован топ-5 транзакций.")
 
-    # 5. Финансовые данные
-    logger.info("Загрузка финансовых данных")
-    stock_currencies = get_user_settings(USER_SETTINGS)
-    logger.debug(f"Настройки пользователя: {stock_currencies}")
+    return {"greeting": greetings, "cards": card_info, "top_transactions": top_five}
 
-    currencies = stock_currencies["user_currencies"]
-    stocks = stock_currencies["user_stocks"]
 
-    logger.info(f"Запрашиваем курсы валют: {', '.join(currencies)}")
-    currency_rates = get_currency_rates(currencies)
+def _get_quote_settings() -> tuple[List[str], List[str]]:
+    """ Валюты и акции пользователя из USER_SETTINGS."""
+    logger.info("Загрузка финансовых данных")
+    stock_currencies = get_user_settings(USER_SETTINGS)
+    logger.debug("Настройки пользователя: %s", stock_currencies)
+    return stock_currencies["user_currencies"], stock_currencies["user_stocks"]
 
-    logger.info(f"Запрашиваем котировки акций: {', '.join(stocks)}")
-    stock_prices = get_stock_prices(stocks)
 
-    # Формирование результата
+def _main_page_result(summary: Dict[str, Any], currency_rates: List, stock_prices: List) -> Dict[str, Any]:
+    """ Формирование результата: разделы по транзакциям, курсы валют и котировки акций."""
     result = {
-        "greeting": greetings,
-        "cards": card_info,
-        "top_transactions": top_five,
+        **summary,
         "currency_rates": currency_rates,
         "stock_prices": stock_prices
     }
     logger.info("Отчет успешно сформирован")
-    return json.dumps(result, indent=2, ensure_ascii=False)
+    return result
 
 
 # if __name__ == '__main__':
@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from src.quote_cache import QuoteCache
+from src.reports import flush_reports
+from src.response_cache import ResponseCache
+
+
+@pytest.fixture(autouse=True)
+def empty_quote_cache() -> Iterator[QuoteCache]:
+    """Каждый тест работает с пустым кешем котировок без снимка на диске"""
+    cache = QuoteCache()
+    with patch("src.utils.quote_cache", cache):
+        yield cache
+
+
+@pytest.fixture(autouse=True)
+def empty_main_page_cache() -> Iterator[ResponseCache]:
+    """Каждый тест строит ответы главной страницы заново"""
+    cache = ResponseCache()
+    with patch("src.views.main_page_cache", cache):
+        yield cache
+
+
+@pytest.fixture(autouse=True)
+def report_files_in_tmp(tmp_path: Path) -> Iterator[None]:
+    """Отчеты пишутся во временный каталог теста, а не в data/ репозитория.
+    Отчеты, переданные в фоновую запись, записываются до конца теста (и до снятия его патчей)"""
+    with patch("src.reports.PATH_DATA", str(tmp_path / "reports")):
+        yield
+        flush_reports()
+
+
+class ApiStub:
+    """Локальный HTTP-сервер, имитирующий API курсов валют и котировок акций"""
+
+    def __init__(self) -> None:
+        self.rates: Dict[str, float] = {"USD": 75.5, "EUR": 80.1}
+        self.prices: Dict[str, str] = {"AAPL": "150.25", "GOOGL": "2800.5", "AMZN": "130.1",
+                                       "MSFT": "310.4", "TSLA": "250.0"}
+        self.delay = 0.0
+        self.fail = False
+        self.requests: list[str] = []
+        self.url = ""
+
+    def handle(self, path: str) -> Any:
+        self.requests.append(path)
+        time.sleep(self.delay)
+        if self.fail:
+            return None
+        url = urlparse(path)
+        query = {key: value[0] for key, value in parse_qs(url.query).items()}
+        if url.path == "/currency":
+            # Курсы валют из symbols за единицу base (курс RUB задан как 1)
+            rub_per_base = self.rates.get(query["base"], 1.0)
+            rates = {symbol: rub_per_base / self.rates.get(symbol, 1.0) for symbol in query["symbols"].split(",")}
+            return {"success": True, "base": query["base"], "rates": rates}
+        symbols = query["symbol"].split(",")
+        if len(symbols) == 1:
+            return {"symbol": symbols[0], "price": self.prices[symbols[0]]}
+        return {symbol: {"symbol": symbol, "price": self.prices[symbol]} for symbol in symbols}
+
+
+@pytest.fixture
+def api_stub() -> Iterator[ApiStub]:
+    """Поднимает заглушку API на свободном порту и направляет на нее запросы src.utils"""
+    stub = ApiStub()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            data = stub.handle(self.path)
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(500 if data is None else 200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stub.url = f"http://127.0.0.1:{server.server_address[1]}"
+    with patch("src.utils.CURRENCY_API_URL", f"{stub.url}/currency"), \
+            patch("src.utils.STOCKS_API_URL", f"{stub.url}/price"):
+        yield stub
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,31 @@
+import pandas as pd
+
+from benchmarks.generate import generate_transactions
+from benchmarks.run import compare_with_baseline
+from src.schema import apply_schema
+from src.utils import get_cards_info, index_by_operation_date
+
+
+def test_generated_transactions_match_export_schema() -> None:
+    """Синтетическая выгрузка имеет колонки и типы выгрузки банка и воспроизводится по seed"""
+    transactions = generate_transactions(500, seed=1)
+
+    assert list(transactions.columns) == [
+        "Дата операции", "Дата платежа", "Номер карты", "Статус", "Сумма операции", "Валюта операции",
+        "Сумма платежа", "Валюта платежа", "Кэшбэк", "Категория", "MCC", "Описание", "Бонусы (включая кэшбэк)",
+        "Округление на инвесткопилку", "Сумма операции с округлением"]
+    pd.testing.assert_frame_equal(transactions, generate_transactions(500, seed=1))
+    indexed = index_by_operation_date(transactions)
+    assert not indexed.index.hasnans
+    assert get_cards_info(apply_schema(indexed))
+
+
+def test_compare_with_baseline() -> None:
+    """Регрессией считается ухудшение времени или памяти больше допустимого"""
+    baseline = [{"entry_point": "main_page", "rows": 10_000, "seconds": 0.1, "peak_rss_mb": 100.0}]
+    faster = [{"entry_point": "main_page", "rows": 10_000, "seconds": 0.11, "peak_rss_mb": 90.0}]
+    slower = [{"entry_point": "main_page", "rows": 10_000, "seconds": 0.2, "peak_rss_mb": 100.0},
+              {"entry_point": "transfers", "rows": 10_000, "seconds": 5.0, "peak_rss_mb": 100.0}]
+
+    assert compare_with_baseline(faster, baseline, tolerance=0.2) == []
+    assert compare_with_baseline(slower, baseline, tolerance=0.2) == ["main_page на 10000 строках: seconds 0.1 -> 0.2"]
@@ -0,0 +1,139 @@
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from src.database import (connect, get_categories, ingest_statement, load_transactions, read_transactions,
+                          transaction_keys)
+from src.reports import select_category_spending, spending_by_category_in_database
+from src.services import get_search_for_transfers_to_individuals, search_transfers_in_database
+from src.store import TransactionStore
+from src.utils import get_cards
+from src.views import get_main_page_info
+
+TRANSACTIONS = pd.DataFrame({
+    "Дата операции": ["01.03.2024 10:00:00", "05.03.2024 12:00:00", "05.03.2024 12:00:00", "28.02.2024 11:00:00"],
+    "Номер карты": ["*1111", "*2222", "*2222", "*1111"],
+    "Сумма операции": [-100.5, -50.0, -50.0, -700.0],
+    "Сумма платежа": [-100.5, -50.0, -50.0, -700.0],
+    "Кэшбэк": [None, 1.0, 1.0, None],
+    "Категория": ["Супермаркеты", "Кафе", "Кафе", "Дом и ремонт"],
+    "Описание": ["Магнит", "Кофе", "Кофе", "Леруа"],
+    "Бонусы (включая кэшбэк)": [2, 1, 1, 14],
+})
+
+NEW_TRANSACTIONS = pd.DataFrame({
+    "Дата операции": ["05.03.2024 12:00:00", "10.03.2024 14:00:00"],
+    "Номер карты": ["*2222", "*1111"],
+    "Сумма операции": [-50.0, -300.25],
+    "Сумма платежа": [-50.0, -300.25],
+    "Кэшбэк": [1.0, None],
+    "Категория": ["Кафе", "Дом и ремонт"],
+    "Описание": ["Кофе", "Оби"],
+    "Бонусы (включая кэшбэк)": [1, 6],
+})
+
+
+@pytest.fixture
+def statements(tmp_path: Path) -> tuple[str, str]:
+    """Первая выписка (Excel) и следующая, пересекающаяся с ней (CSV)"""
+    first, second = tmp_path / "march.xlsx", tmp_path / "update.csv"
+    TRANSACTIONS.to_excel(first, index=False)
+    NEW_TRANSACTIONS.to_csv(second, index=False)
+    return str(first), str(second)
+
+
+def test_transaction_keys_number_duplicates() -> None:
+    """Одинаковые транзакции в выписке различаются порядковым номером, ключи не зависят от формата чисел"""
+    keys = transaction_keys(TRANSACTIONS)
+    assert keys.is_unique
+    assert keys[1].split(":")[0] == keys[2].split(":")[0]
+    assert keys[1].endswith(":0") and keys[2].endswith(":1")
+
+    as_read_from_csv = TRANSACTIONS.assign(**{"Сумма операции": ["-100.5", "-50", "-50", "-700"]})
+    assert transaction_keys(as_read_from_csv.astype({"Сумма операции": float})).equals(keys)
+
+
+def test_ingest_statement_appends_only_new(statements: tuple[str, str], tmp_path: Path) -> None:
+    """Повторная загрузка выписки ничего не добавляет, из пересекающейся выписки добавляются только новые строки"""
+    first, second = statements
+    db_path = str(tmp_path / "transactions.db")
+
+    assert len(ingest_statement(first, db_path)) == 4
+    assert len(ingest_statement(first, db_path)) == 0
+    added = ingest_statement(second, db_path)
+
+    assert list(added["Описание"]) == ["Оби"]
+    stored = read_transactions(db_path)
+    assert len(stored) == 5
+    assert list(stored["Дата операции"]) == ["28.02.2024 11:00:00", "01.03.2024 10:00:00", "05.03.2024 12:00:00",
+                                             "05.03.2024 12:00:00", "10.03.2024 14:00:00"]
+    assert list(stored.columns) == list(TRANSACTIONS.columns)
+
+
+def test_get_cards_from_database(statements: tuple[str, str], tmp_path: Path) -> None:
+    """get_cards читает базу транзакций так же, как исходную выгрузку Excel"""
+    first, _ = statements
+    db_path = str(tmp_path / "transactions.db")
+    ingest_statement(first, db_path)
+
+    pd.testing.assert_frame_equal(get_cards(db_path), get_cards(first, use_cache=False))
+
+
+def test_store_ingest_updates_loaded_database(statements: tuple[str, str], tmp_path: Path) -> None:
+    """Если база уже загружена в хранилище, новые транзакции добавляются в память без перечитывания"""
+    first, second = statements
+    db_path = str(tmp_path / "transactions.db")
+    ingest_statement(first, db_path)
+    store = TransactionStore()
+    store.get(db_path)
+    store.rollups(db_path)
+
+    store.ingest(second, db_path)
+
+    pd.testing.assert_frame_equal(store.get(db_path), get_cards(db_path), check_dtype=False)
+    assert store.rollups(db_path).by_card["Сумма операции"].sum() == pytest.approx(-120_075)
+
+
+def test_load_transactions_uses_indexes(statements: tuple[str, str], tmp_path: Path) -> None:
+    """Отбор по периоду и категории выполняется запросом SQL по индексу, а не чтением всей таблицы"""
+    first, second = statements
+    db_path = str(tmp_path / "transactions.db")
+    ingest_statement(first, db_path)
+    ingest_statement(second, db_path)
+
+    period = load_transactions(db_path, datetime(2024, 3, 1), datetime(2024, 3, 5, 12))
+    assert list(period["Описание"]) == ["Магнит", "Кофе", "Кофе"]
+    expenses = load_transactions(db_path, categories=["Дом и ремонт"], expenses_only=True)
+    assert list(expenses["Описание"]) == ["Леруа", "Оби"]
+    assert list(load_transactions(db_path, cards=["*2222"])["Описание"]) == ["Кофе", "Кофе"]
+    assert sorted(get_categories(db_path)) == ["Дом и ремонт", "Кафе", "Супермаркеты"]
+
+    with connect(db_path) as connection:
+        plan = connection.execute("EXPLAIN QUERY PLAN SELECT * FROM transactions WHERE \"Категория\" = ? "
+                                  "AND operation_date >= ?", ("Кафе", "2024-03-01")).fetchall()
+    connection.close()
+    assert "idx_transactions_category" in plan[0][-1]
+
+
+def test_database_queries_match_dataframe(statements: tuple[str, str], tmp_path: Path) -> None:
+    """Главная страница, поиск переводов и отчет по базе совпадают с результатами по загруженной таблице"""
+    first, _ = statements
+    db_path = str(tmp_path / "transactions.db")
+    ingest_statement(first, db_path)
+    transactions = get_cards(first, use_cache=False)
+
+    with patch("src.reports.PATH_DATA", str(tmp_path)):
+        report = spending_by_category_in_database(db_path, "Дом и ремонт", "2024-03-10")
+    pd.testing.assert_frame_equal(report, select_category_spending(transactions, "Дом и ремонт", "2024-03-10"),
+                                  check_dtype=False, check_categorical=False)
+    assert search_transfers_in_database(db_path, "Кафе") == get_search_for_transfers_to_individuals(
+        transactions, "Кафе")
+
+    with patch("src.views.get_currency_rates", return_value=[]), \
+            patch("src.views.get_stock_prices", return_value=[]), \
+            patch("src.views.get_greetings", return_value="Добрый день"):
+        assert get_main_page_info("2024-03-20 00:00:00", db_path=db_path) == get_main_page_info(
+            "2024-03-20 00:00:00", transactions)
@@ -0,0 +1,38 @@
+import logging
+from pathlib import Path
+from unittest.mock import patch
+
+from logger import DeferredQueueHandler, LazyFileHandler, get_logger, log_queue, logger
+
+
+def test_module_levels() -> None:
+    """Уровень логирования задается для модуля отдельно, остальные модули пишут с общим уровнем"""
+    with patch("logger.LOG_LEVELS", {"tests.quiet_module": "WARNING"}):
+        quiet = get_logger("tests.quiet_module")
+        verbose = get_logger("tests.verbose_module")
+
+    assert quiet.parent is logger
+    assert not quiet.isEnabledFor(logging.DEBUG)
+    assert verbose.isEnabledFor(logging.DEBUG)
+
+
+def test_queue_handler_formats_in_background() -> None:
+    """Аргументы сообщения подставляются не в вызывающем потоке, а при записи в файл"""
+    handler = DeferredQueueHandler(log_queue)
+    record = logging.LogRecord("logger", logging.DEBUG, __file__, 1, "Найдено %s операций", (5,), None)
+
+    prepared = handler.prepare(record)
+
+    assert prepared.msg == "Найдено %s операций" and prepared.args == (5,)
+    assert prepared.getMessage() == "Найдено 5 операций"
+
+
+def test_log_file_created_on_first_record(tmp_path: Path) -> None:
+    """Файл лога и его каталог создаются при первой записи, а не при создании хендлера"""
+    log_path = tmp_path / "logs" / "app.log"
+    handler = LazyFileHandler(str(log_path), mode="w", encoding="utf-8", delay=True)
+    assert not log_path.parent.exists()
+
+    handler.emit(logging.LogRecord("logger", logging.INFO, __file__, 1, "Запуск", None, None))
+    handler.close()
+    assert log_path.read_text(encoding="utf-8") == "Запуск\n"
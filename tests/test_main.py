@@ -0,0 +1,27 @@
+import sys
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from main import build_parser, cli
+
+
+def test_cli_commands() -> None:
+    """Каждая команда вызывает свой обработчик с параметрами по умолчанию и из командной строки"""
+    args = build_parser().parse_args(["report", "--category", "Кафе", "--source", "operations.xlsx"])
+    assert (args.category, args.date, args.source) == ("Кафе", "2021-11-25", "operations.xlsx")
+
+    with patch("src.utils.get_cards", return_value=pd.DataFrame()) as mock_get_cards, \
+            patch("src.services.get_search_for_transfers_to_individuals", return_value="[]") as mock_search:
+        cli(["transfers", "--source", "operations.xlsx"])
+    mock_get_cards.assert_called_once_with("operations.xlsx")
+    assert mock_search.call_args[0][1] == "Перевод"
+
+
+def test_cli_help_does_not_import_views() -> None:
+    """Справка по командам не загружает модули с расчетами и запросами к API"""
+    with patch.dict(sys.modules, {"src.views": None}), patch("sys.argv", ["main.py", "--help"]):
+        with pytest.raises(SystemExit) as exc:
+            cli()
+    assert exc.value.code == 0
@@ -0,0 +1,106 @@
+import contextvars
+import json
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pandas as pd
+
+from src.profiling import collect_metrics, profile_stage, profiling_enabled, stage
+from src.views import get_main_page_info
+
+TRANSACTIONS = pd.DataFrame({
+    "Дата операции": ["01.03.2024 10:00:00", "15.03.2024 12:00:00", "20.03.2024 14:00:00"],
+    "Номер карты": ["*1111", "*2222", "*1111"],
+    "Сумма операции": [-100.0, -500.0, -300.0],
+    "Сумма платежа": [-100.0, -500.0, -300.0],
+    "Категория": ["Еда", "Такси", "Еда"],
+    "Описание": ["Магнит", "Яндекс", "Пятерочка"],
+})
+
+
+@profile_stage("double")
+def double(transactions: pd.DataFrame) -> pd.DataFrame:
+    return pd.concat([transactions, transactions])
+
+
+def test_stages_not_measured_by_default() -> None:
+    """Без collect_metrics этапы ничего не замеряют"""
+    assert not profiling_enabled()
+    with stage("load") as current:
+        assert current is None
+    assert len(double(TRANSACTIONS)) == 6
+
+
+def test_nested_stages() -> None:
+    """Этапы записываются с вложенностью, строками и памятью; пик вложенного этапа учитывается во внешнем"""
+    with collect_metrics() as metrics:
+        with stage("outer", rows=3):
+            big = [0] * 100_000
+            del big
+            double(TRANSACTIONS)
+
+    inner, outer = metrics.to_list()
+    assert (inner["stage"], inner["depth"], inner["rows"]) == ("double", 1, 3)
+    assert (outer["stage"], outer["depth"], outer["rows"]) == ("outer", 0, 3)
+    assert outer["seconds"] >= inner["seconds"]
+    assert outer["peak_bytes"] >= 700_000
+    assert json.loads(metrics.to_json()) == metrics.to_list()
+    assert not profiling_enabled()
+
+
+def test_main_page_metrics() -> None:
+    """По запросу главная страница возвращает замеры этапов, включая запросы котировок в потоках пула"""
+    with patch("src.views.get_greetings", return_value="Добрый день"), \
+            patch("src.views.get_user_settings", return_value={"user_currencies": ["USD"], "user_stocks": []}), \
+            patch("src.utils.get_api_currencies", return_value={"USD": 75.5}):
+        plain = json.loads(get_main_page_info("2024-03-22 00:00:00", TRANSACTIONS))
+        profiled = json.loads(get_main_page_info("2024-03-22 00:00:00", TRANSACTIONS, profile=True))
+
+    assert "metrics" not in plain
+    stages = {item["stage"]: item for item in profiled.pop("metrics")}
+    assert profiled == plain
+    assert {"main_page", "select_period", "cards", "top_transactions", "currency_rates"} <= set(stages)
+    assert stages["main_page"]["rows"] == 3
+    assert stages["currency_rates"]["depth"] == 1
+
+
+def test_concurrent_stages_are_siblings() -> None:
+    """Этапы, одновременно выполняемые в потоках пула, вложены во внешний этап, а не друг в друга"""
+    started = threading.Barrier(2)
+
+    def quotes(name: str) -> None:
+        with stage(name):
+            started.wait(timeout=5)
+            time.sleep(0.01)
+
+    with collect_metrics() as metrics:
+        with stage("main_page"), ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, quotes, name)
+                       for name in ("currency_rates", "stock_prices")]
+            for future in futures:
+                future.result()
+
+    depths = {item["stage"]: item["depth"] for item in metrics.to_list()}
+    assert depths == {"currency_rates": 1, "stock_prices": 1, "main_page": 0}
+
+
+def test_overlapping_collect_metrics() -> None:
+    """Завершение одного collect_metrics не выключает tracemalloc для другого, еще работающего в другом потоке"""
+    first_started, first_finished = threading.Event(), threading.Event()
+
+    def first_request() -> None:
+        with collect_metrics():
+            first_started.set()
+            first_finished.wait(timeout=5)
+
+    thread = threading.Thread(target=first_request)
+    thread.start()
+    first_started.wait(timeout=5)
+    with collect_metrics():
+        first_finished.set()
+        thread.join(timeout=5)
+        assert tracemalloc.is_tracing()
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,99 @@
+import json
+import threading
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.quote_cache import QuoteCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_fresh_value_from_cache() -> None:
+    """Пока котировка свежая, API не запрашивается повторно"""
+    clock = FakeClock()
+    cache = QuoteCache(ttl=60, stale_ttl=600, clock=clock)
+    fetch = MagicMock(return_value=75.5)
+
+    assert cache.get("currency:USD", fetch) == 75.5
+    clock.now += 59
+    assert cache.get("currency:USD", fetch) == 75.5
+    fetch.assert_called_once()
+
+
+def test_stale_value_refreshed_in_background() -> None:
+    """Устаревшая котировка отдается сразу, а обновляется в фоне"""
+    clock = FakeClock()
+    cache = QuoteCache(ttl=60, stale_ttl=600, clock=clock)
+    cache.get("stock:AAPL", lambda: {"price": "150"})
+
+    refreshed = threading.Event()
+
+    def fetch() -> dict:
+        refreshed.set()
+        return {"price": "155"}
+
+    clock.now += 120
+    assert cache.get("stock:AAPL", fetch) == {"price": "150"}
+    assert refreshed.wait(2)
+    cache._executor.shutdown(wait=True)
+    assert cache.get("stock:AAPL", fetch) == {"price": "155"}
+
+
+def test_expired_value_fetched_synchronously() -> None:
+    """Котировка старше TTL + stale_ttl запрашивается заново синхронно"""
+    clock = FakeClock()
+    cache = QuoteCache(ttl=60, stale_ttl=600, clock=clock)
+    cache.get("currency:USD", lambda: 75.5)
+
+    clock.now += 1000
+    assert cache.get("currency:USD", lambda: 80.0) == 80.0
+
+
+def test_last_known_good_on_error() -> None:
+    """При ошибке API отдается последнее успешно полученное значение"""
+    clock = FakeClock()
+    cache = QuoteCache(ttl=60, stale_ttl=0, clock=clock)
+    cache.get("currency:USD", lambda: 75.5)
+    clock.now += 1000
+
+    def failing_fetch() -> float:
+        raise ConnectionError("API недоступен")
+
+    assert cache.get("currency:USD", failing_fetch) == 75.5
+    with pytest.raises(ConnectionError):
+        cache.get("currency:EUR", failing_fetch)
+
+
+def test_ttl_per_symbol() -> None:
+    """TTL задается отдельно для символа"""
+    clock = FakeClock()
+    cache = QuoteCache(ttl=60, stale_ttl=0, ttls={"TSLA": 5}, clock=clock)
+    fetch = MagicMock(return_value={"price": "250"})
+
+    assert cache.ttl_for("stock:TSLA") == 5
+    assert cache.ttl_for("stock:AAPL") == 60
+    cache.get("stock:TSLA", fetch)
+    clock.now += 10
+    cache.get("stock:TSLA", fetch)
+    assert fetch.call_count == 2
+
+
+def test_snapshot_survives_restart(tmp_path: Path) -> None:
+    """Снимок на диске позволяет новому процессу использовать полученные ранее котировки"""
+    snapshot = tmp_path / "quotes.json"
+    clock = FakeClock()
+    QuoteCache(snapshot_path=str(snapshot), clock=clock).get("currency:USD", lambda: 75.5)
+    assert json.loads(snapshot.read_text(encoding="utf-8"))["currency:USD"]["value"] == 75.5
+
+    fetch = MagicMock(return_value=80.0)
+    restarted = QuoteCache(snapshot_path=str(snapshot), clock=clock)
+    assert restarted.get("currency:USD", fetch) == 75.5
+    fetch.assert_not_called()
@@ -1,14 +1,16 @@
 import json
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Collection, Iterator
+from typing import Any, Collection, Iterator
 from unittest.mock import MagicMock, patch
 
 import pandas as pd
 import pytest
 from pandas import DataFrame
 
-from src.reports import report_to_file, spending_by_category
+from src.reports import flush_reports, report_to_file, spending_by_categories, spending_by_category, split_by_category
+from src.utils import index_by_operation_date
 
 
 @pytest.fixture
@@ -57,6 +59,7 @@ def test_report_to_file_decorator(sample_transactions: DataFrame, tmp_path: Path
             patch('src.reports.logger.info') as mock_logger:
         # Вызываем декорированную функцию
         spending_by_category(sample_transactions, "Дом и ремонт", "2021-11-25")
+        flush_reports()
 
         # Проверяем, что файл был создан
         files = list(tmp_path.glob('*.json'))
@@ -101,6 +104,7 @@ def test_report_to_file_dataframe(tmp_path: Path, sample_transactions: DataFrame
             return sample_transactions
 
         dummy_func()
+        flush_reports()
 
         # Проверяем что файл создан
         assert (tmp_path / 'test_report.json').exists()
@@ -124,6 +128,7 @@ def test_report_to_file_non_dataframe(tmp_path: Path) -> None:
             return test_data
 
         result = dummy_func()
+        flush_reports()
         # Проверяем что файл создан
         file_path = tmp_path / 'non_df_report.json'
         assert file_path.exists()
@@ -136,3 +141,146 @@ def test_report_to_file_non_dataframe(tmp_path: Path) -> None:
         # Проверяем что результат функции не изменен
         mock_logger.info.assert_called()
         assert result == test_data
+
+
+def test_spending_by_category_does_not_mutate_input(sample_transactions: DataFrame) -> None:
+    """Исходный DataFrame не изменяется, повторные отчеты по одной таблице дают тот же результат"""
+    original = sample_transactions.copy()
+
+    first = spending_by_category(sample_transactions, "Дом и ремонт", "2021-11-26")
+    second = spending_by_category(sample_transactions, "Дом и ремонт", "2021-11-26")
+    other = spending_by_category(sample_transactions, "Еда", "2021-11-26")
+
+    pd.testing.assert_frame_equal(sample_transactions, original)
+    pd.testing.assert_frame_equal(first, second)
+    assert len(other) == 1
+
+
+def test_spending_by_category_indexed_transactions(sample_transactions: DataFrame) -> None:
+    """Таблица, проиндексированная по дате при загрузке, дает тот же отчет без изменения исходных данных:
+    операции идут в порядке выгрузки банка - от новых к старым"""
+    exported = sample_transactions.iloc[::-1].reset_index(drop=True)
+    indexed = index_by_operation_date(exported)
+    result = spending_by_category(indexed, "Дом и ремонт", "2021-11-26")
+
+    assert list(result["Сумма операции"]) == [-1500, -5000]
+    assert result["Дата операции"].dt.strftime("%d.%m.%Y").tolist() == ["25.11.2021", "01.09.2021"]
+    assert list(result["Описание"]) == list(spending_by_category(exported, "Дом и ремонт", "2021-11-26")["Описание"])
+    assert indexed["Дата операции"].dtype == object
+
+
+def test_spending_by_category_precomputed_dates(sample_transactions: DataFrame) -> None:
+    """Колонка дат, уже преобразованная в datetime, используется без повторного парсинга"""
+    prepared = sample_transactions.assign(**{
+        "Дата операции": pd.to_datetime(sample_transactions["Дата операции"], format="%d.%m.%Y %H:%M:%S")})
+    with patch('src.utils.pd.to_datetime') as mock_to_datetime:
+        result = spending_by_category(prepared, "Дом и ремонт", "2021-11-26")
+    mock_to_datetime.assert_not_called()
+    assert len(result) == 2
+
+
+def test_split_by_category(sample_transactions: DataFrame) -> None:
+    """Траты по нескольким категориям за один проход, отсутствующая категория - пустая таблица"""
+    result = split_by_category(sample_transactions, ["Дом и ремонт", "Еда", "Такси"], "2021-11-26")
+
+    assert set(result) == {"Дом и ремонт", "Еда", "Такси"}
+    assert list(result["Дом и ремонт"]["Сумма операции"]) == [-5000, -1500]
+    assert list(result["Еда"]["Сумма операции"]) == [-300]
+    assert result["Такси"].empty
+    assert list(result["Такси"].columns) == list(sample_transactions.columns)
+
+
+def test_split_by_category_all(sample_transactions: DataFrame) -> None:
+    """Без списка категорий возвращаются все категории с тратами за период"""
+    result = split_by_category(sample_transactions, date="2021-11-20")
+    assert set(result) == {"Дом и ремонт", "Еда"}
+
+
+def test_spending_by_categories(sample_transactions: DataFrame, tmp_path: Path) -> None:
+    """Сводный отчет по категориям записывается в один файл"""
+    with patch('src.reports.PATH_DATA', tmp_path):
+        result = spending_by_categories(sample_transactions, ["Дом и ремонт", "Такси"], "2021-11-26")
+        flush_reports()
+
+    assert list(result["Категория"]) == ["Дом и ремонт", "Такси"]
+    assert list(result["Сумма операции"]) == [-6500, 0]
+    assert list(result["Количество операций"]) == [2, 0]
+
+    files = list(tmp_path.glob('*.json'))
+    assert [file.name for file in files] == ["categories_report.json"]
+    with open(files[0], encoding="utf-8") as f:
+        assert len(json.load(f)) == 2
+
+
+def test_report_to_file_background(tmp_path: Path, sample_transactions: DataFrame) -> None:
+    """Отчет возвращается до записи файла; изменения результата после возврата в файл не попадают"""
+    started, release = threading.Event(), threading.Event()
+
+    def slow_to_json(frame: DataFrame, *args: Any, **kwargs: Any) -> None:
+        started.set()
+        release.wait(5)
+        original_to_json(frame, *args, **kwargs)
+
+    original_to_json = DataFrame.to_json
+    with patch('src.reports.PATH_DATA', tmp_path), patch.object(DataFrame, "to_json", slow_to_json):
+        result = report_to_file('slow_report.json')(lambda: sample_transactions.copy())()
+        assert started.wait(5)
+        assert not (tmp_path / 'slow_report.json').exists()
+        result.loc[:, "Сумма операции"] = 0
+        release.set()
+        assert flush_reports() == [str(tmp_path / 'slow_report.json')]
+
+    assert result.attrs["report_path"] == str(tmp_path / 'slow_report.json')
+    loaded = pd.read_json(tmp_path / 'slow_report.json')
+    assert list(loaded["Сумма операции"]) == list(sample_transactions["Сумма операции"])
+    assert [path.name for path in tmp_path.iterdir()] == ['slow_report.json']
+
+
+def test_report_to_file_templated_names(tmp_path: Path, sample_transactions: DataFrame) -> None:
+    """Шаблон имени дает каждому запуску свой файл, расширение добавляется по формату"""
+    with patch('src.reports.PATH_DATA', tmp_path):
+        report = report_to_file('{name}_{unique}', file_format="jsonl")(spending_by_category.__wrapped__)
+        for _ in range(3):
+            report(sample_transactions, "Дом и ремонт", "2021-11-26")
+        flush_reports()
+
+    files = sorted(tmp_path.iterdir())
+    assert len(files) == 3
+    assert all(file.name.startswith("spending_by_category_") and file.suffix == ".jsonl" for file in files)
+    lines = files[0].read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["Описание"] for line in lines] == ["Покупка материалов", "Ремонтные работы"]
+
+
+def test_report_to_file_jsonl_records(tmp_path: Path) -> None:
+    """Список записей в формате JSON Lines записывается по одной записи в строке, синхронно"""
+    with patch('src.reports.PATH_DATA', tmp_path):
+        report_to_file('records', file_format="jsonl", background=False)(lambda: [{"a": 1}, {"б": "в"}])()
+
+    assert (tmp_path / 'records.jsonl').read_text(encoding="utf-8") == '{"a": 1}\n{"б": "в"}\n'
+
+
+def test_report_to_file_write_error(tmp_path: Path) -> None:
+    """Ошибка фоновой записи передается в flush_reports, временный файл удаляется"""
+    with patch('src.reports.PATH_DATA', tmp_path):
+        report_to_file('bad.json')(lambda: {"value": object()})()
+        with pytest.raises(TypeError):
+            flush_reports()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_report_to_file_parquet_requires_engine() -> None:
+    """Формат parquet без pyarrow и fastparquet недоступен сразу при объявлении отчета"""
+    with patch('src.reports.importlib.util.find_spec', return_value=None):
+        with pytest.raises(ImportError):
+            report_to_file(file_format="parquet")
+    with pytest.raises(ValueError):
+        report_to_file(file_format="xml")
+
+
+def test_report_to_file_parquet(tmp_path: Path, sample_transactions: DataFrame) -> None:
+    """Отчет в формате parquet читается обратно без потерь"""
+    pytest.importorskip("pyarrow")
+    with patch('src.reports.PATH_DATA', tmp_path):
+        report_to_file('report', file_format="parquet")(lambda: sample_transactions)()
+        flush_reports()
+    pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / 'report.parquet'), sample_transactions)
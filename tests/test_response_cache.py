@@ -0,0 +1,73 @@
+from unittest.mock import MagicMock
+
+from src.response_cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_response_from_cache() -> None:
+    """Ответ строится один раз на ключ, до истечения ttl"""
+    clock = FakeClock()
+    cache = ResponseCache(max_size=10, ttl=60, clock=clock)
+    build = MagicMock(return_value="{}")
+
+    assert cache.get_or_build(("2024-03-22", 1), build) == "{}"
+    assert cache.get_or_build(("2024-03-22", 1), build) == "{}"
+    assert build.call_count == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    clock.now += 60
+    cache.get_or_build(("2024-03-22", 1), build)
+    assert build.call_count == 2
+
+
+def test_expired_responses_removed() -> None:
+    """Устаревшие ответы удаляются из кеша, а не только перестают отдаваться"""
+    clock = FakeClock()
+    cache = ResponseCache(max_size=10, ttl=60, clock=clock)
+    cache.put("a", "{}")
+    cache.put("b", "{}")
+
+    clock.now += 60
+    assert cache.get("a") is None
+    assert len(cache) == 1
+    cache.put("c", "{}")
+    assert len(cache) == 1
+
+
+def test_lru_eviction() -> None:
+    """При превышении размера вытесняется давно не использованный ответ"""
+    cache = ResponseCache(max_size=2, ttl=60)
+    cache.get_or_build("a", lambda: 1)
+    cache.get_or_build("b", lambda: 2)
+    cache.get_or_build("a", lambda: 1)
+    cache.get_or_build("c", lambda: 3)
+
+    assert len(cache) == 2
+    assert cache.get_or_build("a", lambda: -1) == 1
+    assert cache.get_or_build("b", lambda: -2) == -2
+
+
+def test_disabled_cache() -> None:
+    """При max_size=0 ответы не сохраняются"""
+    cache = ResponseCache(max_size=0)
+    build = MagicMock(return_value="{}")
+    cache.get_or_build("a", build)
+    cache.get_or_build("a", build)
+    assert build.call_count == 2
+    assert len(cache) == 0
+
+
+def test_get_and_put() -> None:
+    """Ответ можно сохранить и получить отдельно от построения"""
+    cache = ResponseCache(max_size=10, ttl=60)
+    assert cache.get("a") is None
+    cache.put("a", "{}")
+    assert cache.get("a") == "{}"
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from src.rollups import DailyRollups
+from src.schema import apply_schema, to_rubles
+from src.utils import cards_info_from_totals, get_cards_info, index_by_operation_date, select_period
+
+TRANSACTIONS = pd.DataFrame({
+    "Дата операции": ["28.02.2024 23:00:00", "01.03.2024 10:00:00", "05.03.2024 12:00:00", "05.03.2024 18:00:00",
+                      "15.03.2024 09:00:00", "15.03.2024 18:00:00", "20.03.2024 13:00:00"],
+    "Номер карты": ["*1111", "*1111", "*2222", "*1111", "*2222", "*1111", "*2222"],
+    "Сумма операции": [-700.0, -100.5, -500.0, 200.0, -50.25, -80.0, -900.0],
+    "Категория": ["Дом и ремонт", "Супермаркеты", "Дом и ремонт", "Пополнения", "Кафе", "Супермаркеты",
+                  "Дом и ремонт"],
+})
+
+
+@pytest.fixture(params=[False, True], ids=["rubles", "kopecks"])
+def transactions(request: pytest.FixtureRequest) -> pd.DataFrame:
+    indexed = index_by_operation_date(TRANSACTIONS)
+    return apply_schema(indexed) if request.param else indexed
+
+
+@pytest.mark.parametrize("start, end", [
+    (datetime(2024, 3, 1), datetime(2024, 3, 15, 12, 0)),
+    (datetime(2024, 2, 1), datetime(2024, 3, 31, 23, 59)),
+    (datetime(2024, 3, 5, 15, 0), datetime(2024, 3, 5, 20, 0)),
+    (datetime(2024, 3, 5, 15, 0), datetime(2024, 3, 20, 12, 0)),
+])
+def test_card_totals_match_raw(transactions: pd.DataFrame, start: datetime, end: datetime) -> None:
+    """Суммы по картам из корзин совпадают с расчетом по строкам"""
+    rollups = DailyRollups(transactions)
+    period = select_period(transactions, start, end)
+    expected = period[period["Сумма операции"] < 0].groupby("Номер карты", observed=True)["Сумма операции"].sum()
+
+    totals = rollups.card_totals(transactions, start, end)
+
+    assert totals.to_dict() == expected.to_dict()
+
+
+def test_category_totals(transactions: pd.DataFrame) -> None:
+    """Суммы и количество расходов по категориям за период"""
+    rollups = DailyRollups(transactions)
+    totals = rollups.category_totals(transactions, datetime(2024, 3, 1), datetime(2024, 3, 20))
+
+    assert totals.loc["Дом и ремонт", "Количество операций"] == 1
+    assert totals.loc["Супермаркеты", "Количество операций"] == 2
+    assert "Пополнения" not in totals.index
+    assert "Дом и ремонт" in rollups.category_totals(transactions, datetime(2024, 2, 1), datetime(2024, 3, 1)).index
+
+
+def test_append_incremental(transactions: pd.DataFrame) -> None:
+    """Корзины, накопленные частями, совпадают с корзинами по всей таблице"""
+    rollups = DailyRollups(transactions.iloc[:3])
+    rollups.append(transactions.iloc[3:])
+    full = DailyRollups(transactions)
+
+    pd.testing.assert_frame_equal(rollups.by_card, full.by_card)
+    pd.testing.assert_frame_equal(rollups.by_category, full.by_category)
+
+
+def test_empty_period(transactions: pd.DataFrame) -> None:
+    """Период без расходов дает пустой результат"""
+    rollups = DailyRollups(transactions)
+    assert rollups.card_totals(transactions, datetime(2023, 1, 1), datetime(2023, 2, 1)).empty
+    assert DailyRollups().card_totals(transactions.iloc[0:0], datetime(2024, 3, 1), datetime(2024, 3, 2)).empty
+
+
+def test_cards_info_from_rollups(transactions: pd.DataFrame) -> None:
+    """Главная страница по корзинам дает ту же информацию по картам"""
+    start, end = datetime(2024, 3, 1), datetime(2024, 3, 20, 12)
+    totals = DailyRollups(transactions).card_totals(transactions, start, end)
+    assert cards_info_from_totals(to_rubles(totals, totals)) == get_cards_info(select_period(transactions, start, end))
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.schema import amounts_in_kopecks, apply_schema, restore_amounts, to_rubles
+from src.services import filter_transfers_to_individuals
+from src.utils import get_cards_info, get_top_five_max_prices
+
+TRANSACTIONS = pd.DataFrame({
+    "Дата операции": ["01.03.2024 10:00:00", "05.03.2024 12:00:00", "10.03.2024 14:00:00"],
+    "Номер карты": ["*1111", "*2222", "*1111"],
+    "Статус": ["OK", "OK", "FAILED"],
+    "Сумма операции": [-160.89, -500.1, -0.01],
+    "Сумма платежа": [-160.89, -500.1, -0.01],
+    "Кэшбэк": [np.nan, 5.0, np.nan],
+    "Категория": ["Переводы", "Супермаркеты", "Переводы"],
+    "Описание": ["Иван С.", "Магнит", "Анна К."],
+    "MCC": [np.nan, 5411.0, np.nan],
+    "Бонусы (включая кэшбэк)": [0, 10, 0],
+})
+
+
+def test_apply_schema_types() -> None:
+    """Строковые колонки становятся category, суммы - целыми копейками, числа уменьшаются"""
+    compact = apply_schema(TRANSACTIONS)
+
+    assert compact["Категория"].dtype == "category"
+    assert compact["Номер карты"].dtype == "category"
+    assert compact["Дата операции"].dtype == object
+    assert compact["Сумма операции"].dtype == np.int32
+    assert list(compact["Сумма операции"]) == [-16089, -50010, -1]
+    assert compact["Кэшбэк"].dtype == "Int32"
+    assert compact["Бонусы (включая кэшбэк)"].dtype == np.int8
+    assert amounts_in_kopecks(compact)
+    assert not amounts_in_kopecks(TRANSACTIONS)
+
+
+def test_apply_schema_integer_amounts() -> None:
+    """Целые суммы - это рубли; уже переведенные в копейки колонки повторно не умножаются"""
+    integer = TRANSACTIONS.assign(**{"Сумма операции": [-160, -500, 0]})
+    compact = apply_schema(integer)
+
+    assert list(compact["Сумма операции"]) == [-16000, -50000, 0]
+    assert list(to_rubles(compact["Сумма операции"], compact)) == [-160.0, -500.0, 0.0]
+    pd.testing.assert_frame_equal(apply_schema(compact), compact)
+    assert list(apply_schema(compact.assign(**{"Сумма операции": compact["Сумма операции"].astype(float)}))
+                ["Сумма операции"]) == [-16000, -50000, 0]
+
+
+def test_restore_amounts() -> None:
+    """Суммы восстанавливаются в рубли без потери точности, пропуски сохраняются"""
+    compact = apply_schema(TRANSACTIONS)
+    restored = restore_amounts(compact)
+
+    assert list(restored["Сумма операции"]) == [-160.89, -500.1, -0.01]
+    assert restored["Кэшбэк"].isna().tolist() == [True, False, True]
+    assert not amounts_in_kopecks(restored)
+    # Исходная компактная таблица не меняется, признак сохраняется на выборках
+    assert compact["Сумма операции"].dtype == np.int32
+    assert amounts_in_kopecks(compact[compact["Сумма операции"] < -100])
+    assert list(to_rubles(compact["Сумма платежа"], compact)) == [-160.89, -500.1, -0.01]
+
+
+def test_compact_schema_same_results() -> None:
+    """Расчеты по компактной таблице совпадают с расчетами по исходной"""
+    compact = apply_schema(TRANSACTIONS)
+
+    # Суммы в копейках складываются точно, без накопления ошибки float
+    assert get_cards_info(compact) == [{"last_digits": "1111", "total_spent": 160.9, "cashback": 1.61},
+                                       {"last_digits": "2222", "total_spent": 500.1, "cashback": 5.0}]
+    for compact_card, card in zip(get_cards_info(compact), get_cards_info(TRANSACTIONS)):
+        assert compact_card["total_spent"] == pytest.approx(card["total_spent"])
+    assert get_top_five_max_prices(compact) == get_top_five_max_prices(TRANSACTIONS)
+    assert list(filter_transfers_to_individuals(compact, "перевод").index) == [0, 2]
+
+
+def test_compact_schema_memory() -> None:
+    """Компактная таблица занимает заметно меньше памяти"""
+    big = pd.concat([TRANSACTIONS] * 1000, ignore_index=True)
+    assert apply_schema(big).memory_usage(deep=True).sum() * 3 < big.memory_usage(deep=True).sum()
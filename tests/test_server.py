@@ -0,0 +1,110 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator, Tuple
+from unittest.mock import MagicMock, patch
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import urlopen
+
+import pandas as pd
+import pytest
+
+from src.reports import flush_reports
+from src.server import ServerStats, TransactionServer
+from src.store import TransactionStore
+from src.utils import index_by_operation_date
+
+TRANSACTIONS = pd.DataFrame({
+    "Дата операции": ["01.11.2021 10:00:00", "05.11.2021 12:00:00", "20.11.2021 18:00:00", "22.12.2021 09:00:00"],
+    "Номер карты": ["*1111", "*2222", "*1111", "*1111"],
+    "Сумма операции": [-100.0, -500.0, -80.0, -300.0],
+    "Сумма платежа": [-100.0, -500.0, -80.0, -300.0],
+    "Категория": ["Переводы", "Супермаркеты", "Супермаркеты", "Переводы"],
+    "Описание": ["Иван С.", "Магнит", "Пятерочка", "Мария К."],
+})
+
+
+@pytest.fixture
+def server(tmp_path: Path) -> Iterator[Tuple[TransactionServer, MagicMock]]:
+    """Сервер на свободном порту с транзакциями в памяти и заглушками котировок"""
+    loader = MagicMock(return_value=index_by_operation_date(TRANSACTIONS))
+    with patch("src.server.get_currency_rates", return_value=[]), \
+            patch("src.server.get_stock_prices", return_value=[]), \
+            patch("src.views.get_currency_rates", return_value=[{"currency": "USD", "rate": 73.21}]), \
+            patch("src.views.get_stock_prices", return_value=[]), \
+            patch("src.reports.PATH_DATA", str(tmp_path)):
+        http_server = TransactionServer(("127.0.0.1", 0), "operations.xlsx", TransactionStore(loader=loader))
+        http_server.warm_up()
+        thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+        thread.start()
+        yield http_server, loader
+        http_server.shutdown()
+        http_server.server_close()
+
+
+def fetch(http_server: TransactionServer, path: str) -> Tuple[int, Any]:
+    url = f"http://127.0.0.1:{http_server.server_port}{path}"
+    try:
+        with urlopen(url) as response:
+            return response.status, json.loads(response.read().decode("utf-8"))
+    except HTTPError as error:
+        return error.code, json.loads(error.read().decode("utf-8"))
+
+
+def test_endpoints(server: Tuple[TransactionServer, MagicMock], tmp_path: Path) -> None:
+    """Главная страница, переводы и отчет отдаются по данным, загруженным при запуске; отчет не пишется в файл"""
+    http_server, loader = server
+
+    status, main_page = fetch(http_server, "/main?date=" + quote("2021-11-25 12:00:00"))
+    assert status == 200
+    assert main_page["currency_rates"] == [{"currency": "USD", "rate": 73.21}]
+    assert {card["last_digits"] for card in main_page["cards"]} == {"1111", "2222"}
+
+    status, transfers = fetch(http_server, "/transfers?keyword=" + quote("Переводы"))
+    assert status == 200
+    assert [item["Описание"] for item in transfers] == ["Мария К.", "Иван С."]
+
+    status, report = fetch(http_server, "/report?category=" + quote("Супермаркеты") + "&date=2021-11-25")
+    assert status == 200
+    assert [item["Описание"] for item in report] == ["Пятерочка", "Магнит"]
+    flush_reports()
+    assert list(tmp_path.iterdir()) == []
+
+    loader.assert_called_once_with("operations.xlsx")
+
+
+def test_bad_requests(server: Tuple[TransactionServer, MagicMock]) -> None:
+    """Ошибки в параметрах возвращают 400, неизвестный адрес - 404"""
+    http_server, _ = server
+    assert fetch(http_server, "/main?date=25.11.2021")[0] == 400
+    assert fetch(http_server, "/transfers")[1] == {"error": "Не указан параметр keyword"}
+    assert fetch(http_server, "/unknown")[0] == 404
+
+
+def test_concurrent_requests_and_stats(server: Tuple[TransactionServer, MagicMock]) -> None:
+    """Одновременные запросы обрабатываются и попадают в статистику времени ответа"""
+    http_server, _ = server
+    path = "/transfers?keyword=" + quote("Переводы")
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: fetch(http_server, path), range(20)))
+    assert {status for status, _ in results} == {200}
+
+    status, stats = fetch(http_server, "/stats")
+    assert status == 200
+    assert stats["load_seconds"] is not None
+    assert stats["endpoints"]["/transfers"]["requests"] == 20
+    assert stats["endpoints"]["/transfers"]["p95_ms"] >= stats["endpoints"]["/transfers"]["p50_ms"]
+
+
+def test_stats_percentiles() -> None:
+    """Перцентили считаются по последним window запросам"""
+    stats = ServerStats(window=100)
+    for ms in range(1, 201):
+        stats.record("/main", ms / 1000, 200)
+    stats.record("/main", 0.001, 500)
+
+    result = stats.to_dict()["endpoints"]["/main"]
+    assert (result["requests"], result["errors"], result["max_ms"]) == (201, 1, 200.0)
+    assert result["p50_ms"] == 151.0
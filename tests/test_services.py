@@ -1,9 +1,15 @@
+import io
 import json
+from pathlib import Path
 from typing import Any, Dict, Hashable, List
+from unittest.mock import patch
 
+import pandas as pd
 import pytest
 
-from src.services import get_search_for_transfers_to_individuals
+from src.services import (filter_transfers_to_individuals, get_search_for_transfers_to_individuals,
+                          write_search_for_transfers_to_individuals)
+from src.utils import get_cards, get_records
 
 
 @pytest.fixture
@@ -39,3 +45,68 @@ def test_invalid_name_format() -> None:
     }]
     result = get_search_for_transfers_to_individuals(transaction, "Перевод")
     assert json.loads(result) == []
+
+
+def test_dataframe_input(sample_transactions: List[Dict[Hashable, Any]]) -> None:
+    """DataFrame обрабатывается напрямую и дает тот же результат, что и список словарей"""
+    transactions_df = pd.DataFrame(sample_transactions)
+    result = get_search_for_transfers_to_individuals(transactions_df, "Перевод")
+    assert result == get_search_for_transfers_to_individuals(sample_transactions, "Перевод")
+
+
+def test_filter_transfers_to_individuals() -> None:
+    """Векторизованный отбор: категория без учета регистра, обязательное 'Имя Ф.' в описании"""
+    transactions_df = pd.DataFrame({
+        "Категория": ["Переводы", "ПЕРЕВОДЫ", "Переводы", "Супермаркеты", None],
+        "Описание": ["Валерий А.", "Сергей З.", "Перевод между счетами", "Иван С.", "Анна К."],
+        "Сумма операции": [-800, -100, -500, -300, -50],
+    })
+    result = filter_transfers_to_individuals(transactions_df, "перевод")
+    assert list(result["Сумма операции"]) == [-800, -100]
+
+
+def test_filter_transfers_to_individuals_empty() -> None:
+    """Пустая таблица и таблица без нужных колонок дают пустой результат"""
+    assert filter_transfers_to_individuals(pd.DataFrame(), "Перевод").empty
+    assert get_search_for_transfers_to_individuals([], "Перевод") == "[]"
+
+
+def test_write_search_for_transfers_to_individuals(sample_transactions: List[Dict[Hashable, Any]]) -> None:
+    """Потоковая запись дает тот же JSON, что и строковый вариант"""
+    transactions_df = pd.DataFrame(sample_transactions)
+    buffer = io.StringIO()
+
+    count = write_search_for_transfers_to_individuals(transactions_df, "Перевод", buffer)
+
+    assert count == 2
+    assert buffer.getvalue() == get_search_for_transfers_to_individuals(transactions_df, "Перевод")
+
+
+def test_debug_payload_not_serialized_twice(sample_transactions: List[Dict[Hashable, Any]]) -> None:
+    """Результат сериализуется один раз, в лог DEBUG передается готовая строка"""
+    with patch("src.services.json.dumps", wraps=json.dumps) as mock_dumps, \
+            patch("src.services.logger") as mock_logger:
+        result = get_search_for_transfers_to_individuals(sample_transactions, "Перевод")
+    assert mock_dumps.call_count == 1
+    mock_logger.debug.assert_any_call("Список отфильтрованных транзакций %s", result)
+
+
+def test_records_from_get_cards(tmp_path: Path) -> None:
+    """Записи таблицы get_cards (суммы хранятся в копейках) выводятся в рублях и в порядке выгрузки"""
+    path = tmp_path / "operations.xlsx"
+    pd.DataFrame({
+        "Дата операции": ["22.12.2021 09:00:00", "05.11.2021 12:00:00", "01.11.2021 10:00:00"],
+        "Номер карты": ["*1111", "*2222", "*1111"],
+        "Сумма операции": [-4350.0, -500.5, -100.0],
+        "Сумма платежа": [-4350.0, -500.5, -100.0],
+        "Категория": ["Переводы", "Переводы", "Переводы"],
+        "Описание": ["Мария К.", "Магнит", "Иван С."],
+    }).to_excel(path, index=False)
+    transactions = get_cards(str(path), use_cache=False)
+
+    from_records = json.loads(get_search_for_transfers_to_individuals(get_records(transactions), "Перевод"))
+    from_frame = json.loads(get_search_for_transfers_to_individuals(transactions, "Перевод"))
+
+    assert [item["Сумма операции"] for item in from_records] == [-4350.0, -100.0]
+    assert [item["Описание"] for item in from_records] == ["Мария К.", "Иван С."]
+    assert from_records == from_frame
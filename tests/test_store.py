@@ -0,0 +1,162 @@
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+from src.schema import apply_schema
+from src.store import TransactionStore
+from src.utils import index_by_operation_date
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({"Категория": ["Еда"] * rows, "Сумма операции": [-100.0] * rows})
+
+
+def test_store_loads_file_once() -> None:
+    """Повторные обращения к одному файлу не вызывают повторную загрузку и возвращают тот же объект"""
+    loader = MagicMock(return_value=make_frame(3))
+    store = TransactionStore(loader=loader)
+
+    first = store.get("operations.xlsx")
+    second = store.get("operations.xlsx")
+
+    loader.assert_called_once_with("operations.xlsx")
+    assert first is second
+
+
+def test_store_invalidate() -> None:
+    """После сброса файл загружается заново"""
+    loader = MagicMock(side_effect=lambda path: make_frame(3))
+    store = TransactionStore(loader=loader)
+
+    store.get("a.xlsx")
+    store.get("b.xlsx")
+    store.invalidate("a.xlsx")
+    store.get("a.xlsx")
+    store.get("b.xlsx")
+    assert loader.call_count == 3
+
+    store.invalidate()
+    assert store.memory_usage == 0
+
+
+def test_store_memory_budget() -> None:
+    """При превышении лимита вытесняется давно не использованный файл"""
+    frame_size = int(make_frame(100).memory_usage(deep=True).sum())
+    loader = MagicMock(side_effect=lambda path: make_frame(100))
+    store = TransactionStore(max_bytes=frame_size * 2, loader=loader)
+
+    store.get("a.xlsx")
+    store.get("b.xlsx")
+    store.get("a.xlsx")     # "a" становится последним использованным
+    store.get("c.xlsx")     # вытесняется "b"
+    assert store.memory_usage <= frame_size * 2
+
+    store.get("a.xlsx")
+    assert loader.call_count == 3
+    store.get("b.xlsx")
+    assert loader.call_count == 4
+
+
+def test_store_frame_larger_than_budget() -> None:
+    """Таблица больше лимита возвращается, но не сохраняется в памяти"""
+    loader = MagicMock(side_effect=lambda path: make_frame(100))
+    store = TransactionStore(max_bytes=10, loader=loader)
+
+    assert len(store.get("big.xlsx")) == 100
+    assert store.memory_usage == 0
+    store.get("big.xlsx")
+    assert loader.call_count == 2
+
+
+def test_store_append_updates_rollups() -> None:
+    """Новые транзакции добавляются к загруженным, корзины обновляются без полной перестройки"""
+    loaded = apply_schema(index_by_operation_date(pd.DataFrame({
+        "Дата операции": ["01.03.2024 10:00:00", "05.03.2024 12:00:00"],
+        "Номер карты": ["*1111", "*2222"],
+        "Сумма операции": [-100.5, -200.0],
+        "Категория": ["Еда", "Такси"],
+    })))
+    store = TransactionStore(loader=MagicMock(return_value=loaded))
+    rollups = store.rollups("operations.xlsx")
+
+    new_transactions = pd.DataFrame({
+        "Дата операции": ["03.03.2024 11:00:00", "06.03.2024 09:00:00"],
+        "Номер карты": ["*3333", "*1111"],
+        "Сумма операции": [-50.25, -10.0],
+        "Категория": ["Кафе", "Еда"],
+    })
+    with patch.object(rollups, "append", wraps=rollups.append) as mock_append:
+        combined = store.append("operations.xlsx", new_transactions)
+
+    assert store.get("operations.xlsx") is combined
+    assert list(combined["Номер карты"]) == ["*1111", "*3333", "*2222", "*1111"]
+    assert combined["Номер карты"].dtype == "category"
+    assert len(mock_append.call_args[0][0]) == 2
+    totals = rollups.card_totals(combined, datetime(2024, 3, 1), datetime(2024, 3, 31))
+    assert totals.to_dict() == {"*1111": -11050, "*2222": -20000, "*3333": -5025}
+
+
+def test_store_append_missing_amount_column() -> None:
+    """Если в новых строках нет одной из денежных колонок, загруженные суммы не переводятся в копейки повторно"""
+    loaded = apply_schema(index_by_operation_date(pd.DataFrame({
+        "Дата операции": ["01.03.2024 10:00:00"],
+        "Номер карты": ["*1111"],
+        "Сумма операции": [-10.5],
+        "Сумма платежа": [-10.5],
+        "Категория": ["Еда"],
+    })))
+    store = TransactionStore(loader=MagicMock(return_value=loaded))
+
+    combined = store.append("operations.xlsx", pd.DataFrame({
+        "Дата операции": ["02.03.2024 11:00:00"],
+        "Номер карты": ["*1111"],
+        "Сумма операции": [-20.0],
+        "Категория": ["Кафе"],
+    }))
+
+    assert list(combined["Сумма операции"]) == [-1050, -2000]
+    assert combined["Сумма платежа"].tolist()[0] == -1050
+    assert combined["Сумма платежа"].isna().tolist() == [False, True]
+
+
+def test_store_eviction_drops_rollups() -> None:
+    """Корзины вытесняются вместе с таблицей и учитываются в лимите памяти"""
+    loaded = index_by_operation_date(pd.DataFrame({
+        "Дата операции": ["01.03.2024 10:00:00", "05.03.2024 12:00:00"],
+        "Номер карты": ["*1111", "*1111"],
+        "Сумма операции": [-100.0, -50.0],
+        "Категория": ["Еда", "Еда"],
+    }))
+    store = TransactionStore(loader=MagicMock(side_effect=lambda path: loaded.copy()))
+    store.rollups("a.xlsx")
+    assert store.memory_usage > int(loaded.memory_usage(deep=True).sum())
+
+    store.max_bytes = store.memory_usage
+    store.rollups("b.xlsx")     # "a" вытесняется вместе с корзинами
+    assert store.memory_usage <= store.max_bytes
+    assert store._rollups.keys() == {"b.xlsx"}
+
+
+def test_store_keeps_appended_rows() -> None:
+    """Таблица с добавленными строками не вытесняется: после повторного get суммы совпадают с корзинами"""
+    loaded = index_by_operation_date(pd.DataFrame({
+        "Дата операции": ["01.03.2024 10:00:00"],
+        "Номер карты": ["*1111"],
+        "Сумма операции": [-100.0],
+        "Категория": ["Еда"],
+    }))
+    loader = MagicMock(side_effect=lambda path: loaded.copy())
+    store = TransactionStore(loader=loader)
+    rollups = store.rollups("a.xlsx")
+    store.append("a.xlsx", pd.DataFrame({"Дата операции": ["02.03.2024 10:00:00"], "Номер карты": ["*1111"],
+                                         "Сумма операции": [-50.0], "Категория": ["Еда"]}))
+
+    store.max_bytes = 0
+    store.get("b.xlsx")
+    transactions = store.get("a.xlsx")
+    assert loader.call_count == 2
+    assert transactions["Сумма операции"].sum() == -150.0
+    totals = rollups.card_totals(transactions, datetime(2024, 3, 1), datetime(2024, 3, 31))
+    assert totals.to_dict() == {"*1111": -150.0}
+    assert store.rollups("a.xlsx") is rollups
@@ -0,0 +1,82 @@
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from config import PATH_XLSX
+from src.reports import flush_reports, select_category_spending
+from src.streaming import iter_transaction_chunks, stream_main_page_aggregates, stream_spending_by_category
+from src.utils import get_cards, get_cards_info, get_top_five_max_prices, index_by_operation_date, select_period
+
+TRANSACTIONS = pd.DataFrame({
+    "Дата операции": ["01.03.2024 10:00:00", "05.03.2024 12:00:00", "10.03.2024 14:00:00", "12.03.2024 09:00:00",
+                      "15.03.2024 18:00:00", "28.02.2024 11:00:00", "20.03.2024 13:00:00", "02.01.2024 08:00:00"],
+    "Номер карты": ["*1111", "*2222", "*1111", "*3333", "*2222", "*1111", "*3333", "*2222"],
+    "Сумма операции": [-100.5, -500.0, -300.25, 200.0, -50.0, -700.0, -80.0, -900.0],
+    "Сумма платежа": [-100.5, -500.0, -300.25, 200.0, -50.0, -700.0, -80.0, -900.0],
+    "Категория": ["Супермаркеты", "Дом и ремонт", "Дом и ремонт", "Пополнения", "Кафе", "Дом и ремонт",
+                  "Супермаркеты", "Дом и ремонт"],
+    "Описание": ["Магнит", "Леруа", "Оби", "Пополнение", "Кофе", "Леруа", "Пятерочка", "Оби"],
+})
+
+
+@pytest.fixture(params=["xlsx", "csv"])
+def transactions_file(request: pytest.FixtureRequest, tmp_path: Path) -> str:
+    """Выгрузка транзакций в формате Excel или CSV"""
+    path = tmp_path / f"operations.{request.param}"
+    if request.param == "csv":
+        TRANSACTIONS.to_csv(path, index=False)
+    else:
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(list(TRANSACTIONS.columns))
+        for row in TRANSACTIONS.itertuples(index=False):
+            sheet.append(list(row))
+        workbook.save(path)
+    return str(path)
+
+
+def test_iter_transaction_chunks(transactions_file: str) -> None:
+    """Файл читается порциями фиксированного размера, все строки сохраняются"""
+    chunks = list(iter_transaction_chunks(transactions_file, chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 2]
+    assert list(chunks[0].columns) == list(TRANSACTIONS.columns)
+    assert list(pd.concat(chunks)["Сумма операции"]) == list(TRANSACTIONS["Сумма операции"])
+
+
+def test_stream_main_page_aggregates(transactions_file: str) -> None:
+    """Потоковый расчет совпадает с расчетом по таблице в памяти"""
+    period = select_period(index_by_operation_date(TRANSACTIONS),
+                           pd.Timestamp("2024-03-01"), pd.Timestamp("2024-03-20 23:59:59"))
+
+    result = stream_main_page_aggregates(transactions_file, "2024-03-20 23:59:59", chunk_size=3)
+
+    assert result["cards"] == get_cards_info(period)
+    assert result["top_transactions"] == get_top_five_max_prices(period)
+
+
+def test_stream_spending_by_category(transactions_file: str, tmp_path: Path) -> None:
+    """Потоковый отчет по категории совпадает с отчетом по таблице в памяти"""
+    with patch("src.reports.PATH_DATA", tmp_path / "reports"):
+        result = stream_spending_by_category(transactions_file, "Дом и ремонт", "2024-03-21", chunk_size=3)
+        flush_reports()
+
+    expected = select_category_spending(TRANSACTIONS, "Дом и ремонт", "2024-03-21")
+    assert list(result["Сумма операции"]) == list(expected["Сумма операции"])
+    assert list(result["Дата операции"]) == list(expected["Дата операции"])
+    assert (tmp_path / "reports" / "report_file.json").exists()
+
+
+@pytest.mark.parametrize("date", ["2018-07-31 23:59:59", "2020-05-20 23:59:59"])
+def test_stream_main_page_aggregates_operations_file(date: str) -> None:
+    """На выгрузке банка потоковый расчет совпадает с расчетом по get_cards, включая копейки и равные суммы в топе"""
+    end_period = datetime.strptime(date, "%Y-%m-%d %H:%M:%S")
+    start_period = end_period.replace(day=1, hour=0, minute=0, second=0)
+    period = select_period(get_cards(PATH_XLSX, use_cache=False), start_period, end_period)
+
+    result = stream_main_page_aggregates(PATH_XLSX, date, chunk_size=1000)
+
+    assert result == {"cards": get_cards_info(period), "top_transactions": get_top_five_max_prices(period)}
@@ -1,12 +1,23 @@
+import io
 import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
 from unittest.mock import Mock, mock_open, patch
 
 import pandas as pd
 import pytest
+import requests
 from _pytest.logging import LogCaptureFixture
 
-from src.utils import (get_api_currency, get_api_stocks, get_cards, get_cards_info, get_currency_rates, get_greetings,
-                       get_stock_prices, get_top_five_max_prices, get_user_settings)
+from src.quote_cache import QuoteCache
+from src.utils import (LazyJson, get_api_currency, get_api_stocks, get_cards, get_cards_from_files, get_cards_info,
+                       get_currency_rates, get_greetings, get_stock_prices, get_top_five_max_prices,
+                       get_top_transactions, get_top_transactions_by_group, get_user_settings, in_export_order,
+                       index_by_operation_date, iter_records, select_period, select_top_k, write_json_records)
+from tests.conftest import ApiStub
 
 
 @pytest.mark.parametrize("time_str, expected", [
@@ -45,13 +56,13 @@ def test_get_greetings_logging(
         assert expected_log in caplog.text
 
 
-def test_get_cards() -> None:
+def test_get_cards(tmp_path: Path) -> None:
     """Тестирование функции get_cards"""
     test_data = pd.DataFrame({
         'card_id': [101, 102],
         'card_name': ['Gold', 'Platinum']
     })
-    with patch("pandas.read_excel") as mock_read_excel:
+    with patch("pandas.read_excel") as mock_read_excel, patch("src.utils.CACHE_DIR", str(tmp_path)):
         mock_read_excel.return_value = test_data
 
         result = get_cards()
@@ -61,6 +72,108 @@ def test_get_cards() -> None:
     assert list(result.columns) == ['card_id', 'card_name'], "Неверные колонки"
 
 
+def test_get_cards_uses_cache(tmp_path: Path) -> None:
+    """Повторная загрузка неизмененного файла берется из кеша, изменение файла сбрасывает кеш"""
+    source = tmp_path / "operations.xlsx"
+    source.write_bytes(b"version 1")
+    test_data = pd.DataFrame({"Категория": ["Еда", "Такси"], "Сумма операции": [-100.5, -200.0]})
+    with patch("pandas.read_excel", return_value=test_data) as mock_read_excel, \
+            patch("src.utils.CACHE_DIR", str(tmp_path / "cache")):
+        first = get_cards(str(source))
+        second = get_cards(str(source))
+        assert mock_read_excel.call_count == 1
+        pd.testing.assert_frame_equal(first, second)
+
+        # mtime изменился, содержимое то же - кеш остается актуальным
+        stat = source.stat()
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        get_cards(str(source))
+        assert mock_read_excel.call_count == 1
+
+        # содержимое изменилось - файл перечитывается
+        source.write_bytes(b"version 2")
+        get_cards(str(source))
+        assert mock_read_excel.call_count == 2
+
+
+def test_get_cards_from_files(tmp_path: Path) -> None:
+    """Несколько выгрузок разбираются в пуле процессов и объединяются в одну таблицу с общей схемой"""
+    january = pd.DataFrame({
+        "Дата операции": ["10.01.2024 10:00:00", "02.01.2024 09:00:00"],
+        "Номер карты": ["*1111", "*1111"],
+        "Сумма операции": [-100.5, -20.0],
+        "Категория": ["Еда", "Такси"],
+    })
+    february = pd.DataFrame({
+        "Дата операции": ["01.02.2024 12:00:00", "05.01.2024 18:00:00"],
+        "Номер карты": ["*2222", "*2222"],
+        "Сумма операции": [-300.0, -7.25],
+        "Категория": ["Кафе", "Еда"],
+        "Кэшбэк": [3.0, None],
+    })
+    paths = [str(tmp_path / "january.xlsx"), str(tmp_path / "february.xlsx")]
+    january.to_excel(paths[0], index=False)
+    february.to_excel(paths[1], index=False)
+
+    result = get_cards_from_files(paths, max_workers=2, use_cache=False)
+
+    assert list(result["Дата операции"]) == ["02.01.2024 09:00:00", "05.01.2024 18:00:00",
+                                             "10.01.2024 10:00:00", "01.02.2024 12:00:00"]
+    assert isinstance(result["Категория"].dtype, pd.CategoricalDtype)
+    assert sorted(result["Категория"].cat.categories) == ["Еда", "Кафе", "Такси"]
+    assert list(result["Сумма операции"]) == [-2000, -725, -10050, -30000]
+    assert list(result["Кэшбэк"].astype("Float64").fillna(-1)) == [-1, -1, -1, 300]
+    assert result.attrs["amounts_in_kopecks"]
+    pd.testing.assert_frame_equal(result, get_cards_from_files(paths, max_workers=1, use_cache=False))
+
+
+def test_get_cards_integer_amounts(tmp_path: Path) -> None:
+    """Целые суммы в рублях (pd.read_excel читает их как int64) тоже переводятся в копейки"""
+    path = tmp_path / "operations.xlsx"
+    pd.DataFrame({
+        "Дата операции": ["01.03.2024 10:00:00", "05.03.2024 12:00:00"],
+        "Номер карты": ["*1111", "*1111"],
+        "Сумма операции": [-500, -1500],
+        "Сумма платежа": [-500, -1500],
+        "Кэшбэк": [5, 15],
+        "Категория": ["Еда", "Такси"],
+        "Описание": ["Магнит", "Яндекс"],
+    }).to_excel(path, index=False)
+
+    result = get_cards(str(path), use_cache=False)
+
+    assert list(result["Сумма операции"]) == [-50000, -150000]
+    assert get_cards_info(result) == [{"last_digits": "1111", "total_spent": 2000.0, "cashback": 20.0}]
+    assert [item["amount"] for item in get_top_five_max_prices(result)] == [-500.0, -1500.0]
+
+
+def test_get_cards_csv(tmp_path: Path) -> None:
+    """CSV-выгрузка загружается так же, как Excel"""
+    transactions = pd.DataFrame({
+        "Дата операции": ["05.03.2024 12:00:00", "01.03.2024 10:00:00"],
+        "Номер карты": ["*1111", "*2222"],
+        "Сумма операции": [-100.5, -20.0],
+        "Категория": ["Еда", "Такси"],
+    })
+    transactions.to_csv(tmp_path / "operations.csv", index=False)
+    transactions.to_excel(tmp_path / "operations.xlsx", index=False)
+
+    pd.testing.assert_frame_equal(get_cards(str(tmp_path / "operations.csv"), use_cache=False),
+                                  get_cards(str(tmp_path / "operations.xlsx"), use_cache=False))
+
+
+def test_get_cards_without_cache(tmp_path: Path) -> None:
+    """При use_cache=False файл читается каждый раз и кеш не создается"""
+    source = tmp_path / "operations.xlsx"
+    source.write_bytes(b"data")
+    with patch("pandas.read_excel", return_value=pd.DataFrame({"a": [1]})) as mock_read_excel, \
+            patch("src.utils.CACHE_DIR", str(tmp_path / "cache")):
+        get_cards(str(source), use_cache=False)
+        get_cards(str(source), use_cache=False)
+    assert mock_read_excel.call_count == 2
+    assert not (tmp_path / "cache").exists()
+
+
 def test_get_cards_info() -> None:
     """Проверка основной логики функции"""
     test_data = pd.DataFrame({
@@ -117,27 +230,42 @@ def test_get_user_settings() -> None:
         mock_file.assert_called_once_with(test_path, "r", encoding="utf-8")
 
         # Проверяем что логировалось
-        mock_logger.info.assert_any_call(f"Начало загрузки пользовательских настроек из файла: {test_path}")
+        mock_logger.info.assert_any_call("Начало загрузки пользовательских настроек из файла: %s", test_path)
         mock_logger.info.assert_any_call("Настройки успешно загружены.")
 
         # Проверяем что вернулись правильные данные
         assert result == test_data
 
 
+def test_get_user_settings_cached(tmp_path: Path) -> None:
+    """Настройки читаются из файла повторно только после его изменения"""
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps({"user_currencies": ["USD"], "user_stocks": []}), encoding="utf-8")
+    with patch("builtins.open", wraps=open) as spy_open:
+        assert get_user_settings(str(path))["user_currencies"] == ["USD"]
+        assert get_user_settings(str(path))["user_currencies"] == ["USD"]
+        assert spy_open.call_count == 1
+
+        path.write_text(json.dumps({"user_currencies": ["USD", "EUR"], "user_stocks": []}), encoding="utf-8")
+        assert get_user_settings(str(path))["user_currencies"] == ["USD", "EUR"]
+        assert spy_open.call_count == 2
+
+
 def test_get_currency_rates_success() -> None:
     """Тест успешного получения курсов валют"""
     # 1. Подготовка тестовых данных
     test_currencies = ["USD", "EUR"]
     test_rates = {"USD": 75.5, "EUR": 80.1}
     # 2. Мокируем внешние зависимости
-    with (patch("src.utils.get_api_currency") as mock_api,
+    with (patch("src.utils.get_api_currencies") as mock_api,
           patch("src.utils.logger") as mock_logger):
 
-        # Настраиваем мок API для возврата тестовых курсов
-        mock_api.side_effect = lambda curr: test_rates[curr]
+        # Настраиваем мок API для возврата тестовых курсов (один запрос на все валюты)
+        mock_api.return_value = test_rates
         # 3. Вызываем тестируемую функцию
         result = get_currency_rates(test_currencies)
         # 4. Проверяем результаты
+        mock_api.assert_called_once_with(test_currencies)
         assert len(result) == 2
         assert result[0]["currency"] == "USD"
         assert result[0]["rate"] == 75.5
@@ -145,8 +273,8 @@ def test_get_currency_rates_success() -> None:
         assert result[1]["rate"] == 80.1
 
         # Проверяем логирование
-        mock_logger.info.assert_any_call("Начало обработки запроса курса валют. Количество валют: 2")
-        mock_logger.info.assert_any_call("Обработка завершена. Успешно получено курсов: 2")
+        mock_logger.info.assert_any_call("Начало обработки запроса курса валют. Количество валют: %s", 2)
+        mock_logger.info.assert_any_call("Обработка завершена. Успешно получено курсов: %s", 2)
 
 
 def test_get_stock_prices() -> None:
@@ -155,21 +283,22 @@ def test_get_stock_prices() -> None:
     test_stock = ["AAPL", "GOOGL"]
     test_prices = {"AAPL": {"price": 150.25}, "GOOGL": {"price": 2800.50}}
     #  2. Мокируем внешние зависимости
-    with patch("src.utils.get_api_stocks") as mock_api, \
+    with patch("src.utils.get_api_stocks_prices") as mock_api, \
             patch("src.utils.logger") as mock_logger:
-        # Настраиваем мок API
-        mock_api.side_effect = lambda stock: test_prices[stock]
+        # Настраиваем мок API (один запрос на все акции)
+        mock_api.return_value = test_prices
         # 3. Вызываем тестируемую функцию
         result = get_stock_prices(test_stock)
         # 4. Проверяем результаты
+        mock_api.assert_called_once_with(test_stock)
         assert len(result) == 2
         assert result[0]["stock"] == "AAPL"
         assert result[0]["price"] == 150.25
         assert result[1]["stock"] == "GOOGL"
         assert result[1]["price"] == 2800.50
         # Проверяем логирование
-        mock_logger.info.assert_any_call("Начало обработки запроса акций. Количество акций: 2")
-        mock_logger.info.assert_any_call("Завершение обработки. Успешно обработано 2/2 акций")
+        mock_logger.info.assert_any_call("Начало обработки запроса акций. Количество акций: %s", 2)
+        mock_logger.info.assert_any_call("Завершение обработки. Успешно обработано %s/%s акций", 2, 2)
 
 
 def test_get_api_currency() -> None:
@@ -181,8 +310,9 @@ def test_get_api_currency() -> None:
     mock_responce = Mock()
     mock_responce.json.return_value = test_data
 
-    with (patch("requests.get", return_value=mock_responce),
+    with (patch("src.utils.get_http_session") as mock_session,
           patch.dict('os.environ', {'API_KEY_FOR_CURRENCY': 'test-key'})):
+        mock_session.return_value.get.return_value = mock_responce
 
         result = get_api_currency("USD")
 
@@ -198,9 +328,198 @@ def test_get_api_stocks() -> None:
     mock_responce = Mock()
     mock_responce.json.return_value = test_data
 
-    with (patch("requests.get", return_value=mock_responce),
+    with (patch("src.utils.get_http_session") as mock_session,
           patch.dict('os.environ', {'API_KEY_FOR_CURRENCY': 'test-key'})):
+        mock_session.return_value.get.return_value = mock_responce
 
         result = get_api_stocks("AAPL")
 
         assert result == test_data
+
+
+def test_index_by_operation_date() -> None:
+    """Даты парсятся один раз в отсортированный индекс, строковая колонка не меняется"""
+    test_data = pd.DataFrame({
+        "Дата операции": ["15.03.2024 12:00:00", "01.03.2024 10:00:00", "20.03.2024 14:00:00"],
+        "Сумма операции": [-500, -100, -300],
+    })
+    result = index_by_operation_date(test_data)
+
+    assert isinstance(result.index, pd.DatetimeIndex)
+    assert result.index.is_monotonic_increasing
+    assert list(result["Дата операции"]) == ["01.03.2024 10:00:00", "15.03.2024 12:00:00", "20.03.2024 14:00:00"]
+    assert list(result["Сумма операции"]) == [-100, -500, -300]
+    # Индекс без имени: колонку "Дата операции" можно сортировать и группировать
+    assert result.index.name is None
+    assert len(result.sort_values("Дата операции")) == 3
+    assert len(result.groupby("Дата операции").size()) == 3
+
+
+def test_in_export_order() -> None:
+    """Порядок выгрузки банка (от новых к старым) восстанавливается, в том числе для одинакового времени"""
+    exported = pd.DataFrame({
+        "Дата операции": ["20.03.2024 14:00:00", "15.03.2024 12:00:00", "15.03.2024 12:00:00",
+                          "01.03.2024 10:00:00"],
+        "Описание": ["a", "b", "c", "d"],
+    })
+    indexed = index_by_operation_date(exported)
+
+    assert indexed.index.is_monotonic_increasing
+    assert list(in_export_order(indexed)["Описание"]) == ["a", "b", "c", "d"]
+    assert in_export_order(exported) is exported
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_select_period(indexed: bool) -> None:
+    """Выборка за период одинакова для индексированной и исходной таблицы, границы включаются"""
+    test_data = pd.DataFrame({
+        "Дата операции": ["28.02.2024 23:59:59", "01.03.2024 00:00:00", "15.03.2024 12:00:00",
+                          "15.03.2024 12:00:01"],
+        "Сумма операции": [-1, -2, -3, -4],
+    })
+    if indexed:
+        test_data = index_by_operation_date(test_data)
+
+    result = select_period(test_data, datetime(2024, 3, 1), datetime(2024, 3, 15, 12))
+
+    assert list(result["Сумма операции"]) == [-2, -3]
+
+
+def test_get_currency_rates_stub_server(api_stub: ApiStub) -> None:
+    """Курсы всех валют запрашиваются у локальной заглушки API одним запросом"""
+    result = get_currency_rates(["USD", "EUR", "RUB"])
+    assert result == [{"currency": "USD", "rate": 75.5}, {"currency": "EUR", "rate": 80.1},
+                      {"currency": "RUB", "rate": 1.0}]
+    assert len(api_stub.requests) == 1
+
+
+def test_get_stock_prices_batched(api_stub: ApiStub) -> None:
+    """Курсы всех акций запрашиваются одним запросом"""
+    stocks = ["AAPL", "AMZN", "GOOGL", "MSFT", "TSLA"]
+    result = get_stock_prices(stocks)
+
+    assert [item["stock"] for item in result] == stocks
+    assert result[2]["price"] == 2800.5
+    assert len(api_stub.requests) == 1
+
+
+def test_get_stock_prices_batch_size(api_stub: ApiStub) -> None:
+    """Тикеры сверх STOCKS_BATCH_SIZE уходят в отдельные запросы, которые выполняются параллельно"""
+    api_stub.delay = 0.3
+    stocks = ["AAPL", "AMZN", "GOOGL", "MSFT", "TSLA"]
+    with patch("src.utils.STOCKS_BATCH_SIZE", 2):
+        start = time.perf_counter()
+        result = get_stock_prices(stocks)
+        elapsed = time.perf_counter() - start
+
+    assert [item["stock"] for item in result] == stocks
+    assert len(api_stub.requests) == 3
+    assert elapsed < 0.3 * 3
+
+
+def test_get_stock_prices_fetches_only_missing(api_stub: ApiStub) -> None:
+    """Частично закешированные котировки дозапрашиваются одним запросом"""
+    get_stock_prices(["AAPL"])
+    get_stock_prices(["AAPL", "AMZN", "TSLA"])
+    assert "AMZN%2CTSLA" in api_stub.requests[-1]
+    assert len(api_stub.requests) == 2
+
+
+def test_get_api_stocks_timeout(api_stub: ApiStub) -> None:
+    """Зависший запрос к API прерывается по таймауту"""
+    api_stub.delay = 1
+    with patch("src.utils.API_TIMEOUT", 0.2), pytest.raises(requests.Timeout):
+        get_api_stocks("AAPL")
+
+
+def test_quotes_cached_between_calls(api_stub: ApiStub) -> None:
+    """Повторный запрос котировок в пределах TTL не обращается к API"""
+    get_currency_rates(["USD"])
+    get_stock_prices(["AAPL"])
+    get_currency_rates(["USD"])
+    get_stock_prices(["AAPL"])
+    assert len(api_stub.requests) == 2
+
+
+def test_quotes_last_known_good(api_stub: ApiStub, empty_quote_cache: QuoteCache) -> None:
+    """При ошибке провайдера используется последнее успешное значение"""
+    get_currency_rates(["USD"])
+    empty_quote_cache.ttl = empty_quote_cache.stale_ttl = 0
+    api_stub.fail = True
+
+    assert get_currency_rates(["USD"]) == [{"currency": "USD", "rate": 75.5}]
+    with pytest.raises(requests.HTTPError):
+        get_currency_rates(["EUR"])
+
+
+@pytest.mark.parametrize("indent", [2, None])
+def test_write_json_records(indent: Optional[int]) -> None:
+    """Потоковая запись массива записей совпадает с json.dumps"""
+    records = [{"Описание": "Иван С.", "Сумма": -100.5, "Теги": ["a", {"b": 1}]}, {"Описание": "Магнит"}]
+    for data in ([], records):
+        buffer = io.StringIO()
+        count = write_json_records(iter(data), buffer, indent=indent)
+        assert count == len(data)
+        assert buffer.getvalue() == json.dumps(data, indent=indent, ensure_ascii=False)
+
+
+def test_iter_records() -> None:
+    """Записи DataFrame выдаются порциями, но в исходном порядке"""
+    test_data = pd.DataFrame({"a": range(5)})
+    assert list(iter_records(test_data, chunk_size=2)) == [{"a": i} for i in range(5)]
+
+
+def test_lazy_json() -> None:
+    """LazyJson сериализует данные только при форматировании"""
+    with patch("src.utils.json.dumps", return_value="{}") as mock_dumps:
+        lazy = LazyJson({"a": 1})
+        mock_dumps.assert_not_called()
+        assert str(lazy) == "{}"
+
+
+def test_select_top_k_stable_ties() -> None:
+    """Топ-k без полной сортировки: при равных суммах выше транзакция, которая раньше в выгрузке"""
+    test_data = pd.DataFrame({
+        "Сумма платежа": [100, 500, 300, 500, 300, 900],
+        "Описание": ["a", "b", "c", "d", "e", "f"],
+    })
+    result = select_top_k(test_data, k=4)
+    assert list(result["Описание"]) == ["f", "b", "d", "c"]
+
+    with patch.object(pd.DataFrame, "sort_values") as mock_sort:
+        get_top_five_max_prices(test_data, k=2)
+    mock_sort.assert_not_called()
+
+
+def test_select_top_k_ties_newest_first() -> None:
+    """При равных суммах выше более новая операция - и в выгрузке, и в таблице, проиндексированной по дате"""
+    export = pd.DataFrame({
+        "Дата операции": ["03.03.2024 10:00:00", "02.03.2024 10:00:00", "02.03.2024 10:00:00", "01.03.2024 10:00:00"],
+        "Сумма платежа": [-20.0, -20.0, -20.0, -20.0],
+        "Описание": ["a", "b", "c", "d"],
+    })
+    indexed = index_by_operation_date(export)
+
+    assert list(select_top_k(export, k=3)["Описание"]) == ["a", "b", "c"]
+    assert list(select_top_k(indexed, k=3)["Описание"]) == ["a", "b", "c"]
+    assert list(select_top_k(indexed, k=3, group_by="Сумма платежа")["Описание"]) == ["a", "b", "c"]
+
+
+def test_get_top_transactions_grouped() -> None:
+    """Топ-k внутри каждой группы (карты), индекс-даты с повторами не мешают выбору"""
+    test_data = index_by_operation_date(pd.DataFrame({
+        "Дата операции": ["01.03.2024 10:00:00"] * 3 + ["02.03.2024 10:00:00"] * 3,
+        "Номер карты": ["*1111", "*2222", "*1111", "*2222", "*1111", "*2222"],
+        "Сумма платежа": [-100.0, -50.0, -20.0, -70.0, -20.0, -10.0],
+        "Категория": ["Еда", "Такси", "Еда", "Кафе", "Еда", "Такси"],
+        "Описание": ["a", "b", "c", "d", "e", "f"],
+    }))
+
+    result = get_top_transactions_by_group(test_data, "Номер карты", k=2)
+
+    assert list(result) == ["*1111", "*2222"]
+    assert [item["description"] for item in result["*1111"]] == ["e", "c"]
+    assert [item["description"] for item in result["*2222"]] == ["f", "b"]
+    assert result["*2222"][0] == {"date": "02.03.2024 10:00:00", "amount": -10.0, "category": "Такси",
+                                  "description": "f"}
+    assert len(get_top_transactions(test_data, k=3)) == 3
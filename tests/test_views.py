@@ -1,11 +1,19 @@
+import asyncio
+import gc
+import io
 import json
+import weakref
+from datetime import datetime
 from typing import Any, Dict, Iterator, List, Union
 from unittest.mock import MagicMock, patch
 
 import pandas as pd
 import pytest
 
-from src.views import get_main_page_info
+from src.quote_cache import QuoteCache
+from src.response_cache import ResponseCache
+from src.views import (build_main_page_info, build_main_page_info_async, get_main_page_info, get_main_page_info_async,
+                       write_main_page_info)
 
 # Фиктивные данные для тестов
 MOCK_TRANSACTIONS = pd.DataFrame({
@@ -55,7 +63,7 @@ def test_date_parsing(mock_dependencies: MagicMock) -> None:
     # Проверяем что функция вернула результат
     assert result is not None
     mock_dependencies.info.assert_any_call(
-        "Преобразуем строку в объект datetime YYYY-MM-DD HH:MM:SS 2024-03-15 14:30:00"
+        "Преобразуем строку в объект datetime YYYY-MM-DD HH:MM:SS %s", datetime(2024, 3, 15, 14, 30)
     )
 
 
@@ -68,7 +76,7 @@ def test_invalid_date_format() -> None:
 def test_transaction_filtering(mock_dependencies: MagicMock) -> None:
     """Тест фильтрации транзакций по дате"""
     get_main_page_info("2024-03-22 00:00:00")
-    mock_dependencies.info.assert_any_call("Отфильтровано транзакций за период: 3")
+    mock_dependencies.info.assert_any_call("Отфильтровано транзакций за период: %s", 3)
 
 
 def test_json_structure(mock_dependencies: MagicMock) -> None:
@@ -88,10 +96,105 @@ def test_logging_sequence(mock_dependencies: MagicMock) -> None:
     get_main_page_info("2024-03-15 14:30:00")
 
     # Проверяем последовательность ключевых логов
-    log_calls: List[str] = [call[0][0] for call in mock_dependencies.info.call_args_list]
+    log_calls: List[str] = [call[0][0] % call[0][1:] for call in mock_dependencies.info.call_args_list]
     assert "Запуск формирования отчета для даты: 2024-03-15 14:30:00" in log_calls
     assert "Загрузка данных по картам и транзакциям" in log_calls
     assert "Всего транзакций загружено:" in log_calls[3]
     assert "Сформирован топ-5 транзакций." in log_calls
     assert "Загрузка финансовых данных" in log_calls
     assert "Отчет успешно сформирован" in log_calls[-1]
+
+
+def test_uses_passed_transactions(mock_dependencies: MagicMock) -> None:
+    """Переданные транзакции используются без повторной загрузки файла"""
+    with patch('src.views.get_cards') as mock_get_cards:
+        get_main_page_info("2024-03-22 00:00:00", MOCK_TRANSACTIONS)
+    mock_get_cards.assert_not_called()
+    mock_dependencies.info.assert_any_call("Отфильтровано транзакций за период: %s", 3)
+
+
+def test_write_main_page_info(mock_dependencies: MagicMock) -> None:
+    """Потоковая запись главной страницы совпадает со строковым ответом"""
+    buffer = io.StringIO()
+    write_main_page_info("2024-03-15 14:30:00", buffer)
+    assert buffer.getvalue() == get_main_page_info("2024-03-15 14:30:00")
+
+
+def test_cards_from_rollups(mock_dependencies: MagicMock) -> None:
+    """С дневными корзинами суммы по картам не пересчитываются по строкам"""
+    rollups = MagicMock()
+    rollups.card_totals.return_value = pd.Series({"*1111": -400.0})
+    with patch('src.views.get_cards_info') as mock_cards_info:
+        result = json.loads(get_main_page_info("2024-03-22 00:00:00", MOCK_TRANSACTIONS, rollups))
+    mock_cards_info.assert_not_called()
+    assert result["cards"] == [{"last_digits": "1111", "total_spent": 400.0, "cashback": 4.0}]
+
+
+def test_main_page_cached(mock_dependencies: MagicMock, empty_quote_cache: QuoteCache) -> None:
+    """Повторный запрос с той же датой отдается из кеша, пока не изменились данные и котировки"""
+    with patch('src.views.build_main_page_info', wraps=build_main_page_info) as mock_build:
+        first = get_main_page_info("2024-03-22 00:00:00", MOCK_TRANSACTIONS)
+        assert get_main_page_info("2024-03-22 00:00:00", MOCK_TRANSACTIONS) == first
+        assert mock_build.call_count == 1
+
+        get_main_page_info("2024-03-21 00:00:00", MOCK_TRANSACTIONS)
+        get_main_page_info("2024-03-22 00:00:00", MOCK_TRANSACTIONS.copy())
+        assert mock_build.call_count == 3
+
+        empty_quote_cache.set("currency:USD", 76.0)
+        get_main_page_info("2024-03-22 00:00:00", MOCK_TRANSACTIONS)
+        assert mock_build.call_count == 4
+
+
+def test_async_main_page(mock_dependencies: MagicMock, empty_main_page_cache: ResponseCache) -> None:
+    """Асинхронный вариант возвращает тот же ответ, что и синхронный"""
+    result = asyncio.run(get_main_page_info_async("2024-03-22 00:00:00", MOCK_TRANSACTIONS))
+    empty_main_page_cache.clear()
+    assert result == get_main_page_info("2024-03-22 00:00:00", MOCK_TRANSACTIONS)
+    assert json.loads(result)["currency_rates"] == MOCK_CURRENCY_RATES
+
+
+def test_async_main_page_builds_once(mock_dependencies: MagicMock) -> None:
+    """Одновременные запросы с одной датой ждут одного построения ответа"""
+    async def requests() -> List[str]:
+        return list(await asyncio.gather(
+            *(get_main_page_info_async("2024-03-22 00:00:00", MOCK_TRANSACTIONS) for _ in range(20))))
+
+    with patch('src.views.build_main_page_info_async', wraps=build_main_page_info_async) as mock_build:
+        responses = asyncio.run(requests())
+        assert len(set(responses)) == 1
+        assert mock_build.call_count == 1
+
+        # Повторный запрос отдается из кеша
+        assert asyncio.run(get_main_page_info_async("2024-03-22 00:00:00", MOCK_TRANSACTIONS)) == responses[0]
+        assert mock_build.call_count == 1
+
+
+def test_main_page_cached_with_quote_cache(empty_quote_cache: QuoteCache) -> None:
+    """С настоящим кешем котировок повторные запросы не строят ответ заново:
+    эпоха котировок, измененная при построении, входит в ключ сохраненного ответа"""
+    with patch('src.views.get_greetings', return_value="Добрый день"), \
+            patch('src.views.get_cards_info', return_value=MOCK_CARDS_INFO), \
+            patch('src.views.get_top_five_max_prices', return_value=MOCK_TOP_FIVE), \
+            patch('src.views.get_user_settings', return_value=MOCK_USER_SETTINGS), \
+            patch('src.utils._fetch_api_currencies', return_value={"USD": 75.5, "EUR": 80.1}) as mock_currencies, \
+            patch('src.utils._fetch_api_stocks', return_value={"AAPL": {"price": "150.25"}}), \
+            patch('src.views.build_main_page_info', wraps=build_main_page_info) as mock_build:
+        responses = [get_main_page_info("2024-03-22 00:00:00", MOCK_TRANSACTIONS) for _ in range(4)]
+
+    assert len(set(responses)) == 1
+    assert mock_build.call_count == 1
+    assert mock_currencies.call_count == 1
+
+
+def test_main_page_cache_does_not_keep_frames(mock_dependencies: MagicMock,
+                                              empty_main_page_cache: ResponseCache) -> None:
+    """Кеш ответов не удерживает в памяти таблицы транзакций, по которым построены ответы"""
+    transactions = MOCK_TRANSACTIONS.copy()
+    frame_ref = weakref.ref(transactions)
+    get_main_page_info("2024-03-22 00:00:00", transactions)
+    assert len(empty_main_page_cache) == 1
+
+    del transactions
+    gc.collect()
+    assert frame_ref() is None